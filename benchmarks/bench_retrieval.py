@@ -0,0 +1,62 @@
+"""
+Per-query dense retrieval latency: previous path vs. the normalized-matrix core.
+
+The previous path re-normalized the chunk matrix with sklearn's
+`cosine_similarity` and sorted every score with `np.argsort`. The current
+path scores a query against pre-normalized embeddings with one matrix-vector
+product and selects the top k with `argpartition`.
+
+Run from the repository root:
+    python -m benchmarks.bench_retrieval
+"""
+import time
+import numpy as np
+from src.tools.retrieval import EmbeddingMatrix, top_k
+
+DIM = 384  # all-MiniLM-L6-v2
+K = 5
+CHUNK_COUNTS = (1_000, 10_000, 100_000)
+
+
+def time_per_query(func, repeats: int) -> float:
+    """Median wall time of `func()` in milliseconds"""
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return float(np.median(timings))
+
+
+def previous_path(query: np.ndarray, embeddings: np.ndarray):
+    from sklearn.metrics.pairwise import cosine_similarity
+    similarities = cosine_similarity([query], embeddings)[0]
+    return np.argsort(similarities)[-K:][::-1]
+
+
+def main() -> None:
+    rng = np.random.default_rng(0)
+    try:
+        import sklearn  # noqa: F401
+        has_sklearn = True
+    except ImportError:
+        has_sklearn = False
+
+    header = f"{'chunks':>8} {'previous ms':>12}" + "".join(f" {dtype + ' ms':>12}" for dtype in EmbeddingMatrix.DTYPES)
+    print(header)
+    for n_chunks in CHUNK_COUNTS:
+        embeddings = rng.standard_normal((n_chunks, DIM)).astype(np.float32)
+        query = rng.standard_normal(DIM).astype(np.float32)
+        repeats = 50 if n_chunks < 100_000 else 10
+
+        previous = time_per_query(lambda: previous_path(query, embeddings), repeats) if has_sklearn else float("nan")
+        row = f"{n_chunks:>8} {previous:>12.3f}"
+        for dtype in EmbeddingMatrix.DTYPES:
+            matrix = EmbeddingMatrix.from_embeddings(embeddings, dtype)
+            current = time_per_query(lambda: top_k(matrix.scores(query)[0], K), repeats)
+            row += f" {current:>12.3f}"
+        print(row)
+
+
+if __name__ == "__main__":
+    main()
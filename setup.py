@@ -11,6 +11,7 @@ setup(
         "pytest>=7.0.0",
         "asyncio>=3.4.3",
         "aiohttp>=3.8.0",
+        "httpx>=0.23.0",
     ],
     author="Your Name",
     author_email="your.email@example.com",
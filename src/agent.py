@@ -1,112 +1,212 @@
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Callable, Iterator, Optional, Type, Union
+from collections import Counter
+from functools import lru_cache
+from pydantic import ValidationError, create_model
 from src.models import JobOutput
+from src.utils.json_repair import fenced_blocks, outermost_object, repair_json
+from src.utils.json_stream import IncrementalJSONParser
 import json
 import re
 
+# "field": "string value" pairs, for responses no JSON repair can recover
+_FIELD_PATTERN = re.compile(r'"(explanation|citation|answer)"\s*:\s*"((?:[^"\\]|\\.)*)"')
+
+@lru_cache(maxsize=None)
+def _output_model(agent_class: type) -> Type[JobOutput]:
+    """JobOutput with `answer` narrowed to an agent class's answer_schema"""
+    return create_model(
+        f"{agent_class.__name__}Output",
+        __base__=JobOutput,
+        answer=(agent_class.answer_schema, ...)
+    )
+
 class Agent:
     """Base class for all agents"""
-    def __init__(self, model, role_name: str):
+    # Fields a response must contain
+    required_fields = ("explanation", "answer")
+    # Fields the prompt asks for; a stream is cancelled once they have all been parsed
+    # (or the response object has closed), so a citation sent after the answer is kept
+    stream_fields = ("explanation", "citation", "answer")
+    # Type of the `answer` field; subclasses narrow it to the shape they return
+    answer_schema: Any = Union[str, Dict[str, Any]]
+    
+    def __init__(self, model, role_name: str, structured_output: bool = True):
         self.model = model  # LLM client
         self.role_name = role_name
+        # Constrain responses to output_model() when the model supports structured output
+        self.structured_output = structured_output
         self.system_prompt = self._get_system_prompt()
+        # How responses were parsed: structured, stream, strict, repair, heuristic or failed
+        self.parse_tiers: Counter = Counter()
+        
+    @classmethod
+    def output_model(cls) -> Type[JobOutput]:
+        """The response model structured output is constrained to (JobOutput with this agent's answer_schema)"""
+        return _output_model(cls)
+        
+    @property
+    def uses_structured_output(self) -> bool:
+        return self.structured_output and getattr(self.model, "supports_structured_output", False) is True
         
     def _get_system_prompt(self) -> str:
         """Get the system prompt for this agent role"""
         raise NotImplementedError("Subclasses must implement this")
         
-    async def execute(self, task: str, context: str) -> JobOutput:
-        """Execute a task with the given context"""
-        messages = [
+    async def execute(
+        self,
+        task: str,
+        context: str,
+        stream: bool = False,
+        on_field: Optional[Callable[[str, Any], None]] = None
+    ) -> JobOutput:
+        """
+        Execute a task with the given context
+        
+        Args:
+            task: The task description
+            context: Context passed to the model
+            stream: Stream the response (when the model supports it) and stop as soon
+                as the object closes or every field in stream_fields is parsed
+            on_field: Called with (key, value) as each top-level field of a streamed
+                response completes
+        
+        Without streaming, a model that supports structured output is asked for
+        an instance of output_model() and the response is loaded directly.
+        """
+        messages = self.build_messages(task, context)
+        if stream and hasattr(self.model, "generate_stream"):
+            return await self._execute_stream(messages, on_field)
+        if self.uses_structured_output:
+            response = await self.model.generate(messages, response_model=self.output_model())
+            return self._load_structured(response)
+        response = await self.model.generate(messages)
+        return self._parse_output(response)
+        
+    def build_messages(self, task: str, context: str) -> List[Dict[str, str]]:
+        """The chat messages sent to the model for a task"""
+        return [
             {"role": "system", "content": self.system_prompt},
             {"role": "user", "content": f"Task: {task}\n\nContext: {context}"}
         ]
-        response = await self.model.generate(messages)
-        return self._parse_output(response)
+        
+    async def _execute_stream(self, messages: List[Dict[str, str]], on_field: Optional[Callable[[str, Any], None]]) -> JobOutput:
+        """Consume a streamed response, parsing fields as they complete"""
+        parser = IncrementalJSONParser()
+        chunks = []
+        deltas = self.model.generate_stream(messages)
+        try:
+            async for delta in deltas:
+                chunks.append(delta)
+                for key in parser.feed(delta):
+                    if on_field is not None:
+                        on_field(key, parser.fields[key])
+                if parser.complete or parser.has_fields(self.stream_fields):
+                    break
+        finally:
+            # Stops generation upstream when we break out early
+            await deltas.aclose()
+        
+        if parser.has_fields(self.required_fields):
+            self.parse_tiers["stream"] += 1
+            return self._job_output(parser.fields)
+        return self._parse_output("".join(chunks))
+        
+    def _load_structured(self, response: str) -> JobOutput:
+        """Validate a schema-constrained response, falling back to _parse_output if it does not conform"""
+        try:
+            output = self.output_model().model_validate_json(response)
+        except ValidationError:
+            return self._parse_output(response)
+        self.parse_tiers["structured"] += 1
+        return self._job_output(output.model_dump())
+        
+    def _job_output(self, data: Dict[str, Any]) -> JobOutput:
+        """Build a JobOutput from a parsed response object"""
+        # Convert answer to string if it's a dictionary
+        if isinstance(data.get("answer"), dict):
+            data["answer"] = json.dumps(data["answer"])
+        
+        return JobOutput(
+            explanation=data.get("explanation", ""),
+            citation=data.get("citation"),
+            answer=data.get("answer")
+        )
         
     def _parse_output(self, response: str) -> JobOutput:
-        """Parse the model output into a structured JobOutput"""
-        def preprocess_json_string(json_str: str) -> str:
-            # Remove comments
-            json_str = re.sub(r'//.*?$', '', json_str, flags=re.MULTILINE)
-            
-            # Fix trailing commas in arrays and objects
-            json_str = re.sub(r',\s*}', '}', json_str)
-            json_str = re.sub(r',\s*]', ']', json_str)
-            
-            # Fix unescaped quotes in a simpler way
-            # First, find all string values
-            string_pattern = r'"([^"\\]*(?:\\.[^"\\]*)*)"'
-            matches = re.finditer(string_pattern, json_str)
-            
-            # Process each string value
-            for match in matches:
-                original = match.group(0)
-                content = match.group(1)
-                # Escape any unescaped quotes in the content
-                fixed_content = content.replace('"', '\\"')
-                if fixed_content != content:
-                    json_str = json_str.replace(original, f'"{fixed_content}"')
-            
-            return json_str
-
-        def extract_json(text: str) -> Optional[str]:
-            # Try to extract from code blocks first
-            block_matches = list(re.finditer(r"```(?:json)?\s*(.*?)```", text, re.DOTALL))
-            if block_matches:
-                return block_matches[-1].group(1).strip()
-            
-            # Try to find the outermost JSON object
-            try:
-                start = text.find('{')
-                end = text.rfind('}')
-                if start != -1 and end != -1 and end > start:
-                    return text[start:end+1]
-            except:
-                pass
-            
-            # Try a more aggressive approach
-            potential_jsons = re.findall(r'\{[^{}]*\}', text)
-            if potential_jsons:
-                return potential_jsons[-1]
-            
-            return None
-
-        # Extract and preprocess JSON
-        json_str = extract_json(response)
-        if not json_str:
+        """
+        Parse the model output into a structured JobOutput.
+        
+        Tries, in order, and counts the tier that succeeded in `parse_tiers`:
+            strict: json.loads on the response, its last fenced block, or its outermost object
+            repair: the same candidate after a single-pass repair (see repair_json)
+            heuristic: other fenced blocks and flat objects, then the required fields by pattern
+        """
+        blocks = fenced_blocks(response)
+        stripped = response.strip()
+        candidates = [stripped] if stripped.startswith("{") else []
+        candidates += blocks[-1:] if blocks else [outermost_object(response)]
+        candidates = list(dict.fromkeys(c for c in candidates if c))
+        if not candidates:
+            self.parse_tiers["failed"] += 1
             return JobOutput(
                 explanation="Failed to extract JSON from response",
                 citation=None,
                 answer=response
             )
-
-        try:
-            # Preprocess and parse
-            json_str = preprocess_json_string(json_str)
-            data = json.loads(json_str)
-            
-            # Validate required fields
-            if not isinstance(data, dict):
-                raise ValueError("JSON must be an object")
-            
-            required_fields = ["explanation", "answer"]
-            for field in required_fields:
-                if field not in data:
-                    raise ValueError(f"Missing required field: {field}")
-            
-            # Convert answer to string if it's a dictionary
-            if isinstance(data.get("answer"), dict):
-                data["answer"] = json.dumps(data["answer"])
-            
-            return JobOutput(
-                explanation=data.get("explanation", ""),
-                citation=data.get("citation"),
-                answer=data.get("answer")
-            )
-            
-        except (json.JSONDecodeError, ValueError) as e:
-            return JobOutput(
-                explanation=f"Failed to parse JSON: {str(e)}",
-                citation=None,
-                answer=response
-            ) 
\ No newline at end of file
+        
+        error = ""
+        for tier, texts in (
+            ("strict", candidates),
+            ("repair", (repair_json(candidates[-1]),)),
+            ("heuristic", self._heuristic_candidates(response, blocks))
+        ):
+            for text in texts:
+                try:
+                    data = json.loads(text)
+                except json.JSONDecodeError as e:
+                    error = error or str(e)
+                    continue
+                missing = self._missing_fields(data)
+                if missing:
+                    error = error or missing
+                    continue
+                self.parse_tiers[tier] += 1
+                return self._job_output(data)
+        
+        data = self._fields_by_pattern(response)
+        if data is not None:
+            self.parse_tiers["heuristic"] += 1
+            return self._job_output(data)
+        
+        self.parse_tiers["failed"] += 1
+        return JobOutput(
+            explanation=f"Failed to parse JSON: {error}",
+            citation=None,
+            answer=response
+        )
+        
+    def _missing_fields(self, data: Any) -> str:
+        """Why parsed data is not a usable response ("" when it is)"""
+        if not isinstance(data, dict):
+            return "JSON must be an object"
+        for field in self.required_fields:
+            if field not in data:
+                return f"Missing required field: {field}"
+        return ""
+        
+    def _heuristic_candidates(self, response: str, blocks: List[str]) -> Iterator[str]:
+        """Repaired earlier fenced blocks, then flat {...} objects from last to first"""
+        for block in reversed(blocks[:-1]):
+            yield repair_json(block)
+        for match in reversed(re.findall(r"\{[^{}]*\}", response)):
+            yield repair_json(match)
+        
+    def _fields_by_pattern(self, response: str) -> Optional[Dict[str, Any]]:
+        """String-valued fields found by pattern, when every required field is among them"""
+        data = {}
+        for match in _FIELD_PATTERN.finditer(response):
+            try:
+                data.setdefault(match.group(1), json.loads(f'"{match.group(2)}"'))
+            except json.JSONDecodeError:
+                data.setdefault(match.group(1), match.group(2))
+        return data if all(field in data for field in self.required_fields) else None
@@ -1,7 +1,11 @@
 from src.agent import Agent
 from src.models import JobOutput
+from typing import Dict, Optional, Union
 
 class CalculatorAgent(Agent):
+    # {"Quick Ratio FY2023": 0.69, "Percentage Change": 3.0}
+    answer_schema = Dict[str, Union[float, str, None]]
+    
     def _get_system_prompt(self) -> str:
         return """You are a financial calculation expert. Your job is to perform precise   
         mathematical operations on financial data.
@@ -1,7 +1,21 @@
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Tuple
 import json
+import re
+from pydantic import BaseModel, ValidationError
+from src.clients.base import generate_kwargs
 from src.utils.financial_data_validator import FinancialDataValidator
 from src.models import JobOutput
+from src.tools.formulas import find_formulas
+from src.tools.statements import StatementIndex, parse_statements
+from src.utils.concepts import get_concept_resolver
+
+# Concepts statements present as negatives (costs, cash outflows) whose magnitudes are reported
+OUTFLOW_CONCEPTS = ("cost_of_sales", "capex")
+_TASK_YEAR = re.compile(r"\b(?:FY\s*)?((?:19|20)\d{2})\b", re.IGNORECASE)
+
+class ExtractedValues(BaseModel):
+    """Structured-output schema for extraction: {"<line item> FY<year>": value}"""
+    values: Dict[str, float]
 
 class DataRetrieverAgent:
     """
@@ -69,25 +83,8 @@ class DataRetrieverAgent:
         Returns:
             JobOutput containing the extracted data
         """
-        # Extract target metrics from the task
-        target_metrics = []
-        if "Quick Ratio" in task:
-            target_metrics = [
-                "Total Current Assets",
-                "Raw Materials and Supplies",
-                "Work in Process and Finished Goods",
-                "Total Current Liabilities"
-            ]
-        elif "Inventory Turnover" in task:
-            target_metrics = ["Cost of Sales", "Inventory"]
-        elif "Capital Intensity" in task:
-            target_metrics = [
-                "Capital Expenditures",
-                "Revenue",
-                "Fixed Assets",
-                "Total Assets",
-                "Net Income"
-            ]
+        # Metrics listed in the task, else the inputs of the formulas it names
+        target_metrics = self._task_metrics(task) or self._formula_metrics(task)
             
         # Get document text from context
         document_text = context.get("document_text", "")
@@ -106,6 +103,18 @@ class DataRetrieverAgent:
                 citation="",
                 answer={}
             )
+        
+        # Read what the statement tables can answer; only unresolved metrics go to the LLM
+        requested = target_metrics
+        statement_values, sources, unresolved = self._extract_from_statements(parse_statements(document_text), requested, task)
+        if requested and not unresolved:
+            return JobOutput(
+                explanation="Extracted financial data from the statement tables",
+                citation="; ".join(sources),
+                answer=statement_values
+            )
+        if statement_values:
+            target_metrics = unresolved
             
         # Extract the data using LLM
         messages = [
@@ -113,27 +122,13 @@ class DataRetrieverAgent:
             {"role": "user", "content": f"Extract the following metrics from this financial document: {', '.join(target_metrics)}\n\n{document_text}"}
         ]
         
+        structured = getattr(self.openai_client, "supports_structured_output", False) is True
         try:
-            response_text = await self.openai_client.generate(messages)
-            
-            # Handle potential JSON formatting issues
-            if not response_text.strip().startswith("{"):
-                # Try to extract JSON from the response
-                json_start = response_text.find("{")
-                json_end = response_text.rfind("}") + 1
-                if json_start != -1 and json_end != -1:
-                    response_text = response_text[json_start:json_end]
-            
-            extracted_data = json.loads(response_text)
-            values = extracted_data.get("values", {})
+            response_text = await self.openai_client.generate(messages, **generate_kwargs(ExtractedValues if structured else None))
+            values = self._response_values(response_text, structured)
             
-            # Validate that we got the expected data
-            if not values:
-                # Try to extract values directly from the response
-                if isinstance(extracted_data, dict) and "answer" in extracted_data:
-                    values = extracted_data["answer"]
-                elif isinstance(extracted_data, dict):
-                    values = extracted_data
+            if isinstance(values, dict):
+                values = {**values, **statement_values}
             
             # Format the result as JobOutput
             explanation = "Successfully extracted financial data using LLM"
@@ -146,8 +141,7 @@ class DataRetrieverAgent:
             )
         except json.JSONDecodeError as e:
             # Try to extract values using regex as a fallback
-            import re
-            values = {}
+            values = dict(statement_values)
             for metric in target_metrics:
                 # Handle different metric names and formats
                 metric_patterns = [
@@ -177,4 +171,128 @@ class DataRetrieverAgent:
                 explanation=f"Error parsing LLM response: {str(e)}",
                 citation=document_text[:200] + "...",
                 answer={}
-            ) 
\ No newline at end of file
+            ) 
+    
+    def _response_values(self, response_text: str, structured: bool) -> Any:
+        """
+        Values from an extraction response: a direct validated load of a
+        structured response, otherwise the JSON object found in the text.
+        Raises json.JSONDecodeError when there is none.
+        """
+        if structured:
+            try:
+                return ExtractedValues.model_validate_json(response_text).values
+            except ValidationError:
+                pass
+        
+        # Handle potential JSON formatting issues
+        if not response_text.strip().startswith("{"):
+            # Try to extract JSON from the response
+            json_start = response_text.find("{")
+            json_end = response_text.rfind("}") + 1
+            if json_start != -1 and json_end != -1:
+                response_text = response_text[json_start:json_end]
+        
+        extracted_data = json.loads(response_text)
+        values = extracted_data.get("values", {})
+        
+        # Validate that we got the expected data
+        if not values:
+            # Try to extract values directly from the response
+            if isinstance(extracted_data, dict) and "answer" in extracted_data:
+                values = extracted_data["answer"]
+            elif isinstance(extracted_data, dict):
+                values = extracted_data
+        return values
+    
+    def _task_metrics(self, task: str) -> List[str]:
+        """
+        Metric names listed after the last colon of a task, e.g. "Extract ...
+        for FY2022: Total cost of sales and Inventory value." Commas inside
+        parentheses do not split a metric.
+        """
+        if ":" not in task:
+            return []
+        listing = task.rsplit(":", 1)[1].strip().rstrip(".")
+        metrics, depth, current = [], 0, ""
+        for char in listing:
+            depth += {"(": 1, ")": -1}.get(char, 0)
+            if char == "," and depth == 0:
+                metrics.append(current)
+                current = ""
+            else:
+                current += char
+        metrics.append(current)
+        return [re.sub(r"^and\s+", "", metric.strip()) for metric in metrics if metric.strip()]
+    
+    def _formula_metrics(self, task: str) -> List[str]:
+        """Input line items of the formulas a task names, e.g. "Quick Ratio" -> current assets, inventory, current liabilities"""
+        resolver = get_concept_resolver()
+        metrics: List[str] = []
+        for formula in find_formulas(task):
+            for item in formula.inputs:
+                # The first synonym reads as a line-item label and resolves back to the concept
+                metric = (resolver.labels_for(item) or [item.replace("_", " ")])[0]
+                if metric not in metrics:
+                    metrics.append(metric)
+        return metrics
+    
+    def _metric_names(self, metric: str) -> List[str]:
+        """Alternative names within a metric: "Net sales/Revenue", "CAPEX (Purchases of ...)" """
+        return [part.strip() for part in re.split(r"[/()]", metric) if part.strip()]
+    
+    def _extract_from_statements(
+        self,
+        index: StatementIndex,
+        metrics: List[str],
+        task: str
+    ) -> Tuple[Dict[str, float], List[str], List[str]]:
+        """
+        Look up metrics in parsed statement tables.
+        
+        A row matches a metric by label, or else by canonical concept (so
+        "Capital Expenditures" finds "Purchases of property, plant and
+        equipment"). A metric resolves when its row has values for every year the
+        task names (or any year, if it names none). A metric that does not
+        resolve and joins several items with "and" (e.g. "Total cost of sales
+        and Inventory value") is retried item by item.
+        
+        Returns:
+            ({"<row label> FY<year>": value}, source descriptions, unresolved metrics)
+        """
+        years = sorted({f"FY{year}" for year in _TASK_YEAR.findall(task)}, reverse=True)
+        resolver = get_concept_resolver()
+        values: Dict[str, float] = {}
+        sources: List[str] = []
+        unresolved: List[str] = []
+        
+        def resolve(metric: str) -> bool:
+            names = self._metric_names(metric)
+            found = index.find(names)
+            for name in names:
+                if found is not None:
+                    break
+                concept = resolver.resolve(name)
+                found = index.find_concept(concept) if concept else None
+            if found is None:
+                return False
+            label, table = found
+            row = table.rows[label]
+            periods = years or [period for period in table.periods if row.get(period) is not None]
+            if not periods or any(row.get(period) is None for period in periods):
+                return False
+            outflow = resolver.resolve(label) in OUTFLOW_CONCEPTS
+            for period in periods:
+                values[f"{label} {period}"] = abs(row[period]) if outflow else row[period]
+            units = f" (in {table.units})" if table.units else ""
+            sources.append(f"{table.title or 'Statement'}{units}: {label}")
+            return True
+        
+        for metric in metrics:
+            if resolve(metric):
+                continue
+            parts = [part for part in re.split(r"\s+and\s+", metric) if part.strip()]
+            if len(parts) > 1 and all([resolve(part) for part in parts]):
+                continue
+            unresolved.append(metric)
+        return values, sources, unresolved
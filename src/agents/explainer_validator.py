@@ -4,6 +4,9 @@ from typing import Dict, Any, Optional
 import json
 
 class ExplainerValidatorAgent(Agent):
+    # The final conclusion, in prose
+    answer_schema = str
+    
     def _get_system_prompt(self) -> str:
         return """You are a financial analysis validation expert. Your job is to interpret   
         calculation results and provide clear explanations.
@@ -1,7 +1,17 @@
 from src.agent import Agent
 from src.models import JobOutput
+from typing import List
+from pydantic import BaseModel
+
+class SelectedConcept(BaseModel):
+    """The financial concept a question calls for"""
+    concept: str
+    formula: str
+    required_data: List[str]
 
 class FinancialConceptSelectorAgent(Agent):
+    answer_schema = SelectedConcept
+    
     def _get_system_prompt(self) -> str:
         return """You are a financial concept expert. Your job is to identify the correct   
         financial metrics and formulas needed to answer financial analysis questions.
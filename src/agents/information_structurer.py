@@ -1,7 +1,11 @@
 from src.agent import Agent
 from src.models import JobOutput
+from typing import Dict, Optional
 
 class InformationStructurerAgent(Agent):
+    # {period: {line item: value}}
+    answer_schema = Dict[str, Dict[str, Optional[float]]]
+    
     def _get_system_prompt(self) -> str:
         return """You are a financial data structuring expert. Your job is to organize and   
         prepare financial data for calculations.
@@ -0,0 +1,231 @@
+"""
+Run many financial analyses concurrently from a JSONL file of questions.
+
+Each input line is a JSON object with:
+    question (or task): the question to answer
+    context | context_file | evidence: the filing text, a path to it, or
+        FinanceBench-style evidence ([{"evidence_text": ...}, ...])
+    workflow (optional): a workflow name from src.examples.workflows or an
+        inline list of steps; defaults to GENERAL_QUESTION_WORKFLOW
+    id / financebench_id (optional): identifier copied to the output
+
+Results are appended to the output JSONL as each analysis finishes.
+
+Usage:
+    python -m src.batch_runner requests.jsonl --output results.jsonl --concurrency 32
+"""
+from typing import Any, Dict, Iterator, List, Optional, TextIO
+from contextlib import redirect_stdout
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from src.agents.calculator import CalculatorAgent
+from src.agents.data_retriever import DataRetrieverAgent
+from src.agents.explainer_validator import ExplainerValidatorAgent
+from src.agents.financial_concept_selector import FinancialConceptSelectorAgent
+from src.agents.information_structurer import InformationStructurerAgent
+from src.clients.cache import cached_client_from_env
+from src.clients.openai import OpenAIClient
+from src.clients.resilience import ResilientClient
+from src.clients.singleflight import SingleFlightClient
+from src.examples import workflows
+from src.financial_orchestrator import FinancialOrchestrator
+from src.tools.registry import create_default_registry
+from src.utils.tokens import TokenUsage
+
+
+def load_requests(path: str) -> Iterator[Dict[str, Any]]:
+    """Yield one request per non-empty JSONL line, tagging each with its line number"""
+    with open(path, "r") as f:
+        for line_no, line in enumerate(f, 1):
+            if line.strip():
+                record = json.loads(line)
+                record.setdefault("id", record.get("financebench_id", line_no))
+                yield record
+
+
+def request_context(record: Dict[str, Any], base_dir: str = ".") -> str:
+    """Filing text for a request"""
+    if "context" in record:
+        return record["context"]
+    if "context_file" in record:
+        with open(os.path.join(base_dir, record["context_file"]), "r") as f:
+            return f.read()
+    if "evidence" in record:
+        return "\n\n".join(item.get("evidence_text", "") for item in record["evidence"])
+    raise ValueError(f"Request {record.get('id')} has no context, context_file or evidence")
+
+
+def request_workflow(record: Dict[str, Any], default: str = "GENERAL_QUESTION_WORKFLOW") -> List[Dict[str, Any]]:
+    """The request's workflow with {question} filled in"""
+    workflow = record.get("workflow", default)
+    if isinstance(workflow, str):
+        workflow = getattr(workflows, workflow)
+    question = record.get("question") or record.get("task", "")
+    # Escape braces so the orchestrator's own template formatting leaves the question intact
+    escaped = question.replace("{", "{{").replace("}", "}}")
+    return [{**step, "task": step["task"].replace("{question}", escaped)} for step in workflow]
+
+
+def create_orchestrator(client, **options) -> FinancialOrchestrator:
+    """One orchestrator whose agents all share the given client"""
+    agents = {
+        "data_retriever": DataRetrieverAgent(client),
+        "financial_concept_selector": FinancialConceptSelectorAgent(client, "financial_concept_selector"),
+        "information_structurer": InformationStructurerAgent(client, "information_structurer"),
+        "calculator": CalculatorAgent(client, "calculator"),
+        "explainer_validator": ExplainerValidatorAgent(client, "explainer_validator")
+    }
+    return FinancialOrchestrator(supervisor_model=client, agents=agents, tool_registry=create_default_registry(), **options)
+
+
+def serialize_result(record: Dict[str, Any], result: Dict[str, Any], elapsed: float) -> Dict[str, Any]:
+    return {
+        "id": record["id"],
+        "question": record.get("question") or record.get("task"),
+        "final_answer": result["final_answer"],
+        "steps": [
+            {
+                "agent": step["agent"],
+                "task": step["task"],
+                "output": step["output"].model_dump(),
+                "usage": step.get("usage")
+            }
+            for step in result["steps"]
+        ],
+        "usage": result.get("usage"),
+        "elapsed_seconds": round(elapsed, 3)
+    }
+
+
+class Progress:
+    """Completion counts and throughput for a running batch"""
+
+    def __init__(self, total: Optional[int] = None):
+        self.total = total
+        self.done = 0
+        self.failed = 0
+        self.usage = TokenUsage()
+        self.started = time.monotonic()
+
+    @property
+    def finished(self) -> int:
+        return self.done + self.failed
+
+    def summary(self) -> str:
+        elapsed = time.monotonic() - self.started
+        rate = self.finished / elapsed if elapsed > 0 else 0.0
+        parts = [f"{self.finished}" + (f"/{self.total}" if self.total is not None else ""), f"{self.failed} failed"]
+        parts.append(f"{rate:.2f} questions/s")
+        parts.append(f"{self.usage.total_tokens / elapsed if elapsed > 0 else 0.0:,.0f} tokens/s")
+        if self.total is not None and rate > 0:
+            parts.append(f"ETA {(self.total - self.finished) / rate:.0f}s")
+        return ", ".join(parts)
+
+
+class BatchRunner:
+    """
+    Runs analyses with bounded parallelism over one shared orchestrator.
+
+    Requests are pulled from an iterator by `concurrency` workers, so inputs
+    of any size are never all materialized at once. Each finished analysis
+    (or its error) is written and flushed to the output immediately.
+    """
+
+    def __init__(
+        self,
+        orchestrator: FinancialOrchestrator,
+        output: TextIO,
+        concurrency: int = 16,
+        progress_interval: float = 5.0,
+        base_dir: str = "."
+    ):
+        self.orchestrator = orchestrator
+        self.output = output
+        self.concurrency = concurrency
+        self.progress_interval = progress_interval
+        self.base_dir = base_dir
+
+    async def run(self, requests: Iterator[Dict[str, Any]], total: Optional[int] = None) -> Progress:
+        progress = Progress(total)
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.concurrency * 2)
+
+        async def worker():
+            while True:
+                record = await queue.get()
+                if record is None:
+                    return
+                await self._run_one(record, progress)
+
+        async def report():
+            while True:
+                await asyncio.sleep(self.progress_interval)
+                print(f"[progress] {progress.summary()}", file=sys.stderr, flush=True)
+
+        workers = [asyncio.ensure_future(worker()) for _ in range(self.concurrency)]
+        reporter = asyncio.ensure_future(report())
+        try:
+            for record in requests:
+                await queue.put(record)
+            for _ in workers:
+                await queue.put(None)
+            await asyncio.gather(*workers)
+        finally:
+            reporter.cancel()
+            for task in workers:
+                task.cancel()
+        print(f"[done] {progress.summary()}", file=sys.stderr, flush=True)
+        return progress
+
+    async def _run_one(self, record: Dict[str, Any], progress: Progress) -> None:
+        started = time.monotonic()
+        try:
+            result = await self.orchestrator.run_financial_analysis(
+                task=record.get("question") or record.get("task"),
+                context={"document_text": request_context(record, self.base_dir)},
+                workflow=request_workflow(record)
+            )
+        except Exception as e:
+            progress.failed += 1
+            line = {"id": record["id"], "error": f"{type(e).__name__}: {e}"}
+        else:
+            progress.done += 1
+            line = serialize_result(record, result, time.monotonic() - started)
+            if result.get("usage"):
+                usage = result["usage"]
+                progress.usage.add(usage["input_tokens"], usage["output_tokens"], usage["estimated"])
+        self.output.write(json.dumps(line, default=str) + "\n")
+        self.output.flush()
+
+
+def count_requests(path: str) -> int:
+    with open(path, "r") as f:
+        return sum(1 for line in f if line.strip())
+
+
+async def main(args: argparse.Namespace) -> Progress:
+    client = cached_client_from_env(SingleFlightClient(ResilientClient([OpenAIClient(model_name=args.model)])))
+    orchestrator = create_orchestrator(client, max_concurrency=args.step_concurrency, context_budget=args.context_budget)
+    with open(args.output, "a") as output:
+        runner = BatchRunner(orchestrator, output, args.concurrency, args.progress_interval, os.path.dirname(os.path.abspath(args.input)))
+        if args.verbose:
+            return await runner.run(load_requests(args.input), count_requests(args.input))
+        # Per-step logs from thousands of concurrent analyses are noise; progress goes to stderr
+        with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+            return await runner.run(load_requests(args.input), count_requests(args.input))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run financial analyses for every question in a JSONL file")
+    parser.add_argument("input", help="JSONL file of questions")
+    parser.add_argument("--output", default="results.jsonl", help="JSONL file results are appended to")
+    parser.add_argument("--concurrency", type=int, default=16, help="Analyses running at once")
+    parser.add_argument("--step-concurrency", type=int, default=4, help="Workflow steps running at once per analysis")
+    parser.add_argument("--context-budget", type=int, default=None, help="Maximum context tokens per step")
+    parser.add_argument("--model", default="gpt-4o", help="OpenAI model name")
+    parser.add_argument("--progress-interval", type=float, default=5.0, help="Seconds between progress lines")
+    parser.add_argument("--verbose", action="store_true", help="Keep per-step output on stdout")
+    asyncio.run(main(parser.parse_args()))
@@ -1,42 +1,68 @@
-from typing import List, Dict, Any, Tuple  
-from src.clients.base import ModelClient  
-import os  
+from typing import AsyncIterator, List, Dict, Any, Optional, Type  
+from pydantic import BaseModel  
+from src.clients.base import Completion, SDKClient, response_schema
+from src.clients.http import HTTPPoolConfig  
+import json  
 import anthropic  
-import asyncio  
   
-class AnthropicClient(ModelClient):  
+class AnthropicClient(SDKClient):  
     """Client for Anthropic models"""  
       
+    provider = "anthropic"  
+    supports_structured_output = True  
+    sdk_class = anthropic.AsyncAnthropic  
+    http_client_class = anthropic.DefaultAsyncHttpxClient  
+    api_key_env = "ANTHROPIC_API_KEY"  
+    transient_errors = (anthropic.APITimeoutError, anthropic.APIConnectionError)  
+      
     def __init__(  
         self,  
         model_name: str = "claude-3-haiku-20240307",  
         api_key: str = None,  
         temperature: float = 0.0,  
-        max_tokens: int = 4096  
+        max_tokens: int = 4096,  
+        pool_config: Optional[HTTPPoolConfig] = None,  
+        client: Optional[anthropic.AsyncAnthropic] = None  
     ):  
-        self.model_name = model_name  
-        self.api_key = api_key or os.environ.get("ANTHROPIC_API_KEY")  
-        if not self.api_key:  
-            raise ValueError("Anthropic API key is required")  
-          
-        self.client = anthropic.Anthropic(api_key=self.api_key)  
-        self.temperature = temperature  
-        self.max_tokens = max_tokens  
+        super().__init__(model_name, api_key, temperature, max_tokens, pool_config, client)  
+      
+    def _request_params(self, messages: List[Dict[str, str]]) -> Dict[str, Any]:  
+        # Anthropic takes system prompts as a separate parameter  
+        system_prompt = "\n\n".join(m["content"] for m in messages if m["role"] == "system")  
+        params = {  
+            "model": self.model_name,  
+            "messages": [m for m in messages if m["role"] != "system"],  
+            "temperature": self.temperature,  
+            "max_tokens": self.max_tokens  
+        }  
+        if system_prompt:  
+            params["system"] = system_prompt  
+        return params  
       
-    async def generate(self, messages: List[Dict[str, str]]) -> str:  
+    async def _generate(self, messages: List[Dict[str, str]], response_model: Optional[Type[BaseModel]] = None) -> Completion:  
         """Generate a response from the Anthropic model"""  
-        try:  
-            # Convert messages to Anthropic format if needed  
-            anthropic_messages = messages  
-              
-            response = await asyncio.to_thread(  
-                self.client.messages.create,  
-                model=self.model_name,  
-                messages=anthropic_messages,  
-                temperature=self.temperature,  
-                max_tokens=self.max_tokens  
-            )  
-            return response.content[0].text  
-        except Exception as e:  
-            print(f"Error generating response from Anthropic: {e}")  
-            return f"Error: {str(e)}"
+        params = self._request_params(messages)  
+        if response_model is not None:  
+            # A single forced tool call whose input schema is the response model  
+            params["tools"] = [{  
+                "name": response_model.__name__,  
+                "description": "Return the response",  
+                "input_schema": response_schema(response_model)  
+            }]  
+            params["tool_choice"] = {"type": "tool", "name": response_model.__name__}  
+        response = await self.client.messages.create(**params)  
+        usage = getattr(response, "usage", None)  
+        tool_inputs = [block.input for block in response.content if getattr(block, "type", None) == "tool_use"]  
+        text = json.dumps(tool_inputs[0]) if response_model is not None and tool_inputs else response.content[0].text  
+        return Completion(  
+            text=text,  
+            input_tokens=getattr(usage, "input_tokens", None),  
+            output_tokens=getattr(usage, "output_tokens", None)  
+        )  
+      
+    async def _stream(self, messages: List[Dict[str, str]]) -> AsyncIterator[str]:  
+        """Stream text deltas from the Anthropic model"""  
+        # Leaving the context manager closes the response and aborts generation  
+        async with self.client.messages.stream(**self._request_params(messages)) as stream:  
+            async for text in stream.text_stream:  
+                yield text  
@@ -1,9 +1,219 @@
-from typing import List, Dict, Any, Tuple  
-import asyncio  
-  
-class ModelClient:  
-    """Base class for all model clients"""  
-      
-    async def generate(self, messages: List[Dict[str, str]]) -> str:  
-        """Generate a response from the model"""  
-        raise NotImplementedError("Subclasses must implement this")
\ No newline at end of file
+from typing import AsyncIterator, List, Dict, Any, Optional, Tuple, Type
+from dataclasses import dataclass
+from functools import lru_cache
+import asyncio
+import os
+import weakref
+import httpx
+from pydantic import BaseModel
+from src.clients.errors import ModelClientError, PermanentError, RateLimitError, TransientError
+from src.clients.http import HTTPPoolConfig, get_shared_http_client
+from src.clients.rate_limit import RateLimiter, get_rate_limiter
+from src.utils.tokens import count_message_tokens, count_tokens, record_usage
+
+
+@dataclass
+class Completion:
+    """Text and token usage returned by a provider call"""
+    text: str
+    input_tokens: Optional[int] = None
+    output_tokens: Optional[int] = None
+
+    @property
+    def total_tokens(self) -> Optional[int]:
+        if self.input_tokens is None or self.output_tokens is None:
+            return None
+        return self.input_tokens + self.output_tokens
+
+
+class ModelClient:
+    """
+    Base class for all model clients.
+
+    `generate` runs every call through the rate limiter shared by all clients
+    of the same provider and model and raises a typed ModelClientError on
+    failure; subclasses implement `_generate` and may refine `_classify_error`.
+    Clients with `supports_structured_output` accept a pydantic `response_model`
+    and constrain the response to its JSON schema.
+    """
+
+    provider: str = "generic"
+    model_name: str = "unknown"
+    max_tokens: int = 4096
+    supports_structured_output: bool = False
+
+    async def generate(self, messages: List[Dict[str, str]], response_model: Optional[Type[BaseModel]] = None) -> str:
+        """
+        Generate a response from the model
+
+        Args:
+            messages: Chat messages
+            response_model: Pydantic model the response must be a JSON instance of
+        """
+        if response_model is not None and not self.supports_structured_output:
+            raise ValueError(f"{type(self).__name__} does not support structured output")
+        estimated_tokens = self.estimate_tokens(messages)
+        async with self.get_rate_limiter().slot(estimated_tokens) as slot:
+            try:
+                completion = await self._generate(messages, **generate_kwargs(response_model))
+            except Exception as e:
+                error = self._classify_error(e)
+                if isinstance(error, RateLimitError):
+                    slot.rate_limited(error.retry_after)
+                raise error from e
+            slot.succeeded(completion.total_tokens)
+            self._record_usage(messages, completion)
+            return completion.text
+
+    async def generate_stream(self, messages: List[Dict[str, str]]) -> AsyncIterator[str]:
+        """
+        Stream a response as text deltas.
+
+        Holds a rate-limiter slot until the stream ends. Closing the iterator
+        early (breaking out of `async for` and calling `aclose()`) cancels the
+        upstream request, so unread output tokens are not generated.
+        """
+        estimated_tokens = self.estimate_tokens(messages)
+        async with self.get_rate_limiter().slot(estimated_tokens) as slot:
+            received = []
+            failed = False
+            deltas = self._stream(messages)
+            try:
+                async for delta in deltas:
+                    received.append(delta)
+                    yield delta
+            except Exception as e:
+                failed = True
+                error = self._classify_error(e)
+                if isinstance(error, RateLimitError):
+                    slot.rate_limited(error.retry_after)
+                raise error from e
+            finally:
+                await deltas.aclose()
+                if not failed:
+                    # Streams report no usage here; count what was actually consumed
+                    completion = Completion("".join(received))
+                    self._record_usage(messages, completion)
+                    slot.succeeded(estimated_tokens - self.max_tokens + count_tokens(completion.text, self.model_name))
+
+    async def _generate(self, messages: List[Dict[str, str]], response_model: Optional[Type[BaseModel]] = None) -> Completion:
+        """Call the provider once; raise on failure"""
+        raise NotImplementedError("Subclasses must implement this")
+
+    def _stream(self, messages: List[Dict[str, str]]) -> AsyncIterator[str]:
+        """Async generator of text deltas from one streaming provider call"""
+        raise NotImplementedError(f"{type(self).__name__} does not support streaming")
+
+    def _classify_error(self, error: Exception) -> ModelClientError:
+        """Map an exception raised by `_generate` onto the typed client errors"""
+        if isinstance(error, ModelClientError):
+            return error
+        message = f"{self.provider}: {error}"
+        status_code = getattr(error, "status_code", None)
+        if status_code is None:
+            if isinstance(error, (asyncio.TimeoutError, ConnectionError, httpx.TransportError)):
+                return TransientError(message, self.provider)
+            return PermanentError(message, self.provider)
+        if status_code == 429:
+            return RateLimitError(message, self.provider, status_code, retry_after_seconds(error))
+        if status_code in (408, 409) or status_code >= 500:
+            return TransientError(message, self.provider, status_code)
+        return PermanentError(message, self.provider, status_code)
+
+    def get_rate_limiter(self) -> RateLimiter:
+        """The limiter shared by all clients of this provider and model"""
+        return get_rate_limiter(self.provider, self.model_name)
+
+    def estimate_tokens(self, messages: List[Dict[str, str]]) -> int:
+        """Token reservation for a call: the counted input plus the full output budget"""
+        return count_message_tokens(messages, self.model_name) + self.max_tokens
+
+    def _record_usage(self, messages: List[Dict[str, str]], completion: Completion) -> None:
+        """Report a call's usage to the active usage scopes, counting locally what the provider did not report"""
+        input_tokens, output_tokens = completion.input_tokens, completion.output_tokens
+        estimated = input_tokens is None or output_tokens is None
+        if input_tokens is None:
+            input_tokens = count_message_tokens(messages, self.model_name)
+        if output_tokens is None:
+            output_tokens = count_tokens(completion.text, self.model_name)
+        record_usage(input_tokens, output_tokens, estimated)
+
+
+
+class SDKClient(ModelClient):
+    """
+    Base class for clients built on a provider's async SDK.
+
+    The SDK client is created per event loop on the provider's shared
+    keep-alive pool (or is the `client` passed in), with the SDK's own retries
+    disabled: ResilientClient owns retries, and every 429 reaches
+    `_classify_error` and the rate limiter instead of being retried silently.
+    Subclasses set `sdk_class`, `http_client_class`, `api_key_env` and the
+    SDK's `transient_errors`.
+    """
+
+    sdk_class: Any = None
+    http_client_class: Any = None
+    api_key_env: str = ""
+    # SDK exceptions with no status code that are still worth retrying (timeouts, dropped connections)
+    transient_errors: Tuple[type, ...] = ()
+
+    def __init__(
+        self,
+        model_name: str,
+        api_key: Optional[str] = None,
+        temperature: float = 0.0,
+        max_tokens: int = 4096,
+        pool_config: Optional[HTTPPoolConfig] = None,
+        client: Any = None
+    ):
+        self.model_name = model_name
+        self.api_key = api_key or os.environ.get(self.api_key_env)
+        if not self.api_key and client is None:
+            raise ValueError(f"{self.api_key_env} is required")
+
+        self.pool_config = pool_config or HTTPPoolConfig()
+        self._client = client
+        # event loop -> SDK client; an SDK client is bound to its loop's connection pool
+        self._loop_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Any]" = weakref.WeakKeyDictionary()
+        self.temperature = temperature
+        self.max_tokens = max_tokens
+
+    @property
+    def client(self) -> Any:
+        """Async SDK client on the running event loop's shared keep-alive pool (or the injected client)"""
+        if self._client is not None:
+            return self._client
+        loop = asyncio.get_running_loop()
+        client = self._loop_clients.get(loop)
+        if client is None:
+            http_client = get_shared_http_client(self.provider, self.pool_config, self.http_client_class)
+            client = self._loop_clients[loop] = self.sdk_class(api_key=self.api_key, http_client=http_client, max_retries=0)
+        return client
+
+    def _classify_error(self, error: Exception) -> ModelClientError:
+        """Timeouts and dropped connections from the SDK carry no status code but are transient"""
+        if isinstance(error, self.transient_errors):
+            return TransientError(f"{self.provider}: {error}", self.provider)
+        return super()._classify_error(error)
+
+@lru_cache(maxsize=None)
+def response_schema(response_model: Type[BaseModel]) -> Dict[str, Any]:
+    """JSON schema of a response model, as sent to providers (shared; do not mutate)"""
+    return response_model.model_json_schema()
+
+
+def generate_kwargs(response_model: Optional[Type[BaseModel]]) -> Dict[str, Any]:
+    """Keyword arguments forwarding a response model to `generate`; none without one, so plain clients keep working"""
+    return {"response_model": response_model} if response_model is not None else {}
+
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """Read a Retry-After header from an SDK error's HTTP response, if present"""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        value = headers.get("retry-after")
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
@@ -0,0 +1,144 @@
+from typing import Dict, List, Optional, Type
+from dataclasses import dataclass
+from pydantic import BaseModel
+from src.clients.openai import json_schema_format
+import asyncio
+import io
+import json
+
+
+@dataclass
+class BatchRequest:
+    """One chat completion to run inside a batch job"""
+    custom_id: str
+    messages: List[Dict[str, str]]
+    # Constrain the reply to this model, as ModelClient.generate(response_model=...) does
+    response_model: Optional[Type[BaseModel]] = None
+
+
+class OpenAIBatchBackend:
+    """
+    Runs chat completions through the OpenAI Batch API.
+
+    Requests are written to JSONL files, uploaded, submitted as batch jobs and
+    polled until the jobs finish; results are matched back by `custom_id`.
+    Batches trade latency (up to the completion window) for roughly half the
+    per-token price, which suits offline runs. Requests are split into as many
+    jobs as the API's per-batch limits need, which run concurrently, and the
+    uploaded input and downloaded output files are deleted once a job ends.
+
+    Args:
+        client: OpenAIClient whose SDK client, model and sampling parameters are used
+        poll_interval: Seconds between status checks
+        completion_window: Batch completion window accepted by the API
+        max_requests_per_job: Requests per batch job (API limit: 50,000)
+        max_bytes_per_job: Size of each job's input file (API limit: 200 MB)
+    """
+
+    TERMINAL_STATUSES = ("completed", "failed", "expired", "cancelled")
+    MAX_REQUESTS_PER_JOB = 50_000
+    MAX_BYTES_PER_JOB = 200 * 1024 * 1024
+    supports_structured_output = True
+
+    def __init__(
+        self,
+        client,
+        poll_interval: float = 30.0,
+        completion_window: str = "24h",
+        max_requests_per_job: int = MAX_REQUESTS_PER_JOB,
+        max_bytes_per_job: int = MAX_BYTES_PER_JOB
+    ):
+        self.client = client
+        self.poll_interval = poll_interval
+        self.completion_window = completion_window
+        self.max_requests_per_job = max_requests_per_job
+        self.max_bytes_per_job = max_bytes_per_job
+
+    def _line(self, request: BatchRequest) -> bytes:
+        body = {
+            "model": self.client.model_name,
+            "messages": request.messages,
+            "temperature": self.client.temperature,
+            "max_tokens": self.client.max_tokens
+        }
+        if request.response_model is not None:
+            body["response_format"] = json_schema_format(request.response_model)
+        return (json.dumps({
+            "custom_id": request.custom_id,
+            "method": "POST",
+            "url": "/v1/chat/completions",
+            "body": body
+        }) + "\n").encode("utf-8")
+
+    def _jobs(self, requests: List[BatchRequest]) -> List[bytes]:
+        """JSONL input files, each within the per-job request and size limits"""
+        jobs, lines, size = [], [], 0
+        for request in requests:
+            line = self._line(request)
+            if lines and (len(lines) >= self.max_requests_per_job or size + len(line) > self.max_bytes_per_job):
+                jobs.append(b"".join(lines))
+                lines, size = [], 0
+            lines.append(line)
+            size += len(line)
+        if lines:
+            jobs.append(b"".join(lines))
+        return jobs
+
+    async def run(self, requests: List[BatchRequest]) -> Dict[str, str]:
+        """
+        Submit requests as batch jobs and wait for all of them.
+
+        Returns:
+            custom_id -> response text for every request that succeeded; failed
+            or missing requests are left out for the caller to retry another way
+        """
+        results: Dict[str, str] = {}
+        for job_results in await asyncio.gather(*(self._run_job(jsonl) for jsonl in self._jobs(requests))):
+            results.update(job_results)
+        return results
+
+    async def _run_job(self, jsonl: bytes) -> Dict[str, str]:
+        """Upload, submit and wait for one batch job, deleting its files afterwards"""
+        sdk = self.client.client
+        input_file = await sdk.files.create(file=("batch_input.jsonl", io.BytesIO(jsonl)), purpose="batch")
+        file_ids = [input_file.id]
+        try:
+            batch = await sdk.batches.create(
+                input_file_id=input_file.id,
+                endpoint="/v1/chat/completions",
+                completion_window=self.completion_window
+            )
+            while batch.status not in self.TERMINAL_STATUSES:
+                await asyncio.sleep(self.poll_interval)
+                batch = await sdk.batches.retrieve(batch.id)
+
+            file_ids += [f for f in (batch.output_file_id, getattr(batch, "error_file_id", None)) if f]
+            if not batch.output_file_id:
+                print(f"Batch {batch.id} ended with status {batch.status} and no output")
+                return {}
+            content = await sdk.files.content(batch.output_file_id)
+            return self._parse_output(content.text)
+        finally:
+            await self._delete_files(sdk, file_ids)
+
+    @staticmethod
+    async def _delete_files(sdk, file_ids: List[str]) -> None:
+        for file_id in file_ids:
+            try:
+                await sdk.files.delete(file_id)
+            except Exception as e:
+                # Leftover files only cost storage; keep the results
+                print(f"Could not delete batch file {file_id}: {e}")
+
+    @staticmethod
+    def _parse_output(text: str) -> Dict[str, str]:
+        results = {}
+        for line in text.splitlines():
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            response = record.get("response") or {}
+            if record.get("error") or response.get("status_code") != 200:
+                continue
+            results[record["custom_id"]] = response["body"]["choices"][0]["message"]["content"]
+        return results
@@ -0,0 +1,206 @@
+from typing import Any, AsyncIterator, Dict, List, Optional, Type
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from pydantic import BaseModel
+from src.clients.base import generate_kwargs, response_schema
+from src.clients.errors import ReplayMissError
+
+
+def request_key(client: Any, messages: List[Dict[str, str]], response_model: Optional[Type[BaseModel]] = None) -> str:
+    """
+    Canonical hash of a request: provider, model, sampling parameters,
+    messages and, for structured output, the response schema.
+
+    Messages are serialized with sorted keys and no whitespace so that
+    logically identical requests hash the same.
+    """
+    payload = {
+        "provider": getattr(client, "provider", None),
+        "model": getattr(client, "model_name", None),
+        "temperature": getattr(client, "temperature", None),
+        "max_tokens": getattr(client, "max_tokens", None),
+        "messages": messages
+    }
+    if response_model is not None:
+        payload["response_schema"] = response_schema(response_model)
+    canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    SQLite-backed store of LLM responses keyed by `request_key`.
+
+    Args:
+        path: Database file (":memory:" for a throwaway cache)
+        ttl: Seconds an entry stays valid; None keeps entries forever
+        max_entries: Least recently used entries beyond this are evicted; None disables the cap
+    """
+
+    # Size eviction runs once every this many writes rather than on each one
+    EVICT_EVERY = 100
+
+    def __init__(self, path: str, ttl: Optional[float] = None, max_entries: Optional[int] = 100_000):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        if path != ":memory:":
+            self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY, model TEXT, response TEXT NOT NULL,"
+            " created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed_at)")
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def get(self, key: str, touch: bool = True) -> Optional[str]:
+        """
+        Cached response for a key, or None if missing or expired.
+
+        With `touch=False` the lookup never writes, leaving the database as recorded.
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT response, created_at FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is not None and self.ttl is not None and now - row[1] > self.ttl:
+                if touch:
+                    self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            if touch:
+                self._conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+            self.hits += 1
+            return row[0]
+
+    def put(self, key: str, response: str, model: Optional[str] = None) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, model, response, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (key, model, response, now, now)
+            )
+            self._writes += 1
+            if self._writes % self.EVICT_EVERY == 0:
+                self._evict_locked()
+
+    def evict(self) -> None:
+        """Drop expired entries and trim to `max_entries`"""
+        with self._lock:
+            self._evict_locked()
+
+    def _evict_locked(self) -> None:
+        if self.ttl is not None:
+            self._conn.execute("DELETE FROM responses WHERE created_at < ?", (time.time() - self.ttl,))
+        if self.max_entries is not None:
+            self._conn.execute(
+                "DELETE FROM responses WHERE key IN ("
+                " SELECT key FROM responses ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class CachedClient:
+    """
+    Wraps any model client with a deterministic response cache.
+
+    Modes:
+        "read_write": serve hits from the cache, call the client and store on misses
+        "replay": serve hits only; a miss raises ReplayMissError without calling the client
+        "record": always call the client and overwrite the cached response
+
+    Only successful responses are stored. Streams pass straight through and
+    are not cached, except in "replay" mode, where the recorded response is
+    served as a single delta so replays stay offline.
+    """
+
+    MODES = ("read_write", "replay", "record")
+
+    def __init__(self, client: Any, cache: ResponseCache, mode: str = "read_write"):
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown cache mode: {mode}. Expected one of {self.MODES}")
+        self.client = client
+        self.cache = cache
+        self.mode = mode
+
+    @property
+    def provider(self) -> str:
+        return self.client.provider
+
+    @property
+    def model_name(self) -> str:
+        return self.client.model_name
+
+    @property
+    def temperature(self) -> Optional[float]:
+        return getattr(self.client, "temperature", None)
+
+    @property
+    def max_tokens(self) -> Optional[int]:
+        return getattr(self.client, "max_tokens", None)
+
+    @property
+    def supports_structured_output(self) -> bool:
+        return getattr(self.client, "supports_structured_output", False) is True
+
+    async def generate(self, messages: List[Dict[str, str]], response_model: Optional[Type[BaseModel]] = None) -> str:
+        key = request_key(self.client, messages, response_model)
+        if self.mode != "record":
+            # Replay reads leave recorded fixtures untouched
+            cached = self.cache.get(key, touch=self.mode != "replay")
+            if cached is not None:
+                return cached
+            if self.mode == "replay":
+                raise ReplayMissError(f"No recorded response for request {key[:12]}", self.provider)
+
+        response = await self.client.generate(messages, **generate_kwargs(response_model))
+        self.cache.put(key, response, self.model_name)
+        return response
+
+    async def generate_stream(self, messages: List[Dict[str, str]]) -> AsyncIterator[str]:
+        if self.mode == "replay" or not hasattr(self.client, "generate_stream"):
+            yield await self.generate(messages)
+            return
+        deltas = self.client.generate_stream(messages)
+        try:
+            async for delta in deltas:
+                yield delta
+        finally:
+            await deltas.aclose()
+
+
+def cached_client_from_env(client: Any) -> Any:
+    """
+    Wrap a client in a CachedClient when LLM_CACHE_PATH is set.
+
+    LLM_CACHE_MODE selects the mode ("read_write" by default, "replay" to run
+    offline against recorded responses) and LLM_CACHE_TTL an optional TTL in
+    seconds. Without LLM_CACHE_PATH the client is returned unchanged.
+    """
+    path = os.environ.get("LLM_CACHE_PATH")
+    if not path:
+        return client
+    ttl = os.environ.get("LLM_CACHE_TTL")
+    cache = ResponseCache(path, ttl=float(ttl) if ttl else None)
+    return CachedClient(client, cache, mode=os.environ.get("LLM_CACHE_MODE", "read_write"))
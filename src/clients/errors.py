@@ -0,0 +1,45 @@
+from typing import Optional
+
+
+class ModelClientError(Exception):
+    """Base class for errors raised by model clients"""
+
+    # Whether retrying the same call may succeed
+    retryable: bool = False
+
+    def __init__(
+        self,
+        message: str,
+        provider: Optional[str] = None,
+        status_code: Optional[int] = None,
+        retry_after: Optional[float] = None
+    ):
+        super().__init__(message)
+        self.provider = provider
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class TransientError(ModelClientError):
+    """Timeouts, dropped connections and 5xx responses"""
+    retryable = True
+
+
+class RateLimitError(TransientError):
+    """The provider answered 429; `retry_after` holds its Retry-After hint if any"""
+
+
+class DeadlineExceeded(TransientError):
+    """The call did not finish within its deadline"""
+
+
+class PermanentError(ModelClientError):
+    """Errors that will not go away on retry (bad request, authentication, ...)"""
+
+
+class ReplayMissError(PermanentError):
+    """A replay-mode response cache has no recorded response for the request"""
+
+
+class CircuitOpenError(ModelClientError):
+    """The provider's circuit breaker is open and calls are being short-circuited"""
@@ -0,0 +1,68 @@
+from typing import Any, Callable, Dict, Tuple
+from dataclasses import dataclass
+import asyncio
+import weakref
+import httpx
+
+
+@dataclass(frozen=True)
+class HTTPPoolConfig:
+    """Connection pool and timeout settings shared by async LLM clients"""
+    max_connections: int = 200
+    max_keepalive_connections: int = 50
+    keepalive_expiry: float = 30.0
+    connect_timeout: float = 10.0
+    read_timeout: float = 120.0
+    write_timeout: float = 30.0
+    pool_timeout: float = 60.0
+
+    def limits(self) -> httpx.Limits:
+        return httpx.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_keepalive_connections,
+            keepalive_expiry=self.keepalive_expiry
+        )
+
+    def timeout(self) -> httpx.Timeout:
+        return httpx.Timeout(
+            connect=self.connect_timeout,
+            read=self.read_timeout,
+            write=self.write_timeout,
+            pool=self.pool_timeout
+        )
+
+
+# event loop -> {(provider, config): pooled client}. Pooled connections belong
+# to the loop that opened them, so each loop gets its own pool; holding the loop
+# weakly drops its pools once the loop is garbage collected.
+_shared_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[Tuple[str, HTTPPoolConfig], Any]]" = weakref.WeakKeyDictionary()
+
+
+def get_shared_http_client(provider: str, config: HTTPPoolConfig, factory: Callable[..., Any]) -> Any:
+    """
+    Get the keep-alive HTTP client shared by all clients of a provider.
+
+    Must be called from inside a running event loop.
+
+    Args:
+        provider: Provider name, e.g. "openai"
+        config: Pool and timeout settings
+        factory: The SDK's async httpx client class (e.g. openai.DefaultAsyncHttpxClient)
+
+    Returns:
+        An httpx.AsyncClient-compatible client
+    """
+    clients = _shared_clients.setdefault(asyncio.get_running_loop(), {})
+    key = (provider, config)
+    client = clients.get(key)
+    if client is None or client.is_closed:
+        client = factory(limits=config.limits(), timeout=config.timeout())
+        clients[key] = client
+    return client
+
+
+async def close_shared_http_clients() -> None:
+    """Close the pooled clients opened on the current event loop"""
+    clients = _shared_clients.pop(asyncio.get_running_loop(), {})
+    for client in clients.values():
+        await client.aclose()
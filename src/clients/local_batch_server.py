@@ -0,0 +1,170 @@
+from typing import Any, Callable, Dict, Optional
+from email.parser import BytesParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import itertools
+import json
+import threading
+import time
+
+
+class LocalBatchServer:
+    """
+    In-process stand-in for the OpenAI Files and Batch endpoints.
+
+    Point an OpenAI SDK client at `base_url` to exercise the batch backend
+    without network access. Each chat completion in a submitted batch is
+    answered by `responder(body)`; a responder that raises produces an error
+    line for that request. Batches report "in_progress" for `polls_until_done`
+    status checks before completing.
+
+    Usage:
+        with LocalBatchServer(lambda body: "...") as server:
+            sdk = openai.AsyncOpenAI(api_key="test", base_url=server.base_url)
+    """
+
+    def __init__(self, responder: Callable[[Dict[str, Any]], str], polls_until_done: int = 1):
+        self.responder = responder
+        self.polls_until_done = polls_until_done
+        self.files: Dict[str, bytes] = {}
+        self.batches: Dict[str, Dict[str, Any]] = {}
+        self.submitted = 0
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def __enter__(self) -> "LocalBatchServer":
+        self.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def start(self) -> None:
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _reply(self, status: int, body: Any, raw: bool = False) -> None:
+                payload = body if raw else json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/octet-stream" if raw else "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                if self.path == "/v1/files":
+                    self._reply(200, server._upload(self.headers.get("Content-Type", ""), body))
+                elif self.path == "/v1/batches":
+                    self._reply(200, server._create_batch(json.loads(body)))
+                else:
+                    self._reply(404, {"error": {"message": f"Unknown path {self.path}"}})
+
+            def do_GET(self):
+                parts = self.path.strip("/").split("/")
+                if parts[:2] == ["v1", "batches"] and len(parts) == 3:
+                    self._reply(200, server._poll_batch(parts[2]))
+                elif parts[:2] == ["v1", "files"] and len(parts) == 4 and parts[3] == "content":
+                    self._reply(200, server.files[parts[2]], raw=True)
+                else:
+                    self._reply(404, {"error": {"message": f"Unknown path {self.path}"}})
+
+            def do_DELETE(self):
+                parts = self.path.strip("/").split("/")
+                if parts[:2] == ["v1", "files"] and len(parts) == 3 and parts[2] in server.files:
+                    del server.files[parts[2]]
+                    self._reply(200, {"id": parts[2], "object": "file", "deleted": True})
+                else:
+                    self._reply(404, {"error": {"message": f"Unknown path {self.path}"}})
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def _new_id(self, prefix: str) -> str:
+        with self._lock:
+            return f"{prefix}-{next(self._ids)}"
+
+    def _upload(self, content_type: str, body: bytes) -> Dict[str, Any]:
+        message = BytesParser().parsebytes(f"Content-Type: {content_type}\r\n\r\n".encode("utf-8") + body)
+        part = next(p for p in message.get_payload() if p.get_param("name", header="content-disposition") == "file")
+        content = part.get_payload(decode=True)
+        file_id = self._new_id("file")
+        self.files[file_id] = content
+        return self._file_object(file_id, part.get_filename() or "upload.jsonl", "batch")
+
+    def _file_object(self, file_id: str, filename: str, purpose: str) -> Dict[str, Any]:
+        return {
+            "id": file_id,
+            "object": "file",
+            "bytes": len(self.files[file_id]),
+            "created_at": int(time.time()),
+            "filename": filename,
+            "purpose": purpose,
+            "status": "processed"
+        }
+
+    def _create_batch(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        batch_id = self._new_id("batch")
+        lines = []
+        for line in self.files[params["input_file_id"]].decode("utf-8").splitlines():
+            if not line.strip():
+                continue
+            request = json.loads(line)
+            self.submitted += 1
+            try:
+                content = self.responder(request["body"])
+                response = {"status_code": 200, "request_id": batch_id, "body": {
+                    "id": f"chatcmpl-{request['custom_id']}",
+                    "object": "chat.completion",
+                    "model": request["body"].get("model"),
+                    "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": content}}]
+                }}
+                lines.append({"id": batch_id, "custom_id": request["custom_id"], "response": response, "error": None})
+            except Exception as e:
+                lines.append({"id": batch_id, "custom_id": request["custom_id"], "response": None,
+                              "error": {"code": "server_error", "message": str(e)}})
+
+        output_id = self._new_id("file")
+        self.files[output_id] = "\n".join(json.dumps(line) for line in lines).encode("utf-8")
+        self.batches[batch_id] = {
+            "id": batch_id,
+            "object": "batch",
+            "endpoint": params["endpoint"],
+            "input_file_id": params["input_file_id"],
+            "completion_window": params["completion_window"],
+            "created_at": int(time.time()),
+            "status": "in_progress",
+            "polls": 0,
+            "result_file_id": output_id
+        }
+        return self._batch_object(batch_id)
+
+    def _poll_batch(self, batch_id: str) -> Dict[str, Any]:
+        batch = self.batches[batch_id]
+        batch["polls"] += 1
+        if batch["polls"] >= self.polls_until_done:
+            batch["status"] = "completed"
+        return self._batch_object(batch_id)
+
+    def _batch_object(self, batch_id: str) -> Dict[str, Any]:
+        batch = dict(self.batches[batch_id])
+        result_file_id = batch.pop("result_file_id")
+        batch.pop("polls")
+        batch["output_file_id"] = result_file_id if batch["status"] == "completed" else None
+        return batch
@@ -1,39 +1,71 @@
-from typing import List, Dict, Any, Tuple  
-from src.clients.base import ModelClient  
-import os  
+from typing import AsyncIterator, List, Dict, Any, Optional, Type  
+from pydantic import BaseModel  
+from src.clients.base import Completion, SDKClient, response_schema
+from src.clients.http import HTTPPoolConfig  
 import openai  
-import asyncio  
   
-class OpenAIClient(ModelClient):  
+def json_schema_format(response_model: Type[BaseModel]) -> Dict[str, Any]:  
+    """Chat completions `response_format` constraining the reply to a response model"""  
+    # Not strict: strict mode rejects the free-form objects answers may hold  
+    return {  
+        "type": "json_schema",  
+        "json_schema": {"name": response_model.__name__, "schema": response_schema(response_model)}  
+    }  
+  
+  
+class OpenAIClient(SDKClient):  
     """Client for OpenAI models"""  
       
+    provider = "openai"  
+    supports_structured_output = True  
+    sdk_class = openai.AsyncOpenAI  
+    http_client_class = openai.DefaultAsyncHttpxClient  
+    api_key_env = "OPENAI_API_KEY"  
+    transient_errors = (openai.APITimeoutError, openai.APIConnectionError)  
+      
     def __init__(  
         self,  
         model_name: str = "gpt-4o",  
         api_key: str = None,  
         temperature: float = 0.0,  
-        max_tokens: int = 4096  
+        max_tokens: int = 4096,  
+        pool_config: Optional[HTTPPoolConfig] = None,  
+        client: Optional[openai.AsyncOpenAI] = None  
     ):  
-        self.model_name = model_name  
-        self.api_key = api_key or os.environ.get("OPENAI_API_KEY")  
-        if not self.api_key:  
-            raise ValueError("OpenAI API key is required")  
-          
-        self.client = openai.OpenAI(api_key=self.api_key)  
-        self.temperature = temperature  
-        self.max_tokens = max_tokens  
+        super().__init__(model_name, api_key, temperature, max_tokens, pool_config, client)  
       
-    async def generate(self, messages: List[Dict[str, str]]) -> str:  
+    async def _generate(self, messages: List[Dict[str, str]], response_model: Optional[Type[BaseModel]] = None) -> Completion:  
         """Generate a response from the OpenAI model"""  
+        params = {}  
+        if response_model is not None:  
+            params["response_format"] = json_schema_format(response_model)  
+        response = await self.client.chat.completions.create(  
+            model=self.model_name,  
+            messages=messages,  
+            temperature=self.temperature,  
+            max_tokens=self.max_tokens,  
+            **params  
+        )  
+        usage = getattr(response, "usage", None)  
+        return Completion(  
+            text=response.choices[0].message.content,  
+            input_tokens=getattr(usage, "prompt_tokens", None),  
+            output_tokens=getattr(usage, "completion_tokens", None)  
+        )  
+      
+    async def _stream(self, messages: List[Dict[str, str]]) -> AsyncIterator[str]:  
+        """Stream text deltas from the OpenAI model"""  
+        stream = await self.client.chat.completions.create(  
+            model=self.model_name,  
+            messages=messages,  
+            temperature=self.temperature,  
+            max_tokens=self.max_tokens,  
+            stream=True  
+        )  
         try:  
-            response = await asyncio.to_thread(  
-                self.client.chat.completions.create,  
-                model=self.model_name,  
-                messages=messages,  
-                temperature=self.temperature,  
-                max_tokens=self.max_tokens  
-            )  
-            return response.choices[0].message.content  
-        except Exception as e:  
-            print(f"Error generating response from OpenAI: {e}")  
-            return f"Error: {str(e)}"
\ No newline at end of file
+            async for chunk in stream:  
+                if chunk.choices and chunk.choices[0].delta.content:  
+                    yield chunk.choices[0].delta.content  
+        finally:  
+            # Closing the response aborts generation on the server side  
+            await stream.close()  
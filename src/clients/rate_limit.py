@@ -0,0 +1,182 @@
+from typing import Dict, Optional, Tuple
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+import asyncio
+import time
+import weakref
+
+
+@dataclass(frozen=True)
+class RateLimitConfig:
+    """Provider/model throughput limits"""
+    requests_per_minute: float = 500
+    tokens_per_minute: float = 200_000
+    max_concurrency: int = 64
+    initial_concurrency: int = 8
+    min_concurrency: int = 1
+    # Calls slower than this (seconds) count as an overload signal; None disables it
+    latency_target: Optional[float] = None
+
+
+class TokenBucket:
+    """Async token bucket refilled continuously at `rate_per_minute`"""
+
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity if capacity is not None else rate_per_minute
+        self.tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, amount: float = 1.0) -> None:
+        """Wait until `amount` tokens are available and take them"""
+        # Requests larger than the bucket wait for a full bucket and go into debt
+        needed = min(amount, self.capacity)
+        async with self._lock:
+            self._refill()
+            while self.tokens < needed:
+                await asyncio.sleep((needed - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= amount
+
+    def refund(self, amount: float) -> None:
+        """Return tokens that were reserved but not used"""
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class AdaptiveConcurrency:
+    """
+    AIMD concurrency limit.
+
+    Each success raises the limit by about one per window of calls; a rate
+    limit halves it and a slow call shrinks it by 10%.
+    """
+
+    def __init__(self, initial: int = 8, min_limit: int = 1, max_limit: int = 64):
+        self.limit = float(initial)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.in_flight = 0
+        self._condition = asyncio.Condition()
+
+    async def acquire(self) -> None:
+        async with self._condition:
+            while self.in_flight >= int(self.limit):
+                await self._condition.wait()
+            self.in_flight += 1
+
+    async def release(self) -> None:
+        async with self._condition:
+            self.in_flight -= 1
+            self._condition.notify_all()
+
+    def on_success(self) -> None:
+        self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+
+    def on_overload(self, factor: float = 0.5) -> None:
+        self.limit = max(self.min_limit, self.limit * factor)
+
+
+class RateLimiter:
+    """
+    Requests/tokens-per-minute buckets plus adaptive concurrency for one provider/model.
+
+    One limiter is shared by every client (and therefore every agent)
+    talking to the same provider and model; see `get_rate_limiter`.
+    """
+
+    def __init__(self, config: Optional[RateLimitConfig] = None):
+        self.config = config or RateLimitConfig()
+        self.requests = TokenBucket(self.config.requests_per_minute)
+        self.tokens = TokenBucket(self.config.tokens_per_minute)
+        self.concurrency = AdaptiveConcurrency(
+            self.config.initial_concurrency,
+            self.config.min_concurrency,
+            self.config.max_concurrency
+        )
+        self._paused_until = 0.0
+        self.rate_limited_count = 0
+
+    @asynccontextmanager
+    async def slot(self, estimated_tokens: int):
+        """
+        Hold a request slot for the duration of one call.
+
+        Yields a RateLimitSlot used to report how the call went.
+        """
+        pause = self._paused_until - time.monotonic()
+        if pause > 0:
+            await asyncio.sleep(pause)
+        await self.concurrency.acquire()
+        try:
+            await self.requests.acquire(1)
+            await self.tokens.acquire(estimated_tokens)
+            slot = RateLimitSlot(self, estimated_tokens)
+            yield slot
+        finally:
+            await self.concurrency.release()
+
+    def on_rate_limited(self, retry_after: Optional[float] = None) -> None:
+        self.rate_limited_count += 1
+        self.concurrency.on_overload(0.5)
+        if retry_after:
+            self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+
+    def on_success(self, latency: float, estimated_tokens: int, actual_tokens: Optional[int]) -> None:
+        if actual_tokens is not None and actual_tokens < estimated_tokens:
+            self.tokens.refund(estimated_tokens - actual_tokens)
+        if self.config.latency_target is not None and latency > self.config.latency_target:
+            self.concurrency.on_overload(0.9)
+        else:
+            self.concurrency.on_success()
+
+
+class RateLimitSlot:
+    """Handle for reporting the outcome of a single rate-limited call"""
+
+    def __init__(self, limiter: RateLimiter, estimated_tokens: int):
+        self.limiter = limiter
+        self.estimated_tokens = estimated_tokens
+        self.started = time.monotonic()
+
+    def succeeded(self, actual_tokens: Optional[int] = None) -> None:
+        self.limiter.on_success(time.monotonic() - self.started, self.estimated_tokens, actual_tokens)
+
+    def rate_limited(self, retry_after: Optional[float] = None) -> None:
+        self.limiter.on_rate_limited(retry_after)
+
+
+_configs: Dict[Tuple[str, Optional[str]], RateLimitConfig] = {}
+# event loop -> {(provider, model): limiter}. The limiter's asyncio primitives belong
+# to one loop; holding the loop weakly drops its limiters once the loop is collected.
+_limiters: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[Tuple[str, str], RateLimiter]]" = weakref.WeakKeyDictionary()
+
+
+def configure_rate_limit(provider: str, config: RateLimitConfig, model_name: Optional[str] = None) -> None:
+    """
+    Set limits for a provider, or for one model of a provider.
+
+    Affects limiters created afterwards.
+    """
+    _configs[(provider, model_name)] = config
+
+
+def get_rate_limiter(provider: str, model_name: str) -> RateLimiter:
+    """Get the limiter shared by all clients of a provider/model pair on the running event loop"""
+    limiters = _limiters.setdefault(asyncio.get_running_loop(), {})
+    key = (provider, model_name)
+    if key not in limiters:
+        config = _configs.get((provider, model_name)) or _configs.get((provider, None))
+        limiters[key] = RateLimiter(config)
+    return limiters[key]
+
+
+def reset_rate_limiters() -> None:
+    """Drop all limiters (e.g. between event loops or in tests)"""
+    _limiters.clear()
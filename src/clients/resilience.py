@@ -0,0 +1,317 @@
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional, Sequence, Type
+from collections import deque
+from dataclasses import dataclass
+import asyncio
+import random
+import time
+from pydantic import BaseModel
+from src.clients.base import ModelClient, generate_kwargs
+from src.clients.errors import CircuitOpenError, DeadlineExceeded, ModelClientError, PermanentError, RateLimitError
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    """Jittered exponential backoff for retryable client errors"""
+    max_attempts: int = 4
+    base_delay: float = 0.5
+    max_delay: float = 20.0
+
+    def delay(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """
+        Seconds to wait before retry number `attempt` (0-based).
+
+        Uses "full jitter": a uniform draw below the exponential cap, so
+        clients that failed together do not retry together. A server
+        Retry-After hint is treated as a lower bound.
+        """
+        cap = min(self.max_delay, self.base_delay * (2 ** attempt))
+        delay = random.uniform(0, cap)
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        return delay
+
+
+class CircuitBreaker:
+    """
+    Per-provider circuit breaker.
+
+    Opens after `failure_threshold` consecutive failures and short-circuits
+    calls for `reset_timeout` seconds; then lets exactly one trial call
+    through (half-open) and closes again on its success. Other callers are
+    refused until the trial resolves, or until `reset_timeout` has passed
+    without it resolving (e.g. it was cancelled).
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self._opened_at: Optional[float] = None
+        self._trial_started: Optional[float] = None
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return self.CLOSED
+        if time.monotonic() - self._opened_at >= self.reset_timeout:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    def allow(self) -> bool:
+        """Whether a call may proceed; in the half-open state, grants the single trial call"""
+        state = self.state
+        if state != self.HALF_OPEN:
+            return state == self.CLOSED
+        now = time.monotonic()
+        if self._trial_started is not None and now - self._trial_started < self.reset_timeout:
+            return False
+        self._trial_started = now
+        return True
+
+    def release(self) -> None:
+        """End a call that says nothing about the provider's health (rate limited, bad request)"""
+        self._trial_started = None
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self._opened_at = None
+        self._trial_started = None
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            self._opened_at = time.monotonic()
+        self._trial_started = None
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+
+
+def get_circuit_breaker(provider: str) -> CircuitBreaker:
+    """Get the breaker shared by all resilient clients of a provider"""
+    if provider not in _breakers:
+        _breakers[provider] = CircuitBreaker()
+    return _breakers[provider]
+
+
+def reset_circuit_breakers() -> None:
+    """Drop all breakers (e.g. in tests)"""
+    _breakers.clear()
+
+
+class LatencyTracker:
+    """Rolling window of successful call latencies"""
+
+    def __init__(self, window: int = 200, min_samples: int = 20):
+        self.samples: Deque[float] = deque(maxlen=window)
+        self.min_samples = min_samples
+
+    def record(self, latency: float) -> None:
+        self.samples.append(latency)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """The q-quantile of recent latencies, or None until enough samples are in"""
+        if len(self.samples) < self.min_samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class ResilientClient:
+    """
+    Retries, deadlines, hedging and failover around one or more model clients.
+
+    Each call tries `clients` in order, skipping any whose provider circuit is
+    open. Against a client, retryable errors are retried with jittered backoff
+    until the attempts or the deadline run out; permanent errors move straight
+    on to the next client. With `hedge_quantile` set, a duplicate request is
+    sent once a call has been outstanding longer than that latency quantile
+    and whichever answers first wins.
+
+    Args:
+        clients: Primary client followed by fallbacks
+        retry_policy: Backoff settings
+        deadline: Total seconds allowed per `generate` call, retries included
+        hedge_quantile: Latency quantile (e.g. 0.95) after which to hedge; None disables hedging
+    """
+
+    def __init__(
+        self,
+        clients: Sequence,
+        retry_policy: Optional[RetryPolicy] = None,
+        deadline: Optional[float] = 120.0,
+        hedge_quantile: Optional[float] = None
+    ):
+        if not clients:
+            raise ValueError("At least one client is required")
+        self.clients = list(clients)
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.deadline = deadline
+        self.hedge_quantile = hedge_quantile
+        self._latencies: Dict[int, LatencyTracker] = {id(client): LatencyTracker() for client in self.clients}
+        self.stats = {"retries": 0, "hedges": 0, "failovers": 0}
+
+    @property
+    def provider(self) -> str:
+        return self.clients[0].provider
+
+    @property
+    def model_name(self) -> str:
+        return self.clients[0].model_name
+
+    @property
+    def temperature(self) -> Optional[float]:
+        return getattr(self.clients[0], "temperature", None)
+
+    @property
+    def max_tokens(self) -> Optional[int]:
+        return getattr(self.clients[0], "max_tokens", None)
+
+    @property
+    def supports_structured_output(self) -> bool:
+        # Any client may end up serving a call, so every one must support it
+        return all(getattr(client, "supports_structured_output", False) is True for client in self.clients)
+
+    async def generate(self, messages: List[Dict[str, str]], response_model: Optional[Type[BaseModel]] = None) -> str:
+        """Generate a response, raising the last ModelClientError if every client fails"""
+        expires_at = time.monotonic() + self.deadline if self.deadline is not None else None
+        last_error: Optional[ModelClientError] = None
+
+        for index, client in enumerate(self.clients):
+            if index > 0:
+                self.stats["failovers"] += 1
+            breaker = get_circuit_breaker(client.provider)
+            if not breaker.allow():
+                last_error = CircuitOpenError(f"Circuit open for {client.provider}", client.provider)
+                continue
+            try:
+                return await self._generate_with_retries(client, breaker, messages, expires_at, response_model)
+            except DeadlineExceeded:
+                raise
+            except ModelClientError as e:
+                last_error = e
+
+        raise last_error
+
+    async def generate_stream(self, messages: List[Dict[str, str]]) -> AsyncIterator[str]:
+        """
+        Stream a response from the first client whose circuit is closed.
+
+        A stream that fails before yielding anything fails over to the next
+        client; once deltas have been yielded, errors are raised as they are.
+        """
+        last_error: Optional[ModelClientError] = None
+        for client in self.clients:
+            if not hasattr(client, "generate_stream"):
+                continue
+            breaker = get_circuit_breaker(client.provider)
+            if not breaker.allow():
+                last_error = CircuitOpenError(f"Circuit open for {client.provider}", client.provider)
+                continue
+            started = False
+            deltas = client.generate_stream(messages)
+            try:
+                async for delta in deltas:
+                    started = True
+                    yield delta
+            except ModelClientError as e:
+                if isinstance(e, (PermanentError, RateLimitError)):
+                    breaker.release()
+                else:
+                    breaker.record_failure()
+                if started:
+                    raise
+                last_error = e
+                self.stats["failovers"] += 1
+                continue
+            finally:
+                await deltas.aclose()
+            breaker.record_success()
+            return
+        if last_error is None:
+            raise TypeError("No wrapped client supports streaming")
+        raise last_error
+
+    async def _generate_with_retries(self, client, breaker: CircuitBreaker, messages, expires_at: Optional[float], response_model=None) -> str:
+        for attempt in range(self.retry_policy.max_attempts):
+            try:
+                text = await self._attempt(client, messages, expires_at, response_model)
+            except PermanentError:
+                breaker.release()
+                raise
+            except DeadlineExceeded:
+                breaker.record_failure()
+                raise
+            except ModelClientError as e:
+                if isinstance(e, RateLimitError):
+                    # Throttling is not an outage; the rate limiter already backs off
+                    breaker.release()
+                else:
+                    breaker.record_failure()
+                if not breaker.allow() or attempt == self.retry_policy.max_attempts - 1:
+                    raise
+                delay = self.retry_policy.delay(attempt, e.retry_after)
+                if expires_at is not None and time.monotonic() + delay >= expires_at:
+                    raise
+                self.stats["retries"] += 1
+                await asyncio.sleep(delay)
+                continue
+            breaker.record_success()
+            return text
+
+    async def _attempt(self, client, messages, expires_at: Optional[float], response_model=None) -> str:
+        """One (possibly hedged) call, bounded by the remaining deadline"""
+        remaining = None
+        if expires_at is not None:
+            remaining = expires_at - time.monotonic()
+            if remaining <= 0:
+                raise DeadlineExceeded("Deadline exceeded before the call started", client.provider)
+        try:
+            return await asyncio.wait_for(self._hedged_call(client, messages, response_model), timeout=remaining)
+        except asyncio.TimeoutError:
+            raise DeadlineExceeded(f"{client.provider} call exceeded its deadline", client.provider)
+
+    async def _hedged_call(self, client, messages, response_model=None) -> str:
+        kwargs = generate_kwargs(response_model)
+        tracker = self._latencies[id(client)]
+        hedge_after = tracker.quantile(self.hedge_quantile) if self.hedge_quantile is not None else None
+        started = time.monotonic()
+
+        first = asyncio.ensure_future(client.generate(messages, **kwargs))
+        if hedge_after is None:
+            text = await first
+            tracker.record(time.monotonic() - started)
+            return text
+
+        pending = {first}
+        try:
+            done, pending = await asyncio.wait(pending, timeout=hedge_after)
+            if not done:
+                self.stats["hedges"] += 1
+                pending.add(asyncio.ensure_future(client.generate(messages, **kwargs)))
+            error = None
+            while pending or done:
+                for task in done:
+                    if task.exception() is None:
+                        tracker.record(time.monotonic() - started)
+                        return task.result()
+                    error = task.exception()
+                if not pending:
+                    break
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+
+def with_retries(client: Any) -> Any:
+    """
+    A bare ModelClient wrapped in a ResilientClient; anything else (an
+    existing wrapper, a test double) is returned unchanged.
+    """
+    return ResilientClient([client]) if isinstance(client, ModelClient) else client
@@ -0,0 +1,74 @@
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple, Type
+import asyncio
+from pydantic import BaseModel
+from src.clients.base import generate_kwargs
+from src.clients.cache import request_key
+
+
+class SingleFlightClient:
+    """
+    Coalesces concurrent identical requests into one upstream call.
+
+    While a request is in flight, further calls with the same `request_key`
+    await the same future instead of calling the wrapped client again; all of
+    them receive its result, or its exception. Nothing is kept once the call
+    finishes, so later identical requests go upstream again (wrap in a
+    CachedClient for that). Streams pass straight through uncoalesced.
+    """
+
+    def __init__(self, client: Any):
+        self.client = client
+        # (request key, event loop id) -> in-flight call
+        self._in_flight: Dict[Tuple[str, int], asyncio.Future] = {}
+        self.coalesced = 0
+
+    @property
+    def provider(self) -> str:
+        return self.client.provider
+
+    @property
+    def model_name(self) -> str:
+        return self.client.model_name
+
+    @property
+    def temperature(self):
+        return getattr(self.client, "temperature", None)
+
+    @property
+    def max_tokens(self):
+        return getattr(self.client, "max_tokens", None)
+
+    @property
+    def supports_structured_output(self) -> bool:
+        return getattr(self.client, "supports_structured_output", False) is True
+
+    async def generate(self, messages: List[Dict[str, str]], response_model: Optional[Type[BaseModel]] = None) -> str:
+        key = (request_key(self.client, messages, response_model), id(asyncio.get_running_loop()))
+        future = self._in_flight.get(key)
+        if future is not None:
+            self.coalesced += 1
+            # shield: one waiter being cancelled must not cancel the shared call
+            return await asyncio.shield(future)
+
+        future = asyncio.ensure_future(self.client.generate(messages, **generate_kwargs(response_model)))
+        self._in_flight[key] = future
+        future.add_done_callback(lambda f: self._finish(key, f))
+        return await asyncio.shield(future)
+
+    async def generate_stream(self, messages: List[Dict[str, str]]) -> AsyncIterator[str]:
+        """Stream from the wrapped client (one delta holding the whole response if it cannot stream)"""
+        if not hasattr(self.client, "generate_stream"):
+            yield await self.client.generate(messages)
+            return
+        deltas = self.client.generate_stream(messages)
+        try:
+            async for delta in deltas:
+                yield delta
+        finally:
+            await deltas.aclose()
+
+    def _finish(self, key: Tuple[str, int], future: asyncio.Future) -> None:
+        self._in_flight.pop(key, None)
+        # Mark the exception retrieved in case every waiter was cancelled
+        if not future.cancelled():
+            future.exception()
@@ -1,7 +1,10 @@
 import asyncio  
 import os  
 import json  
+from src.clients.cache import cached_client_from_env  
 from src.clients.openai import OpenAIClient  
+from src.clients.resilience import ResilientClient  
+from src.clients.singleflight import SingleFlightClient  
 from src.clients.anthropic import AnthropicClient  
 from src.agents.data_retriever import DataRetrieverAgent  
 from src.agents.financial_concept_selector import FinancialConceptSelectorAgent  
@@ -50,7 +53,7 @@ class PydanticJSONEncoder(json.JSONEncoder):
 
 async def run_aes_inventory_turnover_example():  
     # Initialize clients  
-    openai_client = OpenAIClient()  
+    openai_client = cached_client_from_env(SingleFlightClient(ResilientClient([OpenAIClient()])))  
     
     # Create agents  
     data_retriever = DataRetrieverAgent(openai_client)
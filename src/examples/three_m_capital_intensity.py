@@ -1,7 +1,10 @@
 import asyncio
 import json
 from datetime import datetime
+from src.clients.cache import cached_client_from_env
 from src.clients.openai import OpenAIClient
+from src.clients.resilience import ResilientClient
+from src.clients.singleflight import SingleFlightClient
 from src.agents.data_retriever import DataRetrieverAgent
 from src.agents.financial_concept_selector import FinancialConceptSelectorAgent
 from src.agents.information_structurer import InformationStructurerAgent
@@ -73,7 +76,7 @@ class PydanticJSONEncoder(json.JSONEncoder):
 
 async def run_three_m_capital_intensity_example():
     # Initialize clients
-    openai_client = OpenAIClient()
+    openai_client = cached_client_from_env(SingleFlightClient(ResilientClient([OpenAIClient()])))
     
     # Create agents
     data_retriever = DataRetrieverAgent(openai_client)
@@ -85,4 +85,27 @@ THREE_M_CAPITAL_INTENSITY_WORKFLOW = [
         "task": "Based on the calculations: {calculations}, determine whether 3M is a capital-intensive business. Provide a clear explanation referencing the calculated metrics.",  
         "output_key": "final_answer"  
     }  
-]
\ No newline at end of file
+]  
+# General workflow for arbitrary questions (used by the batch runner); {question} is filled in per question  
+GENERAL_QUESTION_WORKFLOW = [  
+    {  
+        "agent": "financial_concept_selector",  
+        "task": "Identify the financial concept, formula and input line items needed to answer: {question}",  
+        "output_key": "financial_concept"  
+    },  
+    {  
+        "agent": "information_structurer",  
+        "task": "Using the concept: {financial_concept}, extract from the filing and structure the inputs needed to answer: {question}",  
+        "output_key": "structured_data"  
+    },  
+    {  
+        "agent": "calculator",  
+        "task": "Using the structured data: {structured_data}, perform the calculations needed to answer: {question}",  
+        "output_key": "calculations"  
+    },  
+    {  
+        "agent": "explainer_validator",  
+        "task": "Based on the calculations: {calculations}, answer the question: {question}. Provide a clear explanation referencing the calculated metrics.",  
+        "output_key": "final_answer"  
+    }  
+]  
@@ -1,9 +1,56 @@
-from typing import List, Dict, Any, Optional  
+from typing import List, Dict, Any, Callable, Optional, Set  
 from src.models import JobManifest, JobOutput, Job  
 from src.agent import Agent  
+from src.clients.batch import BatchRequest  
+from src.clients.resilience import with_retries  
+from src.tools.formulas import FormulaEngine  
 from src.tools.registry import ToolRegistry  
+from src.tools.retrieval import fit_to_token_budget  
+from src.utils.tokens import TokenUsage, count_message_tokens, count_tokens, record_usage, usage_scope  
 import json  
 import asyncio  
+import string  
+  
+def template_fields(task: str) -> List[str]:  
+    """Names of the {placeholders} referenced by a task template"""  
+    try:  
+        fields = [field for _, field, _, _ in string.Formatter().parse(task) if field]  
+    except ValueError:  
+        # Unbalanced braces: not a template  
+        return []  
+    return [field.split(".")[0].split("[")[0] for field in fields]  
+  
+def workflow_dependencies(workflow: List[Dict[str, Any]]) -> List[Set[int]]:  
+    """  
+    Indices of the earlier steps each workflow step depends on.  
+      
+    A step depends on the most recent earlier step producing each {placeholder}  
+    in its task (or each name in an explicit "depends_on" list), and on every  
+    earlier step with "update_context", since those change the context it sees.  
+    A step writing an output key also waits for the previous writer of that key  
+    and for the steps that read the previous value, so it can neither overwrite  
+    a value before its readers format their tasks nor be overwritten by an  
+    older result.  
+    """  
+    producers: Dict[str, int] = {}  
+    # key -> steps reading its current value  
+    readers: Dict[str, List[int]] = {}  
+    context_writers: List[int] = []  
+    dependencies = []  
+    for idx, step in enumerate(workflow):  
+        names = template_fields(step["task"]) + list(step.get("depends_on", []))  
+        depends = set(context_writers) | {producers[name] for name in names if name in producers}  
+        for name in names:  
+            readers.setdefault(name, []).append(idx)  
+        key = step.get("output_key", step["agent"])  
+        if key in producers:  
+            depends.add(producers[key])  
+        depends.update(reader for reader in readers.pop(key, []) if reader != idx)  
+        dependencies.append(depends)  
+        producers[key] = idx  
+        if step.get("update_context", False):  
+            context_writers.append(idx)  
+    return dependencies  
   
 class FinancialOrchestrator:  
     def __init__(  
@@ -11,57 +58,114 @@ class FinancialOrchestrator:
         supervisor_model,  # Large model like Claude Haiku or GPT-4o  
         agents: Dict[str, Agent],  
         tool_registry: ToolRegistry,  
-        max_rounds: int = 3  
+        max_rounds: int = 3,  
+        stream: bool = False,  
+        on_answer: Optional[Callable[[str, Any], None]] = None,  
+        context_budget: Optional[int] = None,  
+        max_concurrency: int = 4,  
+        formula_engine: Optional[FormulaEngine] = None,  
+        use_formula_engine: bool = True  
     ):  
-        self.supervisor_model = supervisor_model  
+        """  
+        Args:  
+            stream: Stream agent responses and stop each one as soon as its required fields are parsed  
+            on_answer: Called with (output_key, answer) as soon as a streamed step's answer is complete  
+            context_budget: Maximum context tokens sent with each step; larger contexts are trimmed  
+                to the passages ranked highest for the step's task  
+            max_concurrency: Maximum workflow steps running at once; independent steps  
+                (see workflow_dependencies) run concurrently, 1 runs the workflow in order  
+            formula_engine: Answers information_structurer and calculator steps for known ratios  
+                when their inputs are numeric, without calling the agent; a new FormulaEngine by default  
+            use_formula_engine: False always uses the agents  
+          
+        Bare provider clients (the supervisor's and the agents') are wrapped in a  
+        ResilientClient, so transient errors and rate limits are retried instead  
+        of aborting the workflow.  
+        """  
+        resilient: Dict[int, Any] = {}  
+        def retrying(model: Any) -> Any:  
+            # One wrapper per client, so agents sharing a client share its latency stats  
+            if id(model) not in resilient:  
+                resilient[id(model)] = with_retries(model)  
+            return resilient[id(model)]  
+        for agent in agents.values():  
+            for attr in ("model", "openai_client"):  
+                if hasattr(agent, attr):  
+                    setattr(agent, attr, retrying(getattr(agent, attr)))  
+        self.supervisor_model = retrying(supervisor_model)  
         self.agents = agents  
         self.tool_registry = tool_registry  
         self.max_rounds = max_rounds  
+        self.stream = stream  
+        self.on_answer = on_answer  
+        self.context_budget = context_budget  
+        self.max_concurrency = max_concurrency  
+        self.formula_engine = (formula_engine or FormulaEngine()) if use_formula_engine else None  
           
     async def run_financial_analysis(self, task: str, context: str, workflow: List[Dict[str, str]]) -> Dict[str, Any]:  
         """Run a financial analysis using the predefined workflow"""  
+        with usage_scope() as usage:  
+            result = await self._run_workflow(task, context, workflow)  
+        result["usage"] = usage.to_dict()  
+        print(f"Token usage: {result['usage']}")  
+        return result  
+      
+    async def _run_workflow(self, task: str, context: str, workflow: List[Dict[str, str]]) -> Dict[str, Any]:  
         results = {}  
-        intermediate_outputs = []  
+        intermediate_outputs: List[Optional[Dict[str, Any]]] = [None] * len(workflow)  
+        context_updates: Dict[int, str] = {}  
+        dependencies = workflow_dependencies(workflow)  
+        semaphore = asyncio.Semaphore(self.max_concurrency)  
           
         print(f"Starting financial analysis for task: {task}")  
         print(f"Using {len(workflow)} workflow steps")  
           
-        for step_idx, step in enumerate(workflow):  
-            agent_name = step["agent"]  
-            task_description = step["task"]  
-              
-            # Format the task with previous results if needed  
-            formatted_task = task_description  
-            if "{" in task_description:  
-                try:  
-                    formatted_task = task_description.format(**results)  
-                except KeyError as e:  
-                    print(f"Warning: Could not format task with results. Missing key: {e}")  
-              
-            print(f"\nStep {step_idx + 1}: Running {agent_name}")  
-            print(f"Task: {formatted_task}")  
-              
-            # Execute the agent  
-            agent = self.agents[agent_name]  
-            output = await agent.execute(formatted_task, context)  
-              
-            # Store the result  
-            step_key = step.get("output_key", agent_name)  
-            results[step_key] = output.answer  
-              
-            # Store intermediate output for final synthesis  
-            intermediate_outputs.append({  
-                "agent": agent_name,  
-                "task": formatted_task,  
-                "output": output  
-            })  
-              
-            # Update context with the result if specified  
-            if step.get("update_context", False):  
-                context_update = f"\n\nPrevious analysis result:\n{agent_name}: {output.answer}\n"  
-                context += context_update  
+        async def run_step(step_idx: int) -> None:  
+            # Wait for the steps this one depends on  
+            await asyncio.gather(*(step_tasks[dep] for dep in dependencies[step_idx]))  
+            async with semaphore:  
+                step = workflow[step_idx]  
+                agent_name = step["agent"]  
                   
-            print(f"Output: {output.answer}")  
+                # Format the task with previous results if needed  
+                formatted_task = self._format_task(step["task"], results)  
+                  
+                print(f"\nStep {step_idx + 1}: Running {agent_name}")  
+                print(f"Task: {formatted_task}")  
+                  
+                # Earlier update_context steps are all dependencies, so their updates are in  
+                step_context = context  
+                for writer in sorted(idx for idx in context_updates if idx < step_idx):  
+                    step_context += context_updates[writer]  
+                # Execute the agent  
+                agent = self.agents[agent_name]  
+                step_key = step.get("output_key", agent_name)  
+                with usage_scope() as step_usage:  
+                    output = self._formula_output(step, results)  
+                    if output is not None:  
+                        # No agent call, so no context to chunk, embed and trim  
+                        print("Answered by the formula engine")  
+                    else:  
+                        step_context = await self._fit_context(step_context, formatted_task, agent)  
+                        if self.stream and isinstance(agent, Agent):  
+                            output = await agent.execute(formatted_task, step_context, stream=True, on_field=self._field_callback(step_key))  
+                        else:  
+                            output = await agent.execute(formatted_task, step_context)  
+                  
+                # Store the result and update context if specified  
+                intermediate_outputs[step_idx] = self._record_step(step, formatted_task, output, results, step_usage)  
+                if step.get("update_context", False):  
+                    context_updates[step_idx] = self._context_update(step, output)  
+          
+        step_tasks: List[asyncio.Future] = []  
+        for step_idx in range(len(workflow)):  
+            step_tasks.append(asyncio.ensure_future(run_step(step_idx)))  
+        try:  
+            await asyncio.gather(*step_tasks)  
+        except BaseException:  
+            for step_task in step_tasks:  
+                step_task.cancel()  
+            raise  
           
         # Final synthesis  
         final_answer = await self.synthesize_results(task, intermediate_outputs)  
@@ -72,8 +176,194 @@ class FinancialOrchestrator:
             "final_answer": final_answer  
         }  
       
+    def _format_task(self, task_description: str, results: Dict[str, Any]) -> str:  
+        """Fill {placeholders} in a step's task with earlier step results"""  
+        formatted_task = task_description  
+        if "{" in task_description:  
+            try:  
+                formatted_task = task_description.format(**results)  
+            except KeyError as e:  
+                print(f"Warning: Could not format task with results. Missing key: {e}")  
+        return formatted_task  
+      
+    def _formula_output(self, step: Dict[str, str], results: Dict[str, Any]) -> Optional[JobOutput]:  
+        """The formula engine's output for a step, or None when the step needs its agent"""  
+        if self.formula_engine is None:  
+            return None  
+        inputs = {name: results[name] for name in template_fields(step["task"]) if name in results}  
+        return self.formula_engine.run_step(step["agent"], step["task"], inputs)  
+      
+    def _record_step(  
+        self,  
+        step: Dict[str, str],  
+        formatted_task: str,  
+        output: JobOutput,  
+        results: Dict[str, Any],  
+        usage: TokenUsage  
+    ) -> Dict[str, Any]:  
+        """Store a step's result; returns its intermediate output for the final synthesis"""  
+        agent_name = step["agent"]  
+        results[step.get("output_key", agent_name)] = output.answer  
+        print(f"Output: {output.answer}")  
+        return {  
+            "agent": agent_name,  
+            "task": formatted_task,  
+            "output": output,  
+            "usage": usage.to_dict()  
+        }  
+      
+    def _context_update(self, step: Dict[str, str], output: JobOutput) -> str:  
+        """Text appended to the context after a step with update_context"""  
+        return f"\n\nPrevious analysis result:\n{step['agent']}: {output.answer}\n"  
+      
+    async def _fit_context(self, context: Any, query: str, agent: Any) -> Any:  
+        """Trim a step's context to `context_budget` tokens, keeping the passages most relevant to the query"""  
+        if self.context_budget is None:  
+            return context  
+        # Chunking, embedding and indexing a filing is CPU-bound; keep it off the event loop  
+        return await asyncio.to_thread(self._trim_context, context, query, self._step_model_name(agent))  
+          
+    def _step_model_name(self, agent: Any) -> Optional[str]:  
+        """Model whose tokenizer counts a step's tokens: the agent's own client, else the supervisor's"""  
+        for model in (getattr(agent, "model", None), getattr(agent, "openai_client", None), self.supervisor_model):  
+            model_name = getattr(model, "model_name", None)  
+            if isinstance(model_name, str):  
+                return model_name  
+        return None  
+          
+    def _trim_context(self, context: Any, query: str, model_name: Optional[str]) -> Any:  
+        if isinstance(context, str):  
+            return fit_to_token_budget(context, query, self.context_budget, model_name)  
+        if isinstance(context, dict):  
+            # Dict contexts (e.g. DataRetrieverAgent's documents) share the budget across their text  
+            # values: values smaller than an even share are kept whole and leave the rest to larger ones  
+            texts = sorted(  
+                ((count_tokens(value, model_name), key) for key, value in context.items() if isinstance(value, str)),  
+                key=lambda item: item[0]  
+            )  
+            remaining, trimmed = self.context_budget, {}  
+            for position, (n_tokens, key) in enumerate(texts):  
+                share = remaining // (len(texts) - position)  
+                trimmed[key] = context[key] if n_tokens <= share else fit_to_token_budget(context[key], query, share, model_name)  
+                remaining -= n_tokens if n_tokens <= share else count_tokens(trimmed[key], model_name)  
+            return {**context, **trimmed}  
+        return context  
+      
+    async def run_batch_analysis(self, analyses: List[Dict[str, Any]], backend) -> List[Dict[str, Any]]:  
+        """  
+        Run many analyses stage by stage through a provider batch backend.  
+          
+        Step N of every workflow is collected into one batch job, the responses are  
+        fanned back into their workflows, and all of them advance to step N + 1;  
+        the final syntheses go out as one more batch. Agents that build their own  
+        prompts (e.g. DataRetrieverAgent) and requests the batch failed to answer  
+        run through the agents' normal clients instead, at most max_concurrency at  
+        a time; steps the formula engine answers are not submitted at all. When the  
+        backend supports structured output, agent steps are constrained to the  
+        agent's output_model() just as interactive calls are.  
+          
+        Args:  
+            analyses: Dicts with "task", "context" and "workflow", as for run_financial_analysis  
+            backend: Batch backend with `async run(requests) -> {custom_id: text}`, e.g. OpenAIBatchBackend  
+          
+        Returns:  
+            One result dict per analysis, in order, shaped like run_financial_analysis's  
+        """  
+        states = [  
+            {"task": a["task"], "context": a["context"], "workflow": a["workflow"], "results": {}, "steps": [], "usage": TokenUsage()}  
+            for a in analyses  
+        ]  
+        n_stages = max((len(state["workflow"]) for state in states), default=0)  
+        backend_structured = getattr(backend, "supports_structured_output", False) is True  
+        # Bounds the interactive fallback calls, as max_concurrency bounds run_financial_analysis  
+        semaphore = asyncio.Semaphore(self.max_concurrency)  
+          
+        for stage in range(n_stages):  
+            requests, pending = [], []  
+            for idx, state in enumerate(states):  
+                if stage >= len(state["workflow"]):  
+                    continue  
+                step = state["workflow"][stage]  
+                agent = self.agents[step["agent"]]  
+                formatted_task = self._format_task(step["task"], state["results"])  
+                custom_id = f"analysis-{idx}-step-{stage}"  
+                step_context, messages, structured = None, None, False  
+                output = self._formula_output(step, state["results"])  
+                if output is None:  
+                    step_context = await self._fit_context(state["context"], formatted_task, agent)  
+                if output is None and isinstance(agent, Agent):  
+                    messages = agent.build_messages(formatted_task, step_context)  
+                    structured = agent.structured_output and backend_structured  
+                    requests.append(BatchRequest(custom_id, messages, agent.output_model() if structured else None))  
+                pending.append((state, step, agent, formatted_task, step_context, custom_id, messages, structured, output))  
+              
+            print(f"\nStage {stage + 1}: submitting {len(requests)} of {len(pending)} steps as a batch")  
+            responses = await backend.run(requests)  
+              
+            async def finish(state, step, agent, formatted_task, step_context, custom_id, messages, structured, output):  
+                with usage_scope() as step_usage:  
+                    if output is not None:  
+                        # Answered by the formula engine; nothing was submitted  
+                        pass  
+                    elif custom_id in responses:  
+                        # Batch results carry no usage; count locally  
+                        record_usage(count_message_tokens(messages), count_tokens(responses[custom_id]), estimated=True)  
+                        if structured:  
+                            output = agent._load_structured(responses[custom_id])  
+                        else:  
+                            output = agent._parse_output(responses[custom_id])  
+                    else:  
+                        async with semaphore:  
+                            output = await agent.execute(formatted_task, step_context)  
+                state["usage"].merge(step_usage)  
+                state["steps"].append(self._record_step(step, formatted_task, output, state["results"], step_usage))  
+                if step.get("update_context", False):  
+                    state["context"] += self._context_update(step, output)  
+              
+            await asyncio.gather(*[finish(*item) for item in pending])  
+          
+        # Final syntheses as one more batch  
+        synthesis = {  
+            f"analysis-{idx}-synthesis": self._synthesis_messages(state["task"], state["steps"])  
+            for idx, state in enumerate(states)  
+        }  
+        responses = await backend.run([BatchRequest(custom_id, messages) for custom_id, messages in synthesis.items()])  
+          
+        async def final_answer(state, custom_id):  
+            with usage_scope() as usage:  
+                if custom_id in responses:  
+                    record_usage(count_message_tokens(synthesis[custom_id]), count_tokens(responses[custom_id]), estimated=True)  
+                    answer = responses[custom_id]  
+                else:  
+                    async with semaphore:  
+                        answer = await self.supervisor_model.generate(synthesis[custom_id])  
+            state["usage"].merge(usage)  
+            return answer  
+          
+        answers = await asyncio.gather(*[final_answer(state, custom_id) for state, custom_id in zip(states, synthesis)])  
+        return [  
+            {"task": state["task"], "steps": state["steps"], "final_answer": answer, "usage": state["usage"].to_dict()}  
+            for state, answer in zip(states, answers)  
+        ]  
+      
+    def _field_callback(self, step_key: str) -> Callable[[str, Any], None]:  
+        """Forward a streamed step's answer to `on_answer` as soon as it is parsed"""  
+        def on_field(key: str, value: Any) -> None:  
+            if key == "answer" and self.on_answer is not None:  
+                self.on_answer(step_key, value)  
+        return on_field  
+      
     async def synthesize_results(self, task: str, intermediate_outputs: List[Dict[str, Any]]) -> str:  
         """Synthesize the results from all agents into a final answer"""  
+        print("\nSynthesizing final answer...")  
+        messages = self._synthesis_messages(task, intermediate_outputs)  
+        response = await self.supervisor_model.generate(messages)  
+          
+        print(f"Final answer: {response}")  
+        return response  
+      
+    def _synthesis_messages(self, task: str, intermediate_outputs: List[Dict[str, Any]]) -> List[Dict[str, str]]:  
+        """Build the supervisor prompt that synthesizes the step outputs"""  
         # Format intermediate outputs for the supervisor  
         outputs_text = ""  
         for idx, output in enumerate(intermediate_outputs):  
@@ -94,10 +384,4 @@ class FinancialOrchestrator:
         Synthesize these results to provide a comprehensive answer to the original task.  
         Your answer should be clear, concise, and based solely on the information provided.  
         """  
-          
-        print("\nSynthesizing final answer...")  
-        messages = [{"role": "user", "content": prompt}]  
-        response = await self.supervisor_model.generate(messages)  
-          
-        print(f"Final answer: {response}")  
-        return response
\ No newline at end of file
+        return [{"role": "user", "content": prompt}]
\ No newline at end of file
@@ -1,25 +1,81 @@
 from src.tools.tool import Tool  
+from src.tools.embedding_cache import (
+    EmbeddingCache,
+    configure_embedding_cache,
+    get_embedding_cache
+)
+from src.tools.embeddings import (
+    EmbeddingModelManager,
+    configure_embedding_model,
+    get_embedding_manager,
+    warmup_embedding_model
+)
+from src.tools.backends import (
+    BackendNotAvailableError,
+    available_backends,
+    register_embedding_backend,
+    register_keyword_backend
+)
+from src.tools.chunking import TextSpan, chunk_spans
+from src.tools.corpus_index import CorpusIndex, CorpusSearchResult, search_corpus
+from src.tools.retrieval import DocumentIndex, SearchResult, fit_to_token_budget, get_document_index
+from src.tools.formulas import Formula, FormulaEngine, available_formulas, find_formulas, register_formula
+from src.tools.statements import StatementIndex, StatementTable, parse_statements
 from src.tools.registry import (  
     ToolRegistry,  
     create_default_registry,  
     retrieve_from_context,  
+    retrieve_many,
     summarize_text,  
     chunk_text,  
     calculate,  
     calculate_financial_ratio,  
     extract_financial_data,  
     extract_year  
-)  
+)
+from src.tools.extraction import FinancialDataExtractor, extract_concepts, extract_financial_fields  
   
 __all__ = [  
     "Tool",  
+    "EmbeddingCache",
+    "configure_embedding_cache",
+    "get_embedding_cache",
+    "EmbeddingModelManager",
+    "configure_embedding_model",
+    "get_embedding_manager",
+    "warmup_embedding_model",
+    "BackendNotAvailableError",
+    "available_backends",
+    "register_embedding_backend",
+    "register_keyword_backend",
+    "TextSpan",
+    "chunk_spans",
+    "CorpusIndex",
+    "CorpusSearchResult",
+    "search_corpus",
+    "DocumentIndex",
+    "SearchResult",
+    "get_document_index",
+    "fit_to_token_budget",
+    "Formula",
+    "FormulaEngine",
+    "available_formulas",
+    "find_formulas",
+    "register_formula",
+    "StatementIndex",
+    "StatementTable",
+    "parse_statements",
     "ToolRegistry",  
     "create_default_registry",  
     "retrieve_from_context",  
+    "retrieve_many",
     "summarize_text",  
     "chunk_text",  
     "calculate",  
     "calculate_financial_ratio",  
     "extract_financial_data",  
+    "extract_financial_fields",
+    "FinancialDataExtractor",
+    "extract_concepts",
     "extract_year"  
 ]
\ No newline at end of file
@@ -0,0 +1,69 @@
+from typing import Any, Callable, Dict, List, Optional
+
+
+class BackendNotAvailableError(ImportError):
+    """Raised when a backend's optional dependency is not installed"""
+
+
+# Backends are registered as loaders; the heavy libraries they wrap
+# (sentence-transformers/torch, rank_bm25) are only imported on first load.
+
+# name -> loader(model_name, device) returning an object with encode(texts, batch_size=...)
+_embedding_backends: Dict[str, Callable[[str, Optional[str]], Any]] = {}
+# name -> loader(tokenized_chunks) returning an object with get_scores(query_tokens)
+_keyword_backends: Dict[str, Callable[[List[List[str]]], Any]] = {}
+
+
+def register_embedding_backend(name: str, loader: Callable[[str, Optional[str]], Any]) -> None:
+    """Register an embedding backend loader under a name"""
+    _embedding_backends[name] = loader
+
+
+def register_keyword_backend(name: str, loader: Callable[[List[List[str]]], Any]) -> None:
+    """Register a keyword-scoring backend loader under a name"""
+    _keyword_backends[name] = loader
+
+
+def available_backends() -> Dict[str, List[str]]:
+    """Names of the registered embedding and keyword backends"""
+    return {"embedding": sorted(_embedding_backends), "keyword": sorted(_keyword_backends)}
+
+
+def load_embedding_model(backend: str, model_name: str, device: Optional[str] = None) -> Any:
+    """Load an embedding model through the named backend"""
+    if backend not in _embedding_backends:
+        raise ValueError(f"Unknown embedding backend: {backend}")
+    return _embedding_backends[backend](model_name, device)
+
+
+def build_keyword_scorer(backend: str, tokenized_chunks: List[List[str]]) -> Any:
+    """Build a keyword scorer over tokenized chunks through the named backend"""
+    if backend not in _keyword_backends:
+        raise ValueError(f"Unknown keyword backend: {backend}")
+    return _keyword_backends[backend](tokenized_chunks)
+
+
+def _load_sentence_transformer(model_name: str, device: Optional[str] = None) -> Any:
+    try:
+        from sentence_transformers import SentenceTransformer
+    except ImportError as e:
+        raise BackendNotAvailableError("The 'sentence_transformers' backend requires sentence-transformers") from e
+    return SentenceTransformer(model_name, device=device)
+
+
+def _build_numpy_bm25(tokenized_chunks: List[List[str]]) -> Any:
+    from src.tools.retrieval import BM25Statistics
+    return BM25Statistics.build(tokenized_chunks)
+
+
+def _build_rank_bm25(tokenized_chunks: List[List[str]]) -> Any:
+    try:
+        from rank_bm25 import BM25Plus
+    except ImportError as e:
+        raise BackendNotAvailableError("The 'rank_bm25' backend requires rank-bm25") from e
+    return BM25Plus(tokenized_chunks)
+
+
+register_embedding_backend("sentence_transformers", _load_sentence_transformer)
+register_keyword_backend("numpy", _build_numpy_bm25)
+register_keyword_backend("rank_bm25", _build_rank_bm25)
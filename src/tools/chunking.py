@@ -0,0 +1,123 @@
+from typing import Iterator, List, NamedTuple
+from bisect import bisect_right
+import re
+
+# Boundary strengths, strongest first. A chunk ends at the strongest kind of
+# boundary available in the acceptable window, and at the latest one of that kind.
+SECTION = 0   # blank line or the start of a section header line
+LINE = 1      # end of a line item / table row
+SENTENCE = 2  # end of a sentence
+WORD = 3      # any whitespace
+
+_SENTENCE_END = re.compile(r"[.!?][\"')\]]?(?=\s)")
+_WORD_BREAK = re.compile(r"\s+")
+_AMOUNT_AT_END = re.compile(r"[\d)%]\s*$")
+
+
+class TextSpan(NamedTuple):
+    """Half-open character range [start, end) of a chunk in the source text"""
+    start: int
+    end: int
+
+    def slice(self, text: str) -> str:
+        return text[self.start:self.end]
+
+
+def _is_section_header(line: str) -> bool:
+    """Short label lines such as "Current liabilities:" or "CONSOLIDATED BALANCE SHEETS"."""
+    stripped = line.strip()
+    if not stripped or len(stripped) > 80 or _AMOUNT_AT_END.search(stripped):
+        return False
+    return stripped.endswith(":") or stripped.isupper() or (len(stripped.split()) <= 6 and stripped[0].isupper())
+
+
+def _find_boundaries(text: str) -> List[List[int]]:
+    """
+    Collect candidate chunk ends for each boundary strength in one pass per kind.
+
+    Each list is sorted; a boundary is the offset just after the break, so
+    text[:b] ends at it and text[b:] starts right after it.
+    """
+    boundaries: List[List[int]] = [[], [], [], []]
+    line_start = 0
+    previous_blank = False
+    for line in text.splitlines(keepends=True):
+        blank = not line.strip()
+        if line_start and (blank or previous_blank or _is_section_header(line)):
+            boundaries[SECTION].append(line_start)
+        line_start += len(line)
+        boundaries[LINE].append(line_start)
+        previous_blank = blank
+    boundaries[SENTENCE] = [m.end() for m in _SENTENCE_END.finditer(text)]
+    boundaries[WORD] = [m.start() for m in _WORD_BREAK.finditer(text)]
+    return boundaries
+
+
+def _latest_in(boundaries: List[int], low: int, high: int) -> int:
+    """Latest boundary b with low <= b <= high, or -1"""
+    i = bisect_right(boundaries, high) - 1
+    return boundaries[i] if i >= 0 and boundaries[i] >= low else -1
+
+
+def _earliest_in(boundaries: List[int], low: int, high: int) -> int:
+    """Earliest boundary b with low <= b <= high, or -1"""
+    i = bisect_right(boundaries, low - 1)
+    return boundaries[i] if i < len(boundaries) and boundaries[i] <= high else -1
+
+
+def chunk_spans(text: str, chunk_size: int = 1000, overlap: int = 100) -> List[TextSpan]:
+    """
+    Split text into overlapping chunks that follow financial-statement structure.
+
+    Chunks prefer to end at section breaks, then at line ends (so line items
+    and table rows are never split), then at sentence ends, then at
+    whitespace. The next chunk starts `overlap` characters back, snapped
+    forward to a line start when one is close. Every chunk advances by at
+    least half of `chunk_size - overlap`, so the number of chunks and the
+    total work are linear in the text length.
+
+    Args:
+        text: Text to split
+        chunk_size: Maximum characters per chunk
+        overlap: Characters shared by consecutive chunks
+
+    Returns:
+        List of TextSpan offsets into `text`
+    """
+    n = len(text)
+    if n == 0:
+        return []
+    chunk_size = max(chunk_size, 1)
+    overlap = min(max(overlap, 0), chunk_size - 1)
+    min_advance = max((chunk_size - overlap) // 2, 1)
+    boundaries = _find_boundaries(text)
+
+    spans = []
+    start = 0
+    while True:
+        end = min(start + chunk_size, n)
+        if end < n:
+            lowest = start + overlap + min_advance
+            for kind in (SECTION, LINE, SENTENCE, WORD):
+                boundary = _latest_in(boundaries[kind], lowest, end)
+                if boundary != -1:
+                    end = boundary
+                    break
+        spans.append(TextSpan(start, end))
+        if end == n:
+            return spans
+
+        next_start = max(end - overlap, start + min_advance)
+        line_start = _earliest_in(boundaries[LINE], next_start, end - 1)
+        start = line_start if line_start != -1 else next_start
+
+
+def iter_chunks(text: str, spans: List[TextSpan]) -> Iterator[str]:
+    """Lazily materialize chunk strings from spans"""
+    for span in spans:
+        yield text[span.start:span.end]
+
+
+def chunk_text(text: str, chunk_size: int = 1000, overlap: int = 100) -> List[str]:
+    """Split text into overlapping, structure-aligned chunks"""
+    return list(iter_chunks(text, chunk_spans(text, chunk_size, overlap)))
@@ -0,0 +1,336 @@
+from typing import Any, Dict, List, Optional, Union
+from dataclasses import dataclass, field
+import json
+import os
+import numpy as np
+from src.tools.chunking import chunk_spans
+from src.tools.embeddings import get_embedding_manager
+from src.tools.retrieval import EmbeddingMatrix, normalize_rows, top_k
+
+
+@dataclass
+class CorpusSearchResult:
+    """A chunk retrieved from a corpus of filings"""
+    chunk_id: int
+    text: str
+    score: float
+    doc_name: Optional[str]
+    metadata: Dict[str, Any] = field(default_factory=dict)
+    start: Optional[int] = None
+    end: Optional[int] = None
+
+
+def spherical_kmeans(vectors: np.ndarray, n_clusters: int, n_iter: int = 10, seed: int = 0) -> np.ndarray:
+    """
+    Cluster unit vectors by cosine similarity.
+
+    Args:
+        vectors: L2-normalized float32 rows
+        n_clusters: Number of centroids
+        n_iter: Lloyd iterations
+        seed: Seed for the initial centroid sample
+
+    Returns:
+        L2-normalized centroids of shape (n_clusters, dim)
+    """
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), n_clusters, replace=False)].copy()
+    for _ in range(n_iter):
+        assignments = np.argmax(vectors @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, vectors)
+        counts = np.bincount(assignments, minlength=n_clusters)
+        empty = counts == 0
+        if empty.any():
+            # Reseed empty clusters with random points so every list stays useful
+            sums[empty] = vectors[rng.choice(len(vectors), int(empty.sum()), replace=False)]
+        centroids = normalize_rows(sums)
+    return centroids
+
+
+class CorpusIndex:
+    """
+    Dense retrieval index over many filings with metadata filters.
+
+    Chunks from every document share one normalized embedding matrix.
+    Once `build_ivf` has run, queries are answered with an inverted-file
+    (IVF) search: only the chunks in the `n_probe` clusters nearest to the
+    query are scored, so query cost grows with the probed lists rather
+    than the whole corpus. Small or unbuilt corpora are searched exactly.
+    Metadata filters are resolved per document: a filter matching no more
+    chunks than the probed lists would hold is searched exactly over the
+    matching documents' chunks, otherwise only the probed lists' chunks are
+    checked against it, probing more lists until `k` of them match.
+    """
+
+    def __init__(self, model_name: Optional[str] = None, device: Optional[str] = None):
+        manager = get_embedding_manager(model_name, device)
+        self.model_name = manager.model_name
+        self.device = manager.device
+        self.documents: List[Dict[str, Any]] = []
+        self.chunks: List[str] = []
+        self._chunk_docs = np.zeros(0, dtype=np.int32)
+        self._chunk_spans = np.zeros((0, 2), dtype=np.int64)
+        # Chunks per document; a document's chunks are contiguous
+        self._doc_chunks: List[int] = []
+        self._doc_ptr = np.zeros(1, dtype=np.int64)
+        self._vectors = np.zeros((0, 0), dtype=np.float32)
+        # Per-document arrays added since the last merge; merged once on first use
+        self._pending: List[np.ndarray] = []
+        self._pending_docs: List[np.ndarray] = []
+        self._pending_spans: List[np.ndarray] = []
+        self.centroids: Optional[np.ndarray] = None
+        self.list_ptr: Optional[np.ndarray] = None
+        self.list_ids: Optional[np.ndarray] = None
+
+    def __len__(self) -> int:
+        return len(self.chunks)
+
+    @property
+    def has_ivf(self) -> bool:
+        return self.centroids is not None
+
+    @property
+    def vectors(self) -> np.ndarray:
+        """Normalized chunk embeddings, merging documents added since the last access"""
+        self._merge_pending()
+        return self._vectors
+
+    @property
+    def chunk_docs(self) -> np.ndarray:
+        """Document position of each chunk"""
+        self._merge_pending()
+        return self._chunk_docs
+
+    @property
+    def chunk_spans(self) -> np.ndarray:
+        """(start, end) character offsets of each chunk in its document"""
+        self._merge_pending()
+        return self._chunk_spans
+
+    @property
+    def doc_ptr(self) -> np.ndarray:
+        """Chunk offsets by document: document i holds chunks doc_ptr[i]:doc_ptr[i + 1]"""
+        if len(self._doc_ptr) != len(self._doc_chunks) + 1:
+            self._doc_ptr = np.concatenate([[0], np.cumsum(self._doc_chunks, dtype=np.int64)])
+        return self._doc_ptr
+
+    def _merge_pending(self) -> None:
+        """Concatenate the documents added since the last merge in one step, keeping corpus builds linear"""
+        if not self._pending:
+            return
+        pending = np.vstack(self._pending)
+        self._chunk_docs = np.concatenate([self._chunk_docs] + self._pending_docs)
+        self._chunk_spans = np.concatenate([self._chunk_spans] + self._pending_spans)
+        self._pending, self._pending_docs, self._pending_spans = [], [], []
+        if self.has_ivf:
+            assignments = np.argmax(pending @ self.centroids.T, axis=1)
+            self._set_lists(np.concatenate([self._assignments(), assignments]))
+        self._vectors = pending if len(self._vectors) == 0 else np.vstack([self._vectors, pending])
+
+    def add_document(
+        self,
+        text: str,
+        doc_name: Optional[str] = None,
+        company: Optional[str] = None,
+        fiscal_year: Optional[int] = None,
+        chunk_size: int = 1000,
+        overlap: int = 100,
+        **metadata: Any
+    ) -> int:
+        """
+        Chunk, embed and add a filing to the corpus.
+
+        New chunks are assigned to the existing IVF clusters, if any; call
+        `build_ivf` again after large additions to rebalance them.
+
+        Args:
+            text: Full document text
+            doc_name: Document identifier, e.g. "AMCOR_2023_10K"
+            company: Company name
+            fiscal_year: Fiscal year of the filing
+            chunk_size: Maximum characters per chunk
+            overlap: Characters of overlap between consecutive chunks
+            **metadata: Any other filterable fields
+
+        Returns:
+            The document's position in the corpus
+        """
+        spans = chunk_spans(text, chunk_size=chunk_size, overlap=overlap)
+        chunks = [span.slice(text) for span in spans]
+        doc_idx = len(self.documents)
+        self.documents.append({"doc_name": doc_name, "company": company, "fiscal_year": fiscal_year, **metadata})
+        self._doc_chunks.append(len(chunks))
+        if not chunks:
+            return doc_idx
+
+        manager = get_embedding_manager(self.model_name, self.device)
+        self._pending.append(EmbeddingMatrix.from_embeddings(manager.encode_documents(chunks)).vectors)
+        self.chunks.extend(chunks)
+        self._pending_docs.append(np.full(len(chunks), doc_idx, dtype=np.int32))
+        self._pending_spans.append(np.array(spans, dtype=np.int64))
+        return doc_idx
+
+    def build_ivf(self, n_lists: Optional[int] = None, n_iter: int = 10, sample_size: int = 50000, seed: int = 0) -> None:
+        """
+        Cluster chunk embeddings into inverted lists.
+
+        Args:
+            n_lists: Number of clusters; defaults to about sqrt(number of chunks)
+            n_iter: k-means iterations
+            sample_size: Maximum number of chunks used to train the centroids
+            seed: Random seed
+        """
+        if len(self) == 0:
+            return
+        n_lists = min(n_lists or max(1, int(np.sqrt(len(self)))), len(self))
+        rng = np.random.default_rng(seed)
+        self.centroids = None
+        sample = self.vectors
+        if len(self) > sample_size:
+            sample = self.vectors[rng.choice(len(self), sample_size, replace=False)]
+        self.centroids = spherical_kmeans(sample, n_lists, n_iter=n_iter, seed=seed)
+        self._set_lists(np.argmax(self.vectors @ self.centroids.T, axis=1))
+
+    def _set_lists(self, assignments: np.ndarray) -> None:
+        self.list_ids = np.argsort(assignments, kind="stable").astype(np.int64)
+        counts = np.bincount(assignments, minlength=len(self.centroids))
+        self.list_ptr = np.concatenate([[0], np.cumsum(counts)])
+
+    def _assignments(self) -> np.ndarray:
+        assignments = np.empty(len(self.list_ids), dtype=np.int64)
+        for cluster in range(len(self.centroids)):
+            assignments[self.list_ids[self.list_ptr[cluster]:self.list_ptr[cluster + 1]]] = cluster
+        return assignments
+
+    def _document_mask(self, filters: Optional[Dict[str, Any]]) -> Optional[np.ndarray]:
+        """Boolean mask over documents matching every filter (values may be a single value or a list)"""
+        if not filters:
+            return None
+        mask = np.ones(len(self.documents), dtype=bool)
+        for key, wanted in filters.items():
+            allowed = set(wanted) if isinstance(wanted, (list, tuple, set)) else {wanted}
+            mask &= np.array([doc.get(key) in allowed for doc in self.documents], dtype=bool)
+        return mask
+
+    def search(
+        self,
+        query: str,
+        k: int = 5,
+        filters: Optional[Dict[str, Any]] = None,
+        n_probe: int = 8
+    ) -> List[CorpusSearchResult]:
+        """
+        Find the chunks most similar to the query across the corpus.
+
+        Args:
+            query: Query text
+            k: Number of results
+            filters: Metadata filters, e.g. {"company": "Amcor", "fiscal_year": [2022, 2023]}
+            n_probe: Number of IVF lists to scan (ignored for exact search); widened
+                when too few chunks in the probed lists match the filters
+
+        Returns:
+            Ranked CorpusSearchResult list
+        """
+        if len(self) == 0:
+            return []
+        query_vector = normalize_rows(get_embedding_manager(self.model_name, self.device).encode(query))[0]
+        vectors = self.vectors
+
+        doc_mask = self._document_mask(filters)
+        doc_ptr = self.doc_ptr
+        n_matching = int(np.diff(doc_ptr)[doc_mask].sum()) if doc_mask is not None else len(self)
+        if n_matching == 0:
+            return []
+
+        n_lists = len(self.centroids) if self.has_ivf else 0
+        # Filtered chunks that fit in the probed lists' share of the corpus are cheaper to score directly
+        if n_probe < n_lists and n_matching * n_lists > n_probe * len(self):
+            candidates = self._probe(query_vector, n_probe, doc_mask, k)
+        elif doc_mask is not None:
+            candidates = np.concatenate([np.arange(doc_ptr[d], doc_ptr[d + 1]) for d in np.flatnonzero(doc_mask)])
+        else:
+            candidates = np.arange(len(self))
+        if len(candidates) == 0:
+            return []
+        candidates = np.sort(candidates)
+
+        scores = vectors[candidates] @ query_vector
+        results = []
+        for i in top_k(scores, k):
+            chunk_id = int(candidates[i])
+            doc = self.documents[self.chunk_docs[chunk_id]]
+            results.append(CorpusSearchResult(
+                chunk_id=chunk_id,
+                text=self.chunks[chunk_id],
+                score=float(scores[i]),
+                doc_name=doc.get("doc_name"),
+                metadata=doc,
+                start=int(self.chunk_spans[chunk_id, 0]),
+                end=int(self.chunk_spans[chunk_id, 1])
+            ))
+        return results
+
+    def _probe(self, query_vector: np.ndarray, n_probe: int, doc_mask: Optional[np.ndarray], k: int) -> np.ndarray:
+        """Chunks in the lists nearest the query that pass the filters, doubling n_probe until k are found"""
+        order = top_k(self.centroids @ query_vector, len(self.centroids))
+        while True:
+            candidates = np.concatenate([self.list_ids[self.list_ptr[c]:self.list_ptr[c + 1]] for c in order[:n_probe]])
+            if doc_mask is not None:
+                candidates = candidates[doc_mask[self.chunk_docs[candidates]]]
+            if len(candidates) >= k or n_probe >= len(order):
+                return candidates
+            n_probe *= 2
+
+    def save(self, directory: str) -> None:
+        """Save the corpus index to a directory"""
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, "corpus.json"), "w") as f:
+            json.dump({
+                "model_name": self.model_name,
+                "device": self.device,
+                "documents": self.documents,
+                "chunks": self.chunks
+            }, f)
+        vectors = self.vectors
+        arrays = {"chunk_docs": self.chunk_docs, "chunk_spans": self.chunk_spans}
+        if self.has_ivf:
+            arrays.update(centroids=self.centroids, list_ptr=self.list_ptr, list_ids=self.list_ids)
+        np.savez(os.path.join(directory, "ivf.npz"), **arrays)
+        np.save(os.path.join(directory, "vectors.npy"), vectors)
+
+    @classmethod
+    def load(cls, directory: str, mmap: bool = True) -> "CorpusIndex":
+        """Load a corpus index saved with `save`; vectors are memory-mapped by default"""
+        with open(os.path.join(directory, "corpus.json"), "r") as f:
+            data = json.load(f)
+        index = cls.__new__(cls)
+        index.model_name = data["model_name"]
+        index.device = data["device"]
+        index.documents = data["documents"]
+        index.chunks = data["chunks"]
+        index._vectors = np.load(os.path.join(directory, "vectors.npy"), mmap_mode="r" if mmap else None)
+        index._pending, index._pending_docs, index._pending_spans = [], [], []
+        with np.load(os.path.join(directory, "ivf.npz")) as arrays:
+            index._chunk_docs = arrays["chunk_docs"]
+            index._doc_chunks = np.bincount(index._chunk_docs, minlength=len(index.documents)).tolist()
+            index._doc_ptr = np.zeros(1, dtype=np.int64)
+            index._chunk_spans = arrays["chunk_spans"]
+            index.centroids = arrays["centroids"] if "centroids" in arrays else None
+            index.list_ptr = arrays["list_ptr"] if "list_ptr" in arrays else None
+            index.list_ids = arrays["list_ids"] if "list_ids" in arrays else None
+        return index
+
+
+def search_corpus(
+    corpus: CorpusIndex,
+    query: str,
+    max_results: int = 5,
+    filters: Optional[Dict[str, Any]] = None,
+    n_probe: int = 8,
+    return_scores: bool = False
+) -> Union[List[str], List[CorpusSearchResult]]:
+    """Retrieve relevant passages across many filings, optionally filtered by metadata"""
+    results = corpus.search(query, max_results, filters=filters, n_probe=n_probe)
+    return results if return_scores else [result.text for result in results]
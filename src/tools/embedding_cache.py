@@ -0,0 +1,268 @@
+from typing import Dict, List, Optional, Set, Tuple
+from collections import OrderedDict
+import hashlib
+import json
+import os
+import re
+import threading
+import uuid
+import numpy as np
+
+
+def content_hash(text: str) -> str:
+    """Stable content key for a chunk of text"""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class DiskEmbeddingStore:
+    """
+    Append-only on-disk embedding store for a single model.
+
+    Vectors are written in immutable `.npy` segments and read back through
+    NumPy memory maps, so a warm cache costs page-cache reads rather than
+    deserialization. `index.jsonl` is an append-only log with one record per
+    segment listing its content hashes in row order.
+
+    Several processes can share a directory: segment names are unique per
+    writer, each put appends a single record instead of rewriting the index,
+    and records appended by other processes are merged before writing and
+    when a lookup misses. A key written twice keeps its first record.
+
+    Each put adds a segment, so once there are more than `max_segments` the
+    store is compacted: all segments are merged into one and the log is
+    rewritten with a single record. Other processes see the new log and reload
+    it; a record another process appends while a compaction runs may be
+    dropped, which only costs cache misses.
+    """
+
+    def __init__(self, root_dir: str, model_name: str, max_segments: Optional[int] = 64):
+        self.model_name = model_name
+        self.directory = os.path.join(root_dir, re.sub(r"[^A-Za-z0-9_.-]", "_", model_name))
+        os.makedirs(self.directory, exist_ok=True)
+        self.max_segments = max_segments
+        self._log_path = os.path.join(self.directory, "index.jsonl")
+        self._log_id: Optional[Tuple[int, int]] = None
+        self._log_offset = 0
+        self._lock = threading.Lock()
+        self._segments: Dict[str, np.ndarray] = {}
+        self._segment_names: Set[str] = set()
+        self._index: Dict[str, Tuple[str, int]] = {}
+        self._refresh()
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    @property
+    def n_segments(self) -> int:
+        return len(self._segment_names)
+
+    def _segment_path(self, segment: str) -> str:
+        return os.path.join(self.directory, f"{segment}.npy")
+
+    def _segment(self, segment: str) -> np.ndarray:
+        if segment not in self._segments:
+            self._segments[segment] = np.load(self._segment_path(segment), mmap_mode="r")
+        return self._segments[segment]
+
+    def _write_segment(self, vectors: np.ndarray) -> str:
+        """Write a new uniquely named segment; it is complete on disk before any record points at it"""
+        segment = f"segment_{os.getpid()}_{uuid.uuid4().hex[:12]}"
+        tmp_path = self._segment_path(segment) + ".tmp"
+        with open(tmp_path, "wb") as f:
+            np.save(f, np.ascontiguousarray(vectors))
+        os.replace(tmp_path, self._segment_path(segment))
+        return segment
+
+    def _add_record(self, segment: str, keys: List[str]) -> None:
+        self._segment_names.add(segment)
+        for row, key in enumerate(keys):
+            self._index.setdefault(key, (segment, row))
+
+    def _refresh(self) -> None:
+        """Merge index records appended (by any process) since the last read"""
+        try:
+            f = open(self._log_path, "rb")
+        except FileNotFoundError:
+            return
+        with f:
+            stat = os.fstat(f.fileno())
+            if (stat.st_dev, stat.st_ino) != self._log_id:
+                # First read, or the log was rewritten by a compaction: start over
+                self._log_id = (stat.st_dev, stat.st_ino)
+                self._log_offset = 0
+                self._index, self._segments, self._segment_names = {}, {}, set()
+            f.seek(self._log_offset)
+            data = f.read()
+        # A record still being appended has no trailing newline yet
+        complete = data.rfind(b"\n") + 1
+        for line in data[:complete].splitlines():
+            if line.strip():
+                record = json.loads(line)
+                self._add_record(record["segment"], record["keys"])
+        self._log_offset += complete
+
+    def _lookup(self, keys: List[str]) -> List[Optional[np.ndarray]]:
+        results = []
+        for key in keys:
+            loc = self._index.get(key)
+            results.append(None if loc is None else np.array(self._segment(loc[0])[loc[1]]))
+        return results
+
+    def get_many(self, keys: List[str]) -> List[Optional[np.ndarray]]:
+        """Look up vectors by content hash; missing keys yield None"""
+        with self._lock:
+            if any(key not in self._index for key in keys):
+                self._refresh()
+            try:
+                return self._lookup(keys)
+            except FileNotFoundError:
+                # Another process compacted the segments away; its new log lists the merged one
+                self._refresh()
+                return self._lookup(keys)
+
+    def put_many(self, keys: List[str], vectors: np.ndarray) -> None:
+        """Append new vectors as a fresh segment and log its keys"""
+        with self._lock:
+            self._refresh()
+            new_rows = [i for i, key in enumerate(keys) if key not in self._index]
+            if not new_rows:
+                return
+            new_keys = [keys[i] for i in new_rows]
+            segment = self._write_segment(vectors[new_rows])
+            record = json.dumps({"segment": segment, "keys": new_keys}) + "\n"
+            # One write in append mode, so concurrent writers' records do not interleave
+            with open(self._log_path, "ab") as f:
+                f.write(record.encode("utf-8"))
+            self._add_record(segment, new_keys)
+            if self.max_segments is not None and self.n_segments > self.max_segments:
+                self._compact()
+
+    def compact(self) -> None:
+        """Merge every segment into one and rewrite the index log to match"""
+        with self._lock:
+            self._refresh()
+            self._compact()
+
+    def _compact(self) -> None:
+        if self.n_segments <= 1:
+            return
+        rows: Dict[str, List[Tuple[str, int]]] = {}
+        for key, (segment, row) in self._index.items():
+            rows.setdefault(segment, []).append((key, row))
+        keys: List[str] = []
+        parts = []
+        for segment, entries in rows.items():
+            keys.extend(key for key, _ in entries)
+            parts.append(np.asarray(self._segment(segment)[[row for _, row in entries]]))
+        merged = self._write_segment(np.concatenate(parts))
+
+        record = (json.dumps({"segment": merged, "keys": keys}) + "\n").encode("utf-8")
+        tmp_path = self._log_path + f".{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(record)
+            stat = os.fstat(f.fileno())
+        os.replace(tmp_path, self._log_path)
+        self._log_id, self._log_offset = (stat.st_dev, stat.st_ino), len(record)
+
+        old_segments = self._segment_names
+        self._index, self._segments, self._segment_names = {}, {}, set()
+        self._add_record(merged, keys)
+        for segment in old_segments:
+            try:
+                os.remove(self._segment_path(segment))
+            except OSError:
+                # Already removed by another compaction, or still mapped (Windows)
+                pass
+
+
+class EmbeddingCache:
+    """
+    Chunk-embedding cache keyed by (model name, chunk content hash).
+
+    Lookups hit an in-memory LRU first and fall back to an optional
+    memory-mapped disk tier; disk hits are promoted into memory.
+    """
+
+    def __init__(self, max_memory_items: int = 50000, cache_dir: Optional[str] = None):
+        """
+        Initialize the cache.
+
+        Args:
+            max_memory_items: Maximum number of vectors kept in the in-memory LRU
+            cache_dir: Directory for the on-disk tier; None keeps the cache in memory only
+        """
+        self.max_memory_items = max_memory_items
+        self.cache_dir = cache_dir
+        self._memory: "OrderedDict[Tuple[str, str], np.ndarray]" = OrderedDict()
+        self._stores: Dict[str, DiskEmbeddingStore] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _store(self, model_name: str) -> Optional[DiskEmbeddingStore]:
+        if not self.cache_dir:
+            return None
+        if model_name not in self._stores:
+            self._stores[model_name] = DiskEmbeddingStore(self.cache_dir, model_name)
+        return self._stores[model_name]
+
+    def _remember(self, key: Tuple[str, str], vector: np.ndarray) -> None:
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_items:
+            self._memory.popitem(last=False)
+
+    def get_many(self, model_name: str, texts: List[str]) -> List[Optional[np.ndarray]]:
+        """Return cached vectors for texts, with None for misses"""
+        hashes = [content_hash(text) for text in texts]
+        with self._lock:
+            results: List[Optional[np.ndarray]] = []
+            for h in hashes:
+                vector = self._memory.get((model_name, h))
+                if vector is not None:
+                    self._memory.move_to_end((model_name, h))
+                results.append(vector)
+
+            missing = [i for i, vector in enumerate(results) if vector is None]
+            store = self._store(model_name)
+            if missing and store is not None:
+                for i, vector in zip(missing, store.get_many([hashes[i] for i in missing])):
+                    if vector is not None:
+                        results[i] = vector
+                        self._remember((model_name, hashes[i]), vector)
+
+            found = sum(vector is not None for vector in results)
+            self.hits += found
+            self.misses += len(results) - found
+            return results
+
+    def put_many(self, model_name: str, texts: List[str], vectors: np.ndarray) -> None:
+        """Store vectors for texts in both tiers"""
+        hashes = [content_hash(text) for text in texts]
+        vectors = np.asarray(vectors)
+        with self._lock:
+            for h, vector in zip(hashes, vectors):
+                self._remember((model_name, h), vector)
+            store = self._store(model_name)
+            if store is not None:
+                store.put_many(hashes, vectors)
+
+    def clear_memory(self) -> None:
+        """Drop the in-memory tier (the disk tier is kept)"""
+        with self._lock:
+            self._memory.clear()
+
+
+_default_cache = EmbeddingCache()
+
+
+def configure_embedding_cache(max_memory_items: int = 50000, cache_dir: Optional[str] = None) -> EmbeddingCache:
+    """Replace the process-wide embedding cache, e.g. to enable the disk tier"""
+    global _default_cache
+    _default_cache = EmbeddingCache(max_memory_items=max_memory_items, cache_dir=cache_dir)
+    return _default_cache
+
+
+def get_embedding_cache() -> EmbeddingCache:
+    """Get the process-wide embedding cache"""
+    return _default_cache
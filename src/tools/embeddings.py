@@ -0,0 +1,161 @@
+from typing import Dict, List, Optional, Tuple, Union
+import threading
+import numpy as np
+from src.tools.backends import load_embedding_model
+from src.tools.embedding_cache import EmbeddingCache, get_embedding_cache
+
+DEFAULT_EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+DEFAULT_EMBEDDING_BACKEND = "sentence_transformers"
+
+
+class EmbeddingModelManager:
+    """
+    Lazily loads a sentence embedding model and shares it between callers.
+
+    The model is only constructed on the first call to `get_model`, `encode`
+    or `warmup`, and the load is guarded by a lock so concurrent workers never
+    load the same model twice.
+    """
+
+    def __init__(
+        self,
+        model_name: str = DEFAULT_EMBEDDING_MODEL,
+        device: Optional[str] = None,
+        backend: str = DEFAULT_EMBEDDING_BACKEND
+    ):
+        """
+        Initialize the manager without loading the model.
+
+        Args:
+            model_name: Name or path of the embedding model
+            device: Device to run on ("cpu", "cuda", ...); None lets the backend choose
+            backend: Name of a registered embedding backend
+        """
+        self.model_name = model_name
+        self.device = device
+        self.backend = backend
+        self._model = None
+        self._load_lock = threading.Lock()
+        self._encode_lock = threading.Lock()
+
+    @property
+    def is_loaded(self) -> bool:
+        """Whether the underlying model has been loaded"""
+        return self._model is not None
+
+    def _load_model(self):
+        """Construct the underlying model through the configured backend"""
+        return load_embedding_model(self.backend, self.model_name, self.device)
+
+    def get_model(self):
+        """Return the shared model, loading it on first use"""
+        if self._model is None:
+            with self._load_lock:
+                if self._model is None:
+                    self._model = self._load_model()
+        return self._model
+
+    def warmup(self) -> None:
+        """Load the model and run a tiny forward pass so the first real query is fast"""
+        self.encode(["warmup"])
+
+    def encode(self, texts: Union[str, List[str]], batch_size: int = 32) -> np.ndarray:
+        """
+        Encode one text or a list of texts into embeddings.
+
+        Args:
+            texts: A single string or a list of strings
+            batch_size: Batch size used by the model
+
+        Returns:
+            A 1-D array for a single string, otherwise a 2-D array (n_texts, dim)
+        """
+        model = self.get_model()
+        # Models are not guaranteed to be safe for concurrent forward passes
+        with self._encode_lock:
+            return np.asarray(model.encode(texts, batch_size=batch_size))
+
+    def encode_documents(
+        self,
+        texts: List[str],
+        cache: Optional[EmbeddingCache] = None,
+        batch_size: int = 32
+    ) -> np.ndarray:
+        """
+        Encode document chunks, reusing cached embeddings where possible.
+
+        Only chunks missing from the cache are sent to the model, in one batch.
+
+        Args:
+            texts: Chunks to encode
+            cache: Cache to use; defaults to the process-wide embedding cache
+            batch_size: Batch size used by the model
+
+        Returns:
+            A 2-D array (n_texts, dim) in the order of `texts`
+        """
+        cache = cache or get_embedding_cache()
+        vectors = cache.get_many(self.model_name, texts)
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing:
+            encoded = self.encode([texts[i] for i in missing], batch_size=batch_size)
+            cache.put_many(self.model_name, [texts[i] for i in missing], encoded)
+            for i, vector in zip(missing, encoded):
+                vectors[i] = vector
+        if not vectors:
+            return np.zeros((0, 0), dtype=np.float32)
+        return np.vstack(vectors)
+
+
+_managers: Dict[Tuple[str, Optional[str]], EmbeddingModelManager] = {}
+_managers_lock = threading.Lock()
+_default_config: Dict[str, Optional[str]] = {
+    "model_name": DEFAULT_EMBEDDING_MODEL,
+    "device": None,
+    "backend": DEFAULT_EMBEDDING_BACKEND
+}
+
+
+def configure_embedding_model(
+    model_name: str = DEFAULT_EMBEDDING_MODEL,
+    device: Optional[str] = None,
+    backend: str = DEFAULT_EMBEDDING_BACKEND
+) -> None:
+    """Set the model, device and backend used when callers do not ask for a specific one"""
+    with _managers_lock:
+        _default_config["model_name"] = model_name
+        _default_config["device"] = device
+        _default_config["backend"] = backend
+
+
+def get_embedding_manager(model_name: Optional[str] = None, device: Optional[str] = None) -> EmbeddingModelManager:
+    """
+    Get the process-wide manager for a model/device pair, creating it if needed.
+
+    Args:
+        model_name: Model to use; defaults to the configured model
+        device: Device to use; defaults to the configured device
+
+    Returns:
+        The shared EmbeddingModelManager
+    """
+    with _managers_lock:
+        model_name = model_name or _default_config["model_name"]
+        device = device if device is not None else _default_config["device"]
+        key = (model_name, device)
+        if key not in _managers:
+            _managers[key] = EmbeddingModelManager(model_name, device, _default_config["backend"])
+        return _managers[key]
+
+
+def set_embedding_manager(manager: EmbeddingModelManager) -> None:
+    """Register a manager (e.g. a preloaded or custom one) for its model/device pair"""
+    with _managers_lock:
+        _managers[(manager.model_name, manager.device)] = manager
+
+
+def warmup_embedding_model(model_name: Optional[str] = None, device: Optional[str] = None) -> EmbeddingModelManager:
+    """Load the shared model ahead of time, e.g. when a worker starts"""
+    manager = get_embedding_manager(model_name, device)
+    manager.warmup()
+    return manager
@@ -0,0 +1,150 @@
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+from functools import lru_cache
+import re
+from src.utils.concepts import get_concept_resolver
+
+# One number per match: optional sign/parentheses and currency, digits, and a
+# scale word only when it directly follows the number ("$5.2 billion", "(1,500)", "3m").
+# Digits inside words ("Q4", "FY2023") are not amounts.
+_NUMBER = re.compile(
+    r"(?P<open>\()?(?P<minus>-)?(?P<currency>\$)?\s?"
+    r"(?<![\w.,])(?P<digits>\d{1,3}(?:,\d{3})+(?:\.\d+)?|\d+(?:\.\d+)?)"
+    r"(?:\s?(?P<scale>thousand|million|billion|mn|bn|[kmb])\b)?(?!\w)"
+    r"(?P<close>\))?",
+    re.IGNORECASE
+)
+_SCALES = {
+    "thousand": 1e3, "k": 1e3,
+    "million": 1e6, "mn": 1e6, "m": 1e6,
+    "billion": 1e9, "bn": 1e9, "b": 1e9,
+}
+# Bare four-digit years are dates, not amounts
+_BARE_YEAR = re.compile(r"^(?:19|20)\d{2}$")
+
+
+def extract_year(text: str) -> Optional[int]:
+    """Extract year from text"""
+    year_patterns = [
+        r'FY(\d{4})',  # Fiscal year
+        r'(\d{4})',    # Regular year
+        r'(\d{2})',    # Two-digit year
+    ]
+
+    for pattern in year_patterns:
+        match = re.search(pattern, text)
+        if match:
+            year = int(match.group(1))
+            if year < 100:  # Handle two-digit years
+                year += 2000 if year < 50 else 1900
+            return year
+
+    return None
+
+
+def parse_amounts(text: str) -> List[float]:
+    """Every amount in a piece of text, with sign and scale applied (bare years are skipped)"""
+    amounts = []
+    for match in _NUMBER.finditer(text):
+        digits = match.group("digits")
+        scale = match.group("scale")
+        if _BARE_YEAR.match(digits) and not (scale or match.group("currency") or match.group("minus")):
+            continue
+        amount = float(digits.replace(",", ""))
+        if scale:
+            amount *= _SCALES[scale.lower()]
+        if match.group("minus") or (match.group("open") and match.group("close")):
+            amount = -amount
+        amounts.append(amount)
+    return amounts
+
+
+class FinancialDataExtractor:
+    """
+    Finds many fields in one pass over a document.
+
+    The field names are compiled into a single case-insensitive alternation
+    (longest names first), so each line is scanned once for all of them, and
+    numbers are parsed only on lines that mention a field. A field whose name
+    contains another requested field (e.g. "net sales" and "sales") reports
+    the line for both, unless report_contained is False. On a line mentioning several fields, each field takes
+    the amounts between its mention and the next one; amounts before the
+    first mention go to the first field.
+
+    Usage:
+        extractor = FinancialDataExtractor(["total assets", "net income"])
+        with open("10k.txt") as f:
+            results = extractor.extract(f)  # any iterable of lines works
+    """
+
+    def __init__(self, field_names: Sequence[str], report_contained: bool = True):
+        self.field_names = list(dict.fromkeys(field_names))
+        ordered = sorted(self.field_names, key=len, reverse=True)
+        self._pattern = re.compile(
+            "|".join(rf"(?<!\w){re.escape(name)}(?!\w)" for name in ordered),
+            re.IGNORECASE
+        )
+        lowered = {name: name.lower() for name in self.field_names}
+        self._by_lower = {lower: name for name, lower in lowered.items()}
+        # Requested fields that also match inside each longer requested field's text
+        self._contained = {
+            name: [
+                other for other in self.field_names
+                if other != name and re.search(rf"(?<!\w){re.escape(lowered[other])}(?!\w)", lowered[name])
+            ]
+            for name in self.field_names
+        } if report_contained else {name: [] for name in self.field_names}
+
+    def iter_matches(self, source: Union[str, Iterable[str]]) -> Iterator[Dict[str, Any]]:
+        """Yield {'line', 'text', 'value', 'year', 'field'} for each amount, streaming over lines"""
+        if not self.field_names:
+            return
+        lines = source.split("\n") if isinstance(source, str) else source
+        for i, line in enumerate(lines):
+            mentions = [(m.start(), m.end(), self._by_lower[m.group().lower()]) for m in self._pattern.finditer(line)]
+            if not mentions:
+                continue
+            text = line.strip()
+            year = extract_year(line)
+            for idx, (start, end, name) in enumerate(mentions):
+                segment_end = mentions[idx + 1][0] if idx + 1 < len(mentions) else len(line)
+                amounts = parse_amounts(line[end:segment_end])
+                if idx == 0:
+                    amounts = parse_amounts(line[:start]) + amounts
+                for field in [name] + self._contained[name]:
+                    for amount in amounts:
+                        yield {"line": i, "text": text, "value": amount, "year": year, "field": field}
+
+    def extract(self, source: Union[str, Iterable[str]]) -> Dict[str, List[Dict[str, Any]]]:
+        """All matches, grouped by field (every requested field has a list, possibly empty)"""
+        results: Dict[str, List[Dict[str, Any]]] = {name: [] for name in self.field_names}
+        for match in self.iter_matches(source):
+            results[match["field"]].append(match)
+        return results
+
+
+@lru_cache(maxsize=128)
+def get_extractor(field_names: Tuple[str, ...], report_contained: bool = True) -> FinancialDataExtractor:
+    """Compiled extractor for a set of fields, reused across calls"""
+    return FinancialDataExtractor(field_names, report_contained)
+
+
+def extract_concepts(source: Union[str, Iterable[str]], concepts: Sequence[str]) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Extract data points for canonical concepts (see src.utils.concepts) in one pass.
+
+    Every synonym of every concept is searched for; each match is reported
+    once, under its concept ('field'), with the synonym found as 'label'.
+    """
+    resolver = get_concept_resolver()
+    labels = {label: concept for concept in concepts for label in resolver.labels_for(concept)}
+    extractor = get_extractor(tuple(labels), report_contained=False)
+    results: Dict[str, List[Dict[str, Any]]] = {concept: [] for concept in concepts}
+    for match in extractor.iter_matches(source):
+        concept = labels[match["field"]]
+        results[concept].append({**match, "label": match["field"], "field": concept})
+    return results
+
+
+def extract_financial_fields(source: Union[str, Iterable[str]], field_names: Sequence[str]) -> Dict[str, List[Dict[str, Any]]]:
+    """Extract financial data points for many fields in one pass over the text (or an iterable of lines)"""
+    return get_extractor(tuple(field_names)).extract(source)
@@ -0,0 +1,287 @@
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from dataclasses import dataclass, field
+import json
+import re
+from src.models import JobOutput
+from src.tools.registry import calculate_financial_ratio
+from src.utils.concepts import get_concept_resolver, normalize_label
+
+# Line items that can be assembled from components when the total is not reported
+LINE_ITEM_COMPONENTS: Dict[str, Tuple[Tuple[str, ...], ...]] = {
+    "inventory": (
+        ("raw_materials", "work_in_process_and_finished_goods"),
+        ("raw_materials", "work_in_process", "finished_goods"),
+    ),
+}
+
+_YEAR_PATTERN = re.compile(r"\b(?:FY\s*)?((?:19|20)\d{2})\b", re.IGNORECASE)
+_SCALES = {"thousand": 1e3, "thousands": 1e3, "million": 1e6, "millions": 1e6, "billion": 1e9, "billions": 1e9}
+
+
+@dataclass(frozen=True)
+class Formula:
+    """A standard ratio: a numerator/denominator pair over canonical line items (src.utils.concepts)"""
+    name: str
+    numerator: Tuple[Tuple[str, float], ...]  # (line item, sign) terms summed into the numerator
+    denominator: str
+    aliases: Tuple[str, ...] = ()
+    percentage: bool = False
+
+    @property
+    def inputs(self) -> List[str]:
+        return [item for item, _ in self.numerator] + [self.denominator]
+
+    @property
+    def units(self) -> str:
+        """"percent" for margins and returns reported as percentages, otherwise "ratio" (a bare fraction)"""
+        return "percent" if self.percentage else "ratio"
+
+    def evaluate(self, values: Dict[str, float]) -> Optional[float]:
+        """Compute the ratio from line-item values (all of `inputs` must be present); None when the denominator is zero"""
+        if values[self.denominator] == 0:
+            return None
+        numerator = sum(sign * values[item] for item, sign in self.numerator)
+        ratio = calculate_financial_ratio(numerator, values[self.denominator])
+        return ratio * 100 if self.percentage else ratio
+
+
+_formulas: Dict[str, Formula] = {}
+
+
+def register_formula(formula: Formula) -> None:
+    """Add a formula to the library (replacing any with the same name)"""
+    _formulas[formula.name] = formula
+
+
+def available_formulas() -> List[str]:
+    return sorted(_formulas)
+
+
+def find_formulas(text: str) -> List[Formula]:
+    """Formulas whose name or an alias appears in the text, in order of first mention"""
+    normalized = f" {normalize_label(text)} "
+    found = []
+    for formula in _formulas.values():
+        positions = [
+            normalized.find(f" {normalize_label(name)} ")
+            for name in (formula.name.replace("_", " "),) + formula.aliases
+        ]
+        positions = [p for p in positions if p >= 0]
+        if positions:
+            found.append((min(positions), formula))
+    return [formula for _, formula in sorted(found, key=lambda pair: pair[0])]
+
+
+def _numeric(value: Any) -> Optional[float]:
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        text = value.strip().replace(",", "").replace("$", "")
+        scale = 1.0
+        words = text.split()
+        if len(words) == 2 and words[1].lower() in _SCALES:
+            text, scale = words[0], _SCALES[words[1].lower()]
+        negative = text.startswith("(") and text.endswith(")")
+        try:
+            number = float(text.strip("()")) * scale
+        except ValueError:
+            return None
+        return -number if negative else number
+    return None
+
+
+def _load(value: Any) -> Any:
+    if isinstance(value, str):
+        try:
+            return json.loads(value)
+        except json.JSONDecodeError:
+            return value
+    return value
+
+
+def numeric_line_items(data: Any) -> Dict[Optional[str], Dict[str, float]]:
+    """
+    Collect numeric values from step outputs as {fiscal year: {label: value}}.
+
+    Accepts dicts (or their JSON text), flat keys such as "Total Current
+    Assets FY2023", nesting by year ({"FY2023": {"Total current assets": ...}})
+    or by item ({"Total current assets": {"FY2023": ...}}), and a top-level
+    "values" wrapper. Values without a year are stored under None.
+    """
+    by_year: Dict[Optional[str], Dict[str, float]] = {}
+
+    def visit(node: Any, labels: Tuple[str, ...]) -> None:
+        node = _load(node)
+        if isinstance(node, dict):
+            for key, value in node.items():
+                visit(value, labels + (str(key),))
+            return
+        if isinstance(node, list):
+            for value in node:
+                visit(value, labels)
+            return
+        number = _numeric(node)
+        if number is None or not labels:
+            return
+        year, parts = None, []
+        for label in labels:
+            match = _YEAR_PATTERN.search(label)
+            if match:
+                year = match.group(1)
+                label = _YEAR_PATTERN.sub(" ", label)
+            if normalize_label(label) not in ("", "values", "data"):
+                parts.append(label)
+        if parts:
+            by_year.setdefault(year, {})[normalize_label(parts[-1])] = number
+
+    visit(data, ())
+    return by_year
+
+
+def resolve_line_items(values: Dict[str, float]) -> Dict[str, float]:
+    """Map labels onto canonical line items (see src.utils.concepts), assembling components where needed"""
+    resolver = get_concept_resolver()
+    resolved: Dict[str, float] = {}
+    for label, value in values.items():
+        concept = resolver.resolve(label)
+        if concept is not None:
+            resolved.setdefault(concept, value)
+    for item, alternatives in LINE_ITEM_COMPONENTS.items():
+        if item in resolved:
+            continue
+        for components in alternatives:
+            if all(component in resolved for component in components):
+                resolved[item] = sum(resolved[component] for component in components)
+                break
+    return resolved
+
+
+@dataclass
+class FormulaResult:
+    """Per-year inputs and results for one or more formulas (None where a ratio is undefined)"""
+    formulas: List[Formula]
+    inputs: Dict[str, Dict[str, float]] = field(default_factory=dict)
+    results: Dict[str, Dict[str, Optional[float]]] = field(default_factory=dict)
+    # Why results are None, e.g. "inventory_turnover FY2022: inventory is zero"
+    undefined: List[str] = field(default_factory=list)
+
+    @property
+    def units(self) -> Dict[str, str]:
+        """Units of each formula's results ("ratio" or "percent")"""
+        return {formula.name: formula.units for formula in self.formulas}
+
+    def changes(self) -> Dict[str, float]:
+        """Percentage change of each result between the earliest and latest year"""
+        changes = {}
+        years = sorted(self.results)
+        if len(years) < 2:
+            return changes
+        first, last = self.results[years[0]], self.results[years[-1]]
+        for name, value in last.items():
+            if value is not None and first.get(name):
+                changes[name] = round((value - first[name]) / abs(first[name]) * 100, 2)
+        return changes
+
+
+def evaluate_formulas(formulas: Sequence[Formula], data: Any, years: Optional[Sequence[str]] = None) -> Optional[FormulaResult]:
+    """
+    Evaluate formulas over numeric step outputs.
+
+    Returns None unless every formula could be computed for at least one
+    year (from the requested `years`, if given) - the caller should then
+    fall back to the LLM. Undated values apply to every year.
+    """
+    if not formulas:
+        return None
+    by_year = numeric_line_items(data)
+    undated = resolve_line_items(by_year.get(None, {}))
+    result = FormulaResult(list(formulas))
+    for year in sorted(y for y in by_year if y is not None) or [None]:
+        if years and year is not None and year not in years:
+            continue
+        values = {**undated, **resolve_line_items(by_year.get(year, {}))}
+        if not all(all(item in values for item in formula.inputs) for formula in formulas):
+            continue
+        label = f"FY{year}" if year else "value"
+        needed = {item for formula in formulas for item in formula.inputs}
+        result.inputs[label] = {item: values[item] for item in sorted(needed)}
+        result.results[label] = {}
+        for formula in formulas:
+            value = formula.evaluate(values)
+            if value is None:
+                result.undefined.append(f"{formula.name} {label}: {formula.denominator} is zero")
+            result.results[label][formula.name] = None if value is None else round(value, 4)
+    return result if result.results else None
+
+
+for _formula in (
+    Formula("quick_ratio", (("current_assets", 1), ("inventory", -1)), "current_liabilities", ("acid test ratio",)),
+    Formula("current_ratio", (("current_assets", 1),), "current_liabilities", ("working capital ratio",)),
+    Formula("inventory_turnover", (("cost_of_sales", 1),), "inventory", ("inventory turnover ratio",)),
+    Formula("capex_to_revenue", (("capex", 1),), "revenue", ("capex revenue", "capex revenue ratio", "capex to revenue ratio")),
+    Formula("fixed_assets_to_total_assets", (("fixed_assets", 1),), "total_assets", ("fixed assets total assets", "fixed assets total assets ratio")),
+    Formula("return_on_assets", (("net_income", 1),), "total_assets", ("roa",), percentage=True),
+    Formula("gross_margin", (("revenue", 1), ("cost_of_sales", -1)), "revenue", ("gross profit margin",), percentage=True),
+    Formula("operating_margin", (("operating_income", 1),), "revenue", ("operating profit margin",), percentage=True),
+    Formula("net_margin", (("net_income", 1),), "revenue", ("net profit margin",), percentage=True),
+    Formula("debt_to_equity", (("total_liabilities", 1),), "total_equity", ("debt equity ratio",)),
+    Formula("asset_turnover", (("revenue", 1),), "total_assets", ("total asset turnover",)),
+):
+    register_formula(_formula)
+
+
+class FormulaEngine:
+    """
+    Answers structuring and calculation steps for known ratios without an LLM.
+
+    `run_step` returns a JobOutput when the step's task names library
+    formulas and the referenced step outputs contain every input as numbers;
+    otherwise None, and the step goes to its agent as usual. Pass the step's
+    task template, not the formatted task, so that formula names and years
+    inside earlier outputs are not mistaken for what the step asks for.
+    Calculator answers carry a "units" entry, since margins and returns are
+    percentages while the other ratios are fractions.
+    """
+
+    # Agents whose steps the engine can take over
+    STEP_AGENTS = ("information_structurer", "calculator")
+
+    def run_step(self, agent_name: str, task: str, inputs: Dict[str, Any]) -> Optional[JobOutput]:
+        """
+        Args:
+            agent_name: The step's agent
+            task: The step's task template
+            inputs: Earlier step results referenced by the task, by output key
+        """
+        if agent_name not in self.STEP_AGENTS or not inputs:
+            return None
+        formulas = find_formulas(task)
+        if not formulas:
+            return None
+        years = sorted({match.group(1) for match in _YEAR_PATTERN.finditer(task)})
+        result = evaluate_formulas(formulas, inputs, years or None)
+        if result is None:
+            return None
+
+        names = ", ".join(formula.name for formula in formulas)
+        if agent_name == "information_structurer":
+            return JobOutput(
+                explanation=f"Structured the inputs for {names} from the extracted figures.",
+                citation=json.dumps(inputs, default=str),
+                answer=result.inputs
+            )
+        answer: Dict[str, Any] = dict(result.results)
+        changes = result.changes()
+        if changes:
+            answer["percentage_change"] = changes
+        answer["units"] = result.units
+        explanation = f"Computed {names} with the formula engine."
+        if result.undefined:
+            explanation += f" Undefined (division by zero): {'; '.join(result.undefined)}."
+        return JobOutput(
+            explanation=explanation,
+            citation=json.dumps(result.inputs),
+            answer=answer
+        )
@@ -1,23 +1,60 @@
-from typing import Dict, List, Callable, Any, Optional  
+from typing import Dict, Iterable, List, Callable, Any, Optional, Union  
 from src.tools.tool import Tool  
 import re  
-from rank_bm25 import BM25Plus  
-import numpy as np  
-from sentence_transformers import SentenceTransformer  
-from sklearn.metrics.pairwise import cosine_similarity  
+from functools import partial
+from src.tools.embeddings import get_embedding_manager
+from src.tools.backends import build_keyword_scorer
+from src.tools.chunking import chunk_text
+from src.tools.extraction import extract_financial_fields, extract_year, get_extractor
+from src.tools.corpus_index import CorpusIndex, CorpusSearchResult, search_corpus
+from src.tools.retrieval import DocumentIndex, EmbeddingMatrix, SearchResult, get_document_index, top_k
 
-def retrieve_from_context(context: str, query: str, max_results: int = 3) -> List[str]:  
-    """Retrieve relevant passages from context using both keyword and semantic matching"""  
-    # Split context into chunks  
-    chunks = chunk_text(context)  
-      
-    # Get both keyword and semantic matches  
-    keyword_matches = bm25_retrieve(chunks, query, max_results)  
-    semantic_matches = semantic_retrieve(chunks, query, max_results)  
-      
-    # Combine and deduplicate results  
-    combined = list(set(keyword_matches + semantic_matches))  
-    return combined[:max_results]  
+def retrieve_from_context(  
+    context: Union[str, DocumentIndex, CorpusIndex],  
+    query: str,  
+    max_results: int = 3,  
+    model_name: Optional[str] = None,  
+    device: Optional[str] = None,  
+    fusion: str = "rrf",  
+    return_scores: bool = False,  
+    filters: Optional[Dict[str, Any]] = None  
+) -> Union[List[str], List[SearchResult], List[CorpusSearchResult]]:  
+    """  
+    Retrieve relevant passages from raw text, a prebuilt DocumentIndex, or a CorpusIndex.  
+      
+    Single documents use fused keyword and semantic ranking; a CorpusIndex is  
+    searched approximately across filings, restricted by metadata `filters`.  
+    """  
+    if isinstance(context, CorpusIndex):  
+        return search_corpus(context, query, max_results, filters=filters, return_scores=return_scores)  
+    if isinstance(context, DocumentIndex):  
+        index = context  
+    else:  
+        # Indexes for recently seen documents are reused across queries  
+        index = get_document_index(context, model_name=model_name, device=device)  
+      
+    results = index.search(query, max_results, fusion=fusion)  
+    return results if return_scores else [result.text for result in results]  
+
+def retrieve_many(  
+    context: Union[str, DocumentIndex],  
+    queries: List[str],  
+    k: int = 3,  
+    model_name: Optional[str] = None,  
+    device: Optional[str] = None,  
+    fusion: str = "rrf",  
+    return_scores: bool = False  
+) -> Union[List[List[str]], List[List[SearchResult]]]:  
+    """Retrieve relevant passages for several queries at once (one embedding batch, one BM25 pass)"""  
+    if isinstance(context, DocumentIndex):  
+        index = context  
+    else:  
+        index = get_document_index(context, model_name=model_name, device=device)  
+      
+    results = index.search_many(queries, k, fusion=fusion)  
+    if return_scores:  
+        return results  
+    return [[result.text for result in per_query] for per_query in results]  
 
 def summarize_text(text: str, max_length: int = 200) -> str:  
     """Summarize text (this would normally call an LLM)"""  
@@ -30,25 +67,6 @@ def summarize_text(text: str, max_length: int = 200) -> str:
     # Just return first and last sentences for demo purposes  
     return " ".join([sentences[0]] + [sentences[-1]])  
 
-def chunk_text(text: str, chunk_size: int = 1000, overlap: int = 100) -> List[str]:  
-    """Split text into overlapping chunks"""  
-    chunks = []  
-    start = 0  
-      
-    while start < len(text):  
-        end = min(start + chunk_size, len(text))  
-          
-        # Try to break at sentence boundary  
-        if end < len(text):  
-            boundary = text.rfind('.', start, end) + 1  
-            if boundary > start:  
-                end = boundary  
-                  
-        chunks.append(text[start:end])  
-        start = end - overlap  
-          
-    return chunks  
-
 def calculate(expression: str) -> float:  
     """Safely evaluate a mathematical expression"""  
     # Limited to basic operations for safety  
@@ -64,86 +82,35 @@ def calculate_financial_ratio(numerator: float, denominator: float) -> float:
         return float('inf')  # or handle this case differently  
     return numerator / denominator  
 
-def bm25_retrieve(chunks: List[str], query: str, k: int) -> List[str]:  
-    """Retrieve chunks using BM25 keyword matching"""  
+def bm25_retrieve(chunks: List[str], query: str, k: int, backend: str = "numpy") -> List[str]:  
+    """Retrieve chunks using BM25 keyword matching ("numpy" or "rank_bm25" backend)"""  
     tokenized_chunks = [chunk.split() for chunk in chunks]  
-    bm25 = BM25Plus(tokenized_chunks)  
+    bm25 = build_keyword_scorer(backend, tokenized_chunks)  
       
     scores = bm25.get_scores(query.split())  
-    top_k_indices = np.argsort(scores)[-k:][::-1]  
+    top_k_indices = top_k(scores, k)  
     return [chunks[i] for i in top_k_indices]  
 
-def semantic_retrieve(chunks: List[str], query: str, k: int) -> List[str]:  
-    """Retrieve chunks using semantic similarity"""  
-    model = SentenceTransformer('all-MiniLM-L6-v2')  
+def semantic_retrieve(  
+    chunks: List[str],  
+    query: str,  
+    k: int,  
+    model_name: Optional[str] = None,  
+    device: Optional[str] = None  
+) -> List[str]:  
+    """Retrieve chunks using semantic similarity (the model is loaded once per process)"""  
+    model = get_embedding_manager(model_name, device)  
       
     query_embedding = model.encode(query)  
-    chunk_embeddings = model.encode(chunks)  
+    chunk_embeddings = model.encode_documents(chunks)  
       
-    similarities = cosine_similarity([query_embedding], chunk_embeddings)[0]  
-    top_k_indices = np.argsort(similarities)[-k:][::-1]  
+    similarities = EmbeddingMatrix.from_embeddings(chunk_embeddings).scores(query_embedding)[0]  
+    top_k_indices = top_k(similarities, k)  
     return [chunks[i] for i in top_k_indices]  
 
-def extract_financial_data(text: str, field_name: str) -> List[Dict[str, Any]]:  
-    """Extract financial data points for a specific field with improved accuracy"""  
-    results = []  
-    lines = text.split('\n')  
-      
-    # Common financial data patterns  
-    patterns = [  
-        r'\$?\s*(\d+(?:,\d{3})*(?:\.\d+)?)\s*(?:million|billion|m|b|M|B)?',  # Standard format  
-        r'\(?\$?\s*(\d+(?:,\d{3})*(?:\.\d+)?)\s*(?:million|billion|m|b|M|B)?\)?',  # With parentheses  
-        r'(\d+(?:,\d{3})*(?:\.\d+)?)\s*\(\d+(?:,\d{3})*(?:\.\d+)?\)',  # With comparison  
-    ]  
-      
-    for i, line in enumerate(lines):  
-        if field_name.lower() in line.lower():  
-            for pattern in patterns:  
-                matches = re.finditer(pattern, line)  
-                for match in matches:  
-                    try:  
-                        # Extract and clean the number  
-                        amount_str = match.group(1).replace(',', '')  
-                        amount = float(amount_str)  
-                          
-                        # Adjust for scale  
-                        if any(scale in line for scale in ['billion', 'b', 'B']):  
-                            amount *= 1_000_000_000  
-                        elif any(scale in line for scale in ['million', 'm', 'M']):  
-                            amount *= 1_000_000  
-                          
-                        # Extract year if present  
-                        year = extract_year(line)  
-                          
-                        results.append({  
-                            'line': i,  
-                            'text': line.strip(),  
-                            'value': amount,  
-                            'year': year,  
-                            'field': field_name  
-                        })  
-                    except (ValueError, IndexError):  
-                        continue  
-      
-    return results  
-
-def extract_year(text: str) -> Optional[int]:  
-    """Extract year from text"""  
-    year_patterns = [  
-        r'FY(\d{4})',  # Fiscal year  
-        r'(\d{4})',    # Regular year  
-        r'(\d{2})',    # Two-digit year  
-    ]  
-      
-    for pattern in year_patterns:  
-        match = re.search(pattern, text)  
-        if match:  
-            year = int(match.group(1))  
-            if year < 100:  # Handle two-digit years  
-                year += 2000 if year < 50 else 1900  
-            return year  
-      
-    return None
+def extract_financial_data(text: Union[str, Iterable[str]], field_name: str) -> List[Dict[str, Any]]:
+    """Extract financial data points for a specific field (see extract_financial_fields for many at once)"""
+    return get_extractor((field_name,)).extract(text)[field_name]
 
 class ToolRegistry:  
     def __init__(self):  
@@ -168,16 +135,29 @@ class ToolRegistry:
         tool = self.get_tool(name)  
         return tool.execute(**kwargs)  
 
-def create_default_registry() -> ToolRegistry:  
-    """Initialize with our basic tools"""  
+def create_default_registry(corpus: Optional[CorpusIndex] = None) -> ToolRegistry:  
+    """Initialize with our basic tools, plus corpus search when a CorpusIndex is given"""  
     registry = ToolRegistry()  
       
     registry.register_tool(  
         "retrieve",   
-        "Retrieve relevant information from context",   
+        "Retrieve relevant information from context text or a prebuilt document index",   
         retrieve_from_context  
     )  
       
+    registry.register_tool(  
+        "retrieve_many",  
+        "Retrieve relevant information for several queries in one batch",  
+        retrieve_many  
+    )  
+      
+    if corpus is not None:  
+        registry.register_tool(  
+            "search_corpus",  
+            "Retrieve relevant passages across all indexed filings, filtered by company, doc_name or fiscal_year",  
+            partial(search_corpus, corpus)  
+        )  
+      
     registry.register_tool(  
         "summarize",   
         "Summarize text to a shorter length",   
@@ -186,7 +166,7 @@ def create_default_registry() -> ToolRegistry:
       
     registry.register_tool(  
         "chunk",   
-        "Split text into manageable chunks",   
+        "Split text into manageable, structure-aligned chunks",   
         chunk_text  
     )  
       
@@ -207,5 +187,11 @@ def create_default_registry() -> ToolRegistry:
         "Extract financial data points from text",   
         extract_financial_data  
     )  
+
+    registry.register_tool(
+        "extract_financial_fields",
+        "Extract financial data points for many fields in one pass",
+        extract_financial_fields
+    )
       
     return registry
\ No newline at end of file
@@ -0,0 +1,538 @@
+from typing import Dict, List, Optional, Sequence
+from collections import OrderedDict
+from dataclasses import dataclass
+import json
+import os
+import threading
+import numpy as np
+from src.tools.chunking import TextSpan, chunk_spans
+from src.tools.embedding_cache import content_hash
+from src.tools.embeddings import get_embedding_manager
+from src.utils.tokens import count_tokens
+
+
+def tokenize(text: str) -> List[str]:
+    """Tokenize text the same way as the keyword retriever"""
+    return text.split()
+
+
+@dataclass
+class SearchResult:
+    """A retrieved chunk with its fused and per-retriever scores"""
+    chunk_id: int
+    text: str
+    score: float
+    keyword_score: float
+    semantic_score: float
+    start: Optional[int] = None
+    end: Optional[int] = None
+
+
+def _ranks(scores: np.ndarray) -> np.ndarray:
+    """0-based descending rank of each column per row; ties keep chunk order"""
+    order = np.argsort(-scores, axis=1, kind="stable")
+    ranks = np.empty_like(order)
+    np.put_along_axis(ranks, order, np.arange(scores.shape[1])[None, :].repeat(scores.shape[0], axis=0), axis=1)
+    return ranks
+
+
+def reciprocal_rank_fusion(score_matrices: Sequence[np.ndarray], weights: Optional[Sequence[float]] = None, k: int = 60) -> np.ndarray:
+    """
+    Fuse per-retriever scores by reciprocal rank.
+
+    Args:
+        score_matrices: Arrays of shape (n_queries, n_chunks), one per retriever
+        weights: Optional weight per retriever
+        k: RRF smoothing constant
+
+    Returns:
+        Fused scores of shape (n_queries, n_chunks)
+    """
+    if weights is None:
+        weights = [1.0] * len(score_matrices)
+    return sum(w / (k + 1 + _ranks(scores)) for w, scores in zip(weights, score_matrices))
+
+
+def weighted_score_fusion(score_matrices: Sequence[np.ndarray], weights: Optional[Sequence[float]] = None) -> np.ndarray:
+    """
+    Fuse per-retriever scores by a weighted sum of per-query min-max normalized scores.
+
+    Args:
+        score_matrices: Arrays of shape (n_queries, n_chunks), one per retriever
+        weights: Optional weight per retriever
+
+    Returns:
+        Fused scores of shape (n_queries, n_chunks)
+    """
+    if weights is None:
+        weights = [1.0] * len(score_matrices)
+    fused = 0.0
+    for w, scores in zip(weights, score_matrices):
+        low = scores.min(axis=1, keepdims=True)
+        span = scores.max(axis=1, keepdims=True) - low
+        fused = fused + w * (scores - low) / np.where(span == 0, 1, span)
+    return fused
+
+
+FUSION_METHODS = {
+    "rrf": reciprocal_rank_fusion,
+    "weighted": weighted_score_fusion,
+}
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """
+    Indices of the k best scores in descending order; ties go to the earlier chunk.
+
+    Uses `partition` so only the k winners are sorted.
+    """
+    n = len(scores)
+    k = min(k, n)
+    if k <= 0:
+        return np.zeros(0, dtype=np.int64)
+    if k < n:
+        # Everything above the k-th best score wins; the remaining places go to the
+        # earliest chunks tied with it, however many ties there are
+        threshold = np.partition(scores, n - k)[n - k]
+        above = np.flatnonzero(scores > threshold)
+        tied = np.flatnonzero(scores == threshold)[:k - len(above)]
+        candidates = np.concatenate([above, tied])
+    else:
+        candidates = np.arange(n)
+    order = np.lexsort((candidates, -scores[candidates]))
+    return candidates[order[:k]]
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    """L2-normalize rows as float32; zero rows stay zero"""
+    vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+class EmbeddingMatrix:
+    """
+    L2-normalized chunk embeddings stored as float32, float16 or int8.
+
+    Because rows are unit length, cosine similarity against a normalized
+    query is a single matrix product. int8 storage keeps one scale per row.
+    float32 is the fastest to score; float16 and int8 halve or quarter the
+    memory footprint but are upcast on every query.
+    """
+
+    DTYPES = ("float32", "float16", "int8")
+
+    def __init__(self, vectors: np.ndarray, scales: Optional[np.ndarray] = None):
+        self.vectors = vectors
+        self.scales = scales
+
+    @property
+    def dtype(self) -> str:
+        return str(self.vectors.dtype)
+
+    def __len__(self) -> int:
+        return self.vectors.shape[0]
+
+    @classmethod
+    def from_embeddings(cls, embeddings: np.ndarray, dtype: str = "float32") -> "EmbeddingMatrix":
+        """Normalize raw embeddings and store them at the requested precision"""
+        if dtype not in cls.DTYPES:
+            raise ValueError(f"Unsupported embedding dtype: {dtype}")
+        if len(embeddings) == 0:
+            return cls(np.zeros((0, 0), dtype=dtype))
+        unit = normalize_rows(embeddings)
+        if dtype == "int8":
+            scales = np.abs(unit).max(axis=1) / 127
+            scales[scales == 0] = 1
+            return cls(np.round(unit / scales[:, None]).astype(np.int8), scales.astype(np.float32))
+        return cls(unit.astype(dtype))
+
+    def scores(self, query_embeddings: np.ndarray) -> np.ndarray:
+        """Cosine similarity of each query (rows) to every stored chunk"""
+        queries = normalize_rows(query_embeddings)
+        if len(self) == 0:
+            return np.zeros((len(queries), 0), dtype=np.float32)
+        scores = queries @ self.vectors.T
+        if self.scales is not None:
+            scores = scores * self.scales
+        return scores.astype(np.float32, copy=False)
+
+
+class BM25Statistics:
+    """
+    BM25+ statistics for a fixed set of chunks, stored as flat NumPy arrays.
+
+    Scores match `rank_bm25.BM25Plus`, but the per-posting term weights are
+    computed once at build time so each query only gathers and sums them.
+    Postings are kept in CSR layout: the postings of term `t` are
+    `doc_ids[indptr[t]:indptr[t + 1]]` with weights in the same slice of `weights`.
+    """
+
+    def __init__(
+        self,
+        terms: List[str],
+        idf: np.ndarray,
+        indptr: np.ndarray,
+        doc_ids: np.ndarray,
+        weights: np.ndarray,
+        n_docs: int,
+        delta: float = 1.0
+    ):
+        self.terms = terms
+        self.vocab = {term: i for i, term in enumerate(terms)}
+        self.idf = idf
+        self.indptr = indptr
+        self.doc_ids = doc_ids
+        self.weights = weights
+        self.n_docs = n_docs
+        self.delta = delta
+
+    @classmethod
+    def build(cls, tokenized_docs: List[List[str]], k1: float = 1.5, b: float = 0.75, delta: float = 1.0) -> "BM25Statistics":
+        """Build statistics from tokenized chunks"""
+        n_docs = len(tokenized_docs)
+        doc_len = np.array([len(doc) for doc in tokenized_docs], dtype=np.float64)
+        avgdl = doc_len.mean() if n_docs and doc_len.sum() else 1.0
+        norm = k1 * (1 - b + b * doc_len / avgdl)
+
+        postings: Dict[str, List[tuple]] = {}
+        for doc_id, doc in enumerate(tokenized_docs):
+            frequencies: Dict[str, int] = {}
+            for token in doc:
+                frequencies[token] = frequencies.get(token, 0) + 1
+            for token, tf in frequencies.items():
+                postings.setdefault(token, []).append((doc_id, tf))
+
+        terms = list(postings)
+        indptr = np.zeros(len(terms) + 1, dtype=np.int64)
+        indptr[1:] = np.cumsum([len(postings[t]) for t in terms])
+        doc_ids = np.empty(indptr[-1], dtype=np.int32)
+        tfs = np.empty(indptr[-1], dtype=np.float64)
+        for i, term in enumerate(terms):
+            entries = np.array(postings[term], dtype=np.float64)
+            doc_ids[indptr[i]:indptr[i + 1]] = entries[:, 0]
+            tfs[indptr[i]:indptr[i + 1]] = entries[:, 1]
+
+        weights = tfs * (k1 + 1) / (norm[doc_ids] + tfs) if len(tfs) else tfs
+        idf = np.log((n_docs + 1) / np.diff(indptr)) if terms else np.zeros(0)
+        return cls(terms, idf, indptr, doc_ids, weights, n_docs, delta)
+
+    def get_scores(self, query_tokens: List[str]) -> np.ndarray:
+        """Score every chunk against a tokenized query"""
+        scores = np.zeros(self.n_docs)
+        for token in query_tokens:
+            t = self.vocab.get(token)
+            if t is None:
+                continue
+            start, end = self.indptr[t], self.indptr[t + 1]
+            scores += self.idf[t] * self.delta
+            scores[self.doc_ids[start:end]] += self.idf[t] * self.weights[start:end]
+        return scores
+
+    def get_scores_many(self, queries_tokens: List[List[str]]) -> np.ndarray:
+        """
+        Score every chunk against several tokenized queries in one pass.
+
+        The rows of the term/chunk weight matrix are materialized once for the
+        union of query terms and combined with a single matrix product.
+
+        Returns:
+            Array of shape (n_queries, n_chunks)
+        """
+        term_ids = sorted({self.vocab[token] for tokens in queries_tokens for token in tokens if token in self.vocab})
+        if not term_ids:
+            return np.zeros((len(queries_tokens), self.n_docs))
+        column = {t: i for i, t in enumerate(term_ids)}
+
+        term_scores = np.empty((len(term_ids), self.n_docs))
+        for row, t in enumerate(term_ids):
+            start, end = self.indptr[t], self.indptr[t + 1]
+            term_scores[row] = self.idf[t] * self.delta
+            term_scores[row, self.doc_ids[start:end]] += self.idf[t] * self.weights[start:end]
+
+        query_counts = np.zeros((len(queries_tokens), len(term_ids)))
+        for q, tokens in enumerate(queries_tokens):
+            for token in tokens:
+                t = self.vocab.get(token)
+                if t is not None:
+                    query_counts[q, column[t]] += 1
+        return query_counts @ term_scores
+
+    def save(self, path: str) -> None:
+        """Save the statistics to an .npz file (no pickled objects, so loading never runs stored code)"""
+        np.savez(
+            path,
+            # The vocabulary as UTF-8 JSON bytes: object arrays would need pickle, and fixed-width
+            # unicode arrays pad every term to the longest one
+            terms=np.frombuffer(json.dumps(self.terms).encode("utf-8"), dtype=np.uint8),
+            idf=self.idf,
+            indptr=self.indptr,
+            doc_ids=self.doc_ids,
+            weights=self.weights,
+            n_docs=self.n_docs,
+            delta=self.delta
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "BM25Statistics":
+        """Load statistics saved with `save`"""
+        with np.load(path, allow_pickle=False) as data:
+            return cls(
+                terms=json.loads(data["terms"].tobytes().decode("utf-8")),
+                idf=data["idf"],
+                indptr=data["indptr"],
+                doc_ids=data["doc_ids"],
+                weights=data["weights"],
+                n_docs=int(data["n_docs"]),
+                delta=float(data["delta"])
+            )
+
+
+class DocumentIndex:
+    """
+    Retrieval index over a single filing: chunks, BM25 statistics and chunk embeddings.
+
+    Build it once per document, then call `query` as many times as needed.
+    Indexes can be saved to a directory and reloaded without re-embedding.
+    """
+
+    def __init__(
+        self,
+        chunks: List[str],
+        bm25: BM25Statistics,
+        embeddings: EmbeddingMatrix,
+        model_name: str,
+        device: Optional[str] = None,
+        doc_id: Optional[str] = None,
+        spans: Optional[List[TextSpan]] = None
+    ):
+        self.chunks = chunks
+        self.spans = spans
+        self.bm25 = bm25
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.device = device
+        self.doc_id = doc_id
+
+    def __len__(self) -> int:
+        return len(self.chunks)
+
+    @classmethod
+    def build(
+        cls,
+        text: str,
+        model_name: Optional[str] = None,
+        device: Optional[str] = None,
+        chunk_size: int = 1000,
+        overlap: int = 100,
+        doc_id: Optional[str] = None,
+        embedding_dtype: str = "float32"
+    ) -> "DocumentIndex":
+        """
+        Chunk, tokenize and embed a document.
+
+        Args:
+            text: Full document text
+            model_name: Embedding model; defaults to the configured model
+            device: Device for the embedding model
+            chunk_size: Maximum characters per chunk
+            overlap: Characters of overlap between consecutive chunks
+            doc_id: Optional identifier stored with the index
+            embedding_dtype: Storage precision for embeddings ("float32", "float16" or "int8")
+
+        Returns:
+            The built DocumentIndex
+        """
+        spans = chunk_spans(text, chunk_size=chunk_size, overlap=overlap)
+        chunks = [span.slice(text) for span in spans]
+        bm25 = BM25Statistics.build([tokenize(chunk) for chunk in chunks])
+        manager = get_embedding_manager(model_name, device)
+        embeddings = EmbeddingMatrix.from_embeddings(manager.encode_documents(chunks), embedding_dtype)
+        return cls(chunks, bm25, embeddings, manager.model_name, manager.device, doc_id or content_hash(text), spans)
+
+    def keyword_scores(self, query: str) -> np.ndarray:
+        """BM25+ score of every chunk for the query"""
+        return self.bm25.get_scores(tokenize(query))
+
+    def semantic_scores(self, query: str) -> np.ndarray:
+        """Cosine similarity of every chunk to the query"""
+        return self.semantic_scores_many([query])[0]
+
+    def semantic_scores_many(self, queries: List[str]) -> np.ndarray:
+        """Cosine similarity of every chunk to each query, encoding all queries in one batch"""
+        query_embeddings = get_embedding_manager(self.model_name, self.device).encode(list(queries))
+        return self.embeddings.scores(query_embeddings)
+
+    def search_many(
+        self,
+        queries: List[str],
+        k: int = 3,
+        fusion: str = "rrf",
+        weights: Optional[Sequence[float]] = None
+    ) -> List[List[SearchResult]]:
+        """
+        Hybrid keyword/semantic search for several queries.
+
+        Both retrievers score every chunk, the score matrices are fused
+        (reciprocal rank or weighted normalized scores) and the top k chunks
+        are returned in a deterministic order.
+
+        Args:
+            queries: Query strings
+            k: Number of results per query
+            fusion: "rrf" or "weighted"
+            weights: Optional (keyword, semantic) weights
+
+        Returns:
+            One ranked list of SearchResult per query
+        """
+        if fusion not in FUSION_METHODS:
+            raise ValueError(f"Unknown fusion method: {fusion}")
+        if not queries:
+            return []
+        if not self.chunks:
+            return [[] for _ in queries]
+
+        keyword = self.bm25.get_scores_many([tokenize(q) for q in queries])
+        semantic = self.semantic_scores_many(queries)
+        fused = FUSION_METHODS[fusion]([keyword, semantic], weights)
+
+        results = []
+        for q in range(len(queries)):
+            results.append([
+                SearchResult(
+                    chunk_id=int(i),
+                    text=self.chunks[i],
+                    score=float(fused[q, i]),
+                    keyword_score=float(keyword[q, i]),
+                    semantic_score=float(semantic[q, i]),
+                    start=self.spans[i].start if self.spans else None,
+                    end=self.spans[i].end if self.spans else None
+                )
+                for i in top_k(fused[q], k)
+            ])
+        return results
+
+    def search(self, query: str, k: int = 3, fusion: str = "rrf", weights: Optional[Sequence[float]] = None) -> List[SearchResult]:
+        """Hybrid keyword/semantic search for one query"""
+        return self.search_many([query], k, fusion, weights)[0]
+
+    def query(self, query: str, k: int = 3) -> List[str]:
+        """Retrieve the most relevant chunks using keyword and semantic matching"""
+        return [result.text for result in self.search(query, k)]
+
+    def query_many(self, queries: List[str], k: int = 3) -> List[List[str]]:
+        """Retrieve the most relevant chunks for several queries with one model batch and one BM25 pass"""
+        return [[result.text for result in results] for results in self.search_many(queries, k)]
+
+    def save(self, directory: str) -> None:
+        """Save the index to a directory"""
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, "chunks.json"), "w") as f:
+            json.dump(self.chunks, f)
+        with open(os.path.join(directory, "meta.json"), "w") as f:
+            json.dump({
+                "model_name": self.model_name,
+                "device": self.device,
+                "doc_id": self.doc_id,
+                "spans": [list(span) for span in self.spans] if self.spans else None
+            }, f)
+        self.bm25.save(os.path.join(directory, "bm25.npz"))
+        np.save(os.path.join(directory, "embeddings.npy"), np.asarray(self.embeddings.vectors))
+        if self.embeddings.scales is not None:
+            np.save(os.path.join(directory, "embedding_scales.npy"), self.embeddings.scales)
+
+    @classmethod
+    def load(cls, directory: str, mmap: bool = True) -> "DocumentIndex":
+        """Load an index saved with `save`; embeddings are memory-mapped by default"""
+        with open(os.path.join(directory, "chunks.json"), "r") as f:
+            chunks = json.load(f)
+        with open(os.path.join(directory, "meta.json"), "r") as f:
+            meta = json.load(f)
+        bm25 = BM25Statistics.load(os.path.join(directory, "bm25.npz"))
+        vectors = np.load(os.path.join(directory, "embeddings.npy"), mmap_mode="r" if mmap else None)
+        scales_path = os.path.join(directory, "embedding_scales.npy")
+        scales = np.load(scales_path) if os.path.exists(scales_path) else None
+        spans = [TextSpan(*span) for span in meta["spans"]] if meta.get("spans") else None
+        return cls(chunks, bm25, EmbeddingMatrix(vectors, scales), meta["model_name"], meta.get("device"), meta.get("doc_id"), spans)
+
+
+_index_cache: "OrderedDict[tuple, DocumentIndex]" = OrderedDict()
+_index_cache_lock = threading.Lock()
+MAX_CACHED_INDEXES = 16
+
+
+def get_document_index(text: str, model_name: Optional[str] = None, device: Optional[str] = None) -> DocumentIndex:
+    """
+    Get an index for raw text, reusing a recently built one for the same text.
+
+    Args:
+        text: Full document text
+        model_name: Embedding model; defaults to the configured model
+        device: Device for the embedding model
+
+    Returns:
+        A DocumentIndex for the text
+    """
+    manager = get_embedding_manager(model_name, device)
+    key = (content_hash(text), manager.model_name, manager.device)
+    with _index_cache_lock:
+        if key in _index_cache:
+            _index_cache.move_to_end(key)
+            return _index_cache[key]
+
+    index = DocumentIndex.build(text, model_name=manager.model_name, device=manager.device)
+    with _index_cache_lock:
+        _index_cache[key] = index
+        while len(_index_cache) > MAX_CACHED_INDEXES:
+            _index_cache.popitem(last=False)
+    return index
+
+
+_PASSAGE_SEPARATOR = "\n...\n"
+
+
+def fit_to_token_budget(
+    text: str,
+    query: str,
+    max_tokens: int,
+    tokenizer_model: Optional[str] = None,
+    model_name: Optional[str] = None,
+    device: Optional[str] = None
+) -> str:
+    """
+    Trim a document to a token budget, keeping the passages most relevant to a query.
+
+    Text that already fits is returned unchanged. Otherwise chunks are taken
+    in hybrid-search rank order while they fit and are joined back in
+    document order. The separators between passages count against the
+    budget, and the joined text is re-counted so the result always fits.
+
+    Args:
+        text: Full document text
+        query: What the passages should be relevant to (e.g. the step's task)
+        max_tokens: Token budget for the returned text
+        tokenizer_model: Model whose tokenizer counts tokens
+        model_name: Embedding model for ranking; defaults to the configured model
+        device: Device for the embedding model
+
+    Returns:
+        The text, or the selected passages separated by "\n...\n"
+    """
+    if count_tokens(text, tokenizer_model) <= max_tokens:
+        return text
+    index = get_document_index(text, model_name, device)
+    separator_tokens = count_tokens(_PASSAGE_SEPARATOR, tokenizer_model)
+    selected, used = [], 0
+    for result in index.search(query, k=len(index)):
+        n_tokens = count_tokens(result.text, tokenizer_model) + (separator_tokens if selected else 0)
+        if used + n_tokens <= max_tokens:
+            selected.append(result)
+            used += n_tokens
+    while selected:
+        # Token counts are not exactly additive; drop the lowest-ranked passage until the join fits
+        trimmed = _PASSAGE_SEPARATOR.join(result.text for result in sorted(selected, key=lambda result: result.chunk_id))
+        if count_tokens(trimmed, tokenizer_model) <= max_tokens:
+            return trimmed
+        selected.pop()
+    return ""
@@ -0,0 +1,174 @@
+from typing import Dict, Iterable, List, Optional, Tuple
+from dataclasses import dataclass, field
+import re
+from src.utils.concepts import get_concept_resolver, normalize_label
+
+# A period header row: only fiscal years, e.g. "2023    2022" or "FY2022 FY2021"
+_PERIOD_TOKEN = re.compile(r"^(?:FY)?((?:19|20)\d{2})$", re.IGNORECASE)
+_UNITS = re.compile(r"\bin\s+(thousands|millions|billions)\b", re.IGNORECASE)
+_TITLE = re.compile(r"balance sheets?|statements?\s+of|statements?$", re.IGNORECASE)
+# Cells are separated by two or more spaces
+_CELL = re.compile(r"\S+(?: \S+)*")
+_DATE = re.compile(r"\b(?:January|February|March|April|May|June|July|August|September|October|November|December)\s+\d{1,2},", re.IGNORECASE)
+_NUMBER = re.compile(r"^\$?\s*(\()?\s*\$?\s*(-?\d[\d,]*(?:\.\d+)?)\s*(\))?$")
+_BLANK = re.compile(r"^[—–-]+$")
+
+
+def _cell_value(cell: str) -> Tuple[bool, Optional[float]]:
+    """(is a value cell, value); dashes are value cells with no value"""
+    if _BLANK.match(cell):
+        return True, None
+    match = _NUMBER.match(cell)
+    if not match or bool(match.group(1)) != bool(match.group(3)):
+        return False, None
+    number = float(match.group(2).replace(",", ""))
+    return True, -number if match.group(1) else number
+
+
+@dataclass
+class StatementTable:
+    """One column-aligned statement: its period columns and {line_item: {period: value}} rows"""
+    title: Optional[str]
+    periods: List[str]
+    units: Optional[str] = None
+    rows: Dict[str, Dict[str, Optional[float]]] = field(default_factory=dict)
+
+
+@dataclass
+class StatementIndex:
+    """Every statement table in a document, with line items indexed across tables"""
+    tables: List[StatementTable] = field(default_factory=list)
+    _labels: Optional[Dict[str, Tuple[str, StatementTable]]] = field(default=None, init=False, repr=False)
+    _concepts: Optional[Dict[str, Tuple[str, StatementTable]]] = field(default=None, init=False, repr=False)
+
+    @property
+    def items(self) -> Dict[str, Dict[str, Optional[float]]]:
+        """{line_item: {period: value}}; an item in several tables keeps its first occurrence"""
+        items: Dict[str, Dict[str, Optional[float]]] = {}
+        for table in self.tables:
+            for label, values in table.rows.items():
+                items.setdefault(label, values)
+        return items
+
+    def find(self, labels: Iterable[str]) -> Optional[Tuple[str, StatementTable]]:
+        """
+        The first row matching any of the labels, tried in order.
+
+        Labels are compared after normalize_label, so "Property, plant and
+        equipment, net" matches "property plant and equipment net"; each lookup
+        is a dict hit on an index of normalized labels built on first use.
+        """
+        if self._labels is None:
+            self._labels = {}
+            for table in self.tables:
+                for label in table.rows:
+                    self._labels.setdefault(normalize_label(label), (label, table))
+        for label in labels:
+            found = self._labels.get(normalize_label(label))
+            if found is not None:
+                return found
+        return None
+
+    def find_concept(self, concept: str) -> Optional[Tuple[str, StatementTable]]:
+        """The first row whose label resolves to a canonical concept (see src.utils.concepts)"""
+        if self._concepts is None:
+            resolver = get_concept_resolver()
+            self._concepts = {}
+            for table in self.tables:
+                for label in table.rows:
+                    resolved = resolver.resolve(label)
+                    if resolved is not None:
+                        self._concepts.setdefault(resolved, (label, table))
+        return self._concepts.get(concept)
+
+    def lookup(self, labels: Iterable[str]) -> Optional[Dict[str, Optional[float]]]:
+        """{period: value} of the first row matching any of the labels"""
+        found = self.find(labels)
+        return found[1].rows[found[0]] if found else None
+
+
+def _split_row(line: str) -> Optional[Tuple[str, List[Optional[float]], int]]:
+    """(label, values, whitespace between label and first value) for a line-item row"""
+    cells = [(m.group(), m.start(), m.end()) for m in _CELL.finditer(line)]
+    if len(cells) == 1:
+        # Single-space separated rows, e.g. "Total current assets 5,308 5,853"
+        if _DATE.search(line):
+            return None
+        cells = [(m.group(), m.start(), m.end()) for m in re.finditer(r"\S+", line)]
+    values: List[Optional[float]] = []
+    idx = len(cells)
+    while idx > 0:
+        cell = cells[idx - 1][0]
+        if cell != "$":
+            is_value, value = _cell_value(cell)
+            if not is_value:
+                break
+            values.append(value)
+        idx -= 1
+    label = " ".join(cell for cell, _, _ in cells[:idx]).strip().rstrip(":")
+    if not values or not label:
+        return None
+    values.reverse()
+    return label, values, cells[idx][1] - cells[idx - 1][2]
+
+
+def parse_statements(text: str) -> StatementIndex:
+    """
+    Parse the column-aligned financial statements in a document.
+
+    A row of years starts a table (its period columns), a "(in millions)"
+    style line sets the units, and each line ending in one or more numbers
+    becomes a line item. Parenthesized numbers are negative and dashes are
+    empty cells. A row with fewer numbers than periods has a blank column:
+    a wider-than-usual gap after the label puts the blank first (the usual
+    layout for an item that is new in the latest period), otherwise last.
+    A label repeated within a table is prefixed with its "Section:" heading.
+    Values are kept as reported, in the table's units.
+    """
+    index = StatementIndex()
+    table: Optional[StatementTable] = None
+    title: Optional[str] = None
+    units: Optional[str] = None
+    section: Optional[str] = None
+    gaps: List[int] = []
+
+    for line in text.splitlines():
+        stripped = line.strip()
+        if not stripped:
+            continue
+        tokens = stripped.split()
+        periods = [_PERIOD_TOKEN.match(token) for token in tokens]
+        if all(periods):
+            table = StatementTable(title, [f"FY{match.group(1)}" for match in periods], units)
+            index.tables.append(table)
+            gaps, section = [], None
+            continue
+        units_match = _UNITS.search(stripped)
+        if units_match:
+            units = units_match.group(1).lower()
+            if table is not None and not table.rows:
+                table.units = units
+            continue
+        row = _split_row(line) if table is not None else None
+        if row is None:
+            if _TITLE.search(stripped):
+                title = stripped
+            elif stripped.endswith(":"):
+                section = stripped.rstrip(":")
+            continue
+
+        label, values, gap = row
+        n_periods = len(table.periods)
+        if len(values) > n_periods:
+            values = values[-n_periods:]
+        elif len(values) == n_periods:
+            gaps.append(gap)
+        else:
+            blanks = [None] * (n_periods - len(values))
+            typical = min(gaps) if gaps else gap
+            values = blanks + values if gap >= 2 * typical and gap > typical else values + blanks
+        if label in table.rows and section:
+            # e.g. "Regulated" under both "Revenue:" and "Cost of Sales:"
+            label = f"{section}: {label}"
+        table.rows.setdefault(label, dict(zip(table.periods, values)))
+    return index
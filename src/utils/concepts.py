@@ -0,0 +1,114 @@
+from typing import Dict, List, Optional, Sequence, Tuple
+from functools import lru_cache
+import re
+
+# Canonical financial concepts and the labels filings, extraction steps and
+# tasks use for them. Matching is on normalized tokens (see normalize_tokens).
+CONCEPT_SYNONYMS: Dict[str, List[str]] = {
+    "current_assets": ["current assets", "total current assets"],
+    "current_liabilities": ["current liabilities", "total current liabilities"],
+    "inventory": ["inventory", "inventories", "total inventory", "total inventories"],
+    "raw_materials": ["raw materials", "raw materials and supplies", "materials and supplies"],
+    "work_in_process": ["work in process", "work in progress", "wip"],
+    "finished_goods": ["finished goods", "finished products"],
+    "work_in_process_and_finished_goods": ["work in process and finished goods", "work in progress and finished goods"],
+    "quick_assets": ["quick assets"],
+    "cost_of_sales": ["cost of goods sold", "cost of sales", "cogs", "cos", "cost of revenue", "cost of revenues"],
+    "revenue": ["revenue", "revenues", "net sales", "total revenue", "total revenues", "net revenue", "net revenues", "sales"],
+    "capex": [
+        "capital expenditures", "capital expenditure", "capex", "ppe purchases",
+        "purchases of property, plant and equipment", "purchases of property and equipment",
+        "payments for property, plant and equipment"
+    ],
+    "fixed_assets": [
+        "fixed assets", "property, plant and equipment", "ppe", "net property and equipment",
+        "net property, plant and equipment"
+    ],
+    "total_assets": ["total assets"],
+    "total_liabilities": ["total liabilities"],
+    "total_equity": ["total equity", "total shareholders' equity", "total stockholders' equity"],
+    "net_income": ["net income", "profit", "net earnings", "net profit"],
+    "operating_income": ["operating income", "income from operations", "operating profit"],
+}
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+_YEAR_TOKEN = re.compile(r"^(?:fy)?(?:(?:19|20)\d{2})?$")
+# Words that qualify a label without changing the concept ("Inventories, net", "Inventory value")
+_QUALIFIERS = frozenset(["net", "value", "total", "amount", "reported"])
+
+
+def normalize_label(label: str) -> str:
+    """Lowercase a line-item label and strip punctuation and extra whitespace"""
+    label = re.sub(r"[^a-z0-9]+", " ", label.lower())
+    return " ".join(label.split())
+
+
+def normalize_tokens(label: str) -> Tuple[str, ...]:
+    """Lowercase alphanumeric tokens of a label, without fiscal-year tokens ("FY2023", "2022")"""
+    return tuple(
+        token for token in _TOKEN.findall(label.lower().replace("'", ""))
+        if not _YEAR_TOKEN.match(token)
+    )
+
+
+class ConceptResolver:
+    """
+    Maps line-item labels to canonical concepts through a hash index of
+    normalized token sequences, so resolving a label costs one normalization
+    and at most three dictionary lookups, whatever the number of synonyms.
+
+    A label resolves when its tokens (fiscal years removed) equal a synonym's,
+    or do after dropping leading/trailing qualifiers such as "total" and "net".
+
+    Usage:
+        resolver = get_concept_resolver()
+        resolver.resolve("Total Current Assets FY2023")  # -> "current_assets"
+    """
+
+    def __init__(self, synonyms: Optional[Dict[str, Sequence[str]]] = None):
+        self.synonyms: Dict[str, List[str]] = {
+            concept: list(labels) for concept, labels in (synonyms or CONCEPT_SYNONYMS).items()
+        }
+        self._index: Dict[Tuple[str, ...], str] = {}
+        for concept, labels in self.synonyms.items():
+            # The concept's own name is a synonym too ("cost_of_sales")
+            for label in [concept] + self.synonyms[concept]:
+                self._index.setdefault(normalize_tokens(label.replace("_", " ")), concept)
+        self._cache: Dict[str, Optional[str]] = {}
+
+    @property
+    def concepts(self) -> List[str]:
+        return list(self.synonyms)
+
+    def resolve(self, label: str) -> Optional[str]:
+        """Canonical concept for a label, or None"""
+        if label in self._cache:
+            return self._cache[label]
+        tokens = normalize_tokens(label)
+        concept = self._index.get(tokens)
+        if concept is None:
+            start, end = 0, len(tokens)
+            while start < end and tokens[start] in _QUALIFIERS:
+                start += 1
+            while end > start and tokens[end - 1] in _QUALIFIERS:
+                end -= 1
+            if (start, end) != (0, len(tokens)):
+                concept = self._index.get(tokens[start:end])
+        if len(self._cache) < 100000:
+            self._cache[label] = concept
+        return concept
+
+    def labels_for(self, concept: str) -> List[str]:
+        """Synonyms of a concept (empty for unknown concepts)"""
+        return list(self.synonyms.get(concept, []))
+
+
+@lru_cache(maxsize=1)
+def get_concept_resolver() -> ConceptResolver:
+    """Shared resolver over CONCEPT_SYNONYMS"""
+    return ConceptResolver()
+
+
+def resolve_concept(label: str) -> Optional[str]:
+    """Canonical concept for a label using the shared resolver"""
+    return get_concept_resolver().resolve(label)
@@ -3,6 +3,7 @@ from typing import Dict, Any, List, Tuple, Optional
 import re
 from dataclasses import dataclass
 from enum import Enum
+from src.utils.concepts import get_concept_resolver
 
 class ValidationStatus(Enum):
     VALID = "valid"
@@ -62,20 +63,9 @@ class FinancialDataValidator:
              lambda d: self._get_value(d, "total_assets") > self._get_value(d, "total_liabilities")),
         ]
         
-        # Common synonyms for financial terms
-        self.term_synonyms = {
-            "current assets": ["current assets", "total current assets"],
-            "current liabilities": ["current liabilities", "total current liabilities"],
-            "inventory": ["inventory", "inventories", "total inventory", "total inventories"],
-            "raw materials": ["raw materials", "raw materials and supplies", "materials and supplies"],
-            "work in process": ["work in process", "work in progress", "wip"],
-            "finished goods": ["finished goods", "finished products"],
-            "cost of goods sold": ["cost of goods sold", "cost of sales", "cogs", "cos"],
-            "revenue": ["revenue", "net sales", "total revenue", "net revenue"],
-            "capital expenditures": ["capital expenditures", "purchases of property, plant and equipment", "capex", "ppe purchases"],
-            "fixed assets": ["fixed assets", "property, plant and equipment", "ppe", "net property and equipment"],
-            "net income": ["net income", "profit", "net earnings", "net profit"],
-        }
+        # Common synonyms for financial terms, by canonical concept (shared with extraction and the formula engine)
+        self.concept_resolver = get_concept_resolver()
+        self.term_synonyms = self.concept_resolver.synonyms
     
     def load_ground_truth(self, file_path: str) -> None:
         """
@@ -141,17 +131,22 @@ class FinancialDataValidator:
     
     def _get_value(self, data: Dict[str, Any], key_pattern: str) -> Optional[float]:
         """
-        Find a value in the data dict by matching the key pattern.
+        Find a value in the data dict whose key resolves to the same concept as the key pattern.
         
         Args:
             data: Dictionary of financial data
-            key_pattern: Pattern to match in the keys
+            key_pattern: Concept name (e.g. "current_assets") or label to match
             
         Returns:
             Matched value or None if not found
         """
+        concept = self.concept_resolver.resolve(key_pattern)
         for key, value in data.items():
-            if key_pattern.lower() in key.lower() and isinstance(value, (int, float)):
+            if not isinstance(value, (int, float)):
+                continue
+            if concept is not None and self.concept_resolver.resolve(key) == concept:
+                return value
+            if concept is None and key_pattern.lower() in key.lower():
                 return value
         return None
     
@@ -176,11 +171,9 @@ class FinancialDataValidator:
                 continue
                 
             # Find applicable validation range
-            range_key = None
-            for check_key in self.expected_ranges:
-                if check_key in key.lower():
-                    range_key = check_key
-                    break
+            range_key = self.concept_resolver.resolve(key)
+            if range_key not in self.expected_ranges:
+                range_key = None
             
             if range_key:
                 min_val, max_val = self.expected_ranges[range_key]
@@ -0,0 +1,124 @@
+from typing import List, Optional
+import re
+
+_WHITESPACE = " \t\r\n"
+# Characters that can follow the closing quote of a JSON string
+_AFTER_STRING = ",:}]"
+_LITERALS = {"True": "true", "False": "false", "None": "null"}
+_CONTROL_ESCAPES = {"\n": "\\n", "\r": "\\r", "\t": "\\t", "\b": "\\b", "\f": "\\f"}
+_FENCE = re.compile(r"```(?:json)?\s*(.*?)```", re.DOTALL)
+
+
+def fenced_blocks(text: str) -> List[str]:
+    """Contents of the ``` / ```json blocks in a response, in order"""
+    return [match.group(1).strip() for match in _FENCE.finditer(text)]
+
+
+def outermost_object(text: str) -> Optional[str]:
+    """Text from the first "{" to the last "}" (or to the end, for a truncated object)"""
+    start = text.find("{")
+    if start == -1:
+        return None
+    end = text.rfind("}")
+    return text[start:end + 1] if end > start else text[start:]
+
+
+def _next_significant(text: str, pos: int) -> str:
+    while pos < len(text) and text[pos] in _WHITESPACE:
+        pos += 1
+    return text[pos] if pos < len(text) else ""
+
+
+def repair_json(text: str) -> str:
+    """
+    Make near-JSON model output parseable, in one pass over the text.
+
+    Outside strings: // and /* */ comments are dropped, trailing commas
+    before "}" or "]" are removed, Python literals (True/False/None) become
+    JSON ones, and brackets left open by a truncated response are closed.
+    Inside strings: single-quoted strings become double-quoted, raw control
+    characters are escaped, and a quote that is not followed by one of
+    , : } ] (or the end) is taken as part of the text and escaped.
+    Valid JSON comes back unchanged apart from whitespace before closing brackets.
+    """
+    out: List[str] = []
+    stack: List[str] = []
+    quote: Optional[str] = None
+    escape = False
+    i, n = 0, len(text)
+
+    while i < n:
+        char = text[i]
+        if quote is not None:
+            if escape:
+                out.append(char)
+                escape = False
+            elif char == "\\":
+                out.append(char)
+                escape = True
+            elif char == quote:
+                if _next_significant(text, i + 1) in _AFTER_STRING:
+                    out.append('"')
+                    quote = None
+                else:
+                    out.append('\\"' if char == '"' else char)
+            elif char == '"':
+                # A double quote inside a single-quoted string
+                out.append('\\"')
+            elif char in _CONTROL_ESCAPES:
+                out.append(_CONTROL_ESCAPES[char])
+            elif char < " ":
+                out.append(f"\\u{ord(char):04x}")
+            else:
+                out.append(char)
+            i += 1
+            continue
+
+        if char in "\"'":
+            quote = char
+            out.append('"')
+        elif char == "/" and text.startswith("//", i):
+            newline = text.find("\n", i)
+            i = n if newline == -1 else newline
+            continue
+        elif char == "/" and text.startswith("/*", i):
+            close = text.find("*/", i + 2)
+            i = n if close == -1 else close + 2
+            continue
+        elif char in "{[":
+            stack.append("}" if char == "{" else "]")
+            out.append(char)
+        elif char in "}]":
+            # Each character is popped at most once, so this stays linear
+            while out and out[-1] in _WHITESPACE:
+                out.pop()
+            if out and out[-1] == ",":
+                out.pop()
+            if stack and stack[-1] == char:
+                stack.pop()
+            out.append(char)
+        elif char.isalpha():
+            end = i
+            while end < n and (text[end].isalnum() or text[end] == "_"):
+                end += 1
+            word = text[i:end]
+            out.append(_LITERALS.get(word, word))
+            i = end
+            continue
+        else:
+            out.append(char)
+        i += 1
+
+    # Close whatever a truncated response left open
+    if quote is not None:
+        if escape:
+            out.pop()
+        out.append('"')
+    while out and out[-1] in _WHITESPACE:
+        out.pop()
+    if out and out[-1] == ",":
+        out.pop()
+    elif out and out[-1] == ":":
+        out.append("null")
+    out.extend(reversed(stack))
+    return "".join(out)
@@ -0,0 +1,130 @@
+from typing import Any, Dict, Iterable, List, Optional
+import json
+
+_WHITESPACE = " \t\r\n"
+
+
+class IncrementalJSONParser:
+    """
+    Parses the top-level fields of a JSON object as its text streams in.
+
+    Text before the first "{" (prose, a ```json fence) is skipped. Each call
+    to `feed` scans only the new characters and returns the keys whose values
+    completed in that chunk; parsed values accumulate in `fields`. A value
+    that is not valid JSON on its own (comments, trailing commas) is skipped,
+    so callers should fall back to parsing the full text when a field they
+    need never appears.
+    """
+
+    def __init__(self):
+        self.fields: Dict[str, Any] = {}
+        self.complete = False
+        # Unconsumed tail of the stream; text no open key or value needs is dropped
+        self._text = ""
+        self._pos = 0
+        self._started = False
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        # What the top-level object expects next: key, key_string, colon, value, in_value or after_value
+        self._expect = "key"
+        self._key: Optional[str] = None
+        self._key_start = 0
+        self._value_start = 0
+        self._value_kind: Optional[str] = None
+
+    def has_fields(self, keys: Iterable[str]) -> bool:
+        return all(key in self.fields for key in keys)
+
+    def feed(self, chunk: str) -> List[str]:
+        """Consume a chunk of text; return the keys completed by it"""
+        if self.complete or not chunk:
+            return []
+        self._text += chunk
+        completed: List[str] = []
+        text = self._text
+        for i in range(self._pos, len(text)):
+            if self.complete:
+                break
+            self._step(text, i, text[i], completed)
+        keep = len(text)
+        if self._expect == "key_string":
+            keep = self._key_start
+        elif self._expect == "in_value":
+            keep = self._value_start
+        self._text = text[keep:]
+        self._key_start -= keep
+        self._value_start -= keep
+        self._pos = len(self._text)
+        return completed
+
+    def _emit(self, raw: str, completed: List[str]) -> None:
+        try:
+            value = json.loads(raw)
+        except json.JSONDecodeError:
+            return
+        if self._key is not None:
+            self.fields[self._key] = value
+            completed.append(self._key)
+
+    def _step(self, text: str, i: int, c: str, completed: List[str]) -> None:
+        if not self._started:
+            if c == "{":
+                self._started = True
+                self._depth = 1
+            return
+
+        if self._in_string:
+            if self._escape:
+                self._escape = False
+            elif c == "\\":
+                self._escape = True
+            elif c == '"':
+                self._in_string = False
+                if self._depth == 1 and self._expect == "key_string":
+                    try:
+                        self._key = json.loads(text[self._key_start:i + 1])
+                    except json.JSONDecodeError:
+                        self._key = None
+                    self._expect = "colon"
+                elif self._depth == 1 and self._expect == "in_value" and self._value_kind == "string":
+                    self._emit(text[self._value_start:i + 1], completed)
+                    self._expect = "after_value"
+            return
+
+        top_level = self._depth == 1
+        if top_level and self._expect == "in_value" and self._value_kind == "scalar" and (c in _WHITESPACE or c in ",}"):
+            self._emit(text[self._value_start:i], completed)
+            self._expect = "after_value"
+
+        if c == '"':
+            self._in_string = True
+            if top_level and self._expect == "key":
+                self._key_start = i
+                self._expect = "key_string"
+            elif top_level and self._expect == "value":
+                self._value_start = i
+                self._value_kind = "string"
+                self._expect = "in_value"
+        elif c in "{[":
+            if top_level and self._expect == "value":
+                self._value_start = i
+                self._value_kind = "container"
+                self._expect = "in_value"
+            self._depth += 1
+        elif c in "}]":
+            self._depth -= 1
+            if self._depth == 1 and self._expect == "in_value" and self._value_kind == "container":
+                self._emit(text[self._value_start:i + 1], completed)
+                self._expect = "after_value"
+            elif self._depth == 0:
+                self.complete = True
+        elif top_level:
+            if c == ":" and self._expect == "colon":
+                self._expect = "value"
+            elif c == ",":
+                self._expect = "key"
+            elif c not in _WHITESPACE and self._expect == "value":
+                self._value_start = i
+                self._value_kind = "scalar"
+                self._expect = "in_value"
@@ -0,0 +1,98 @@
+from typing import Dict, Iterator, List, Optional, Tuple
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, asdict
+from functools import lru_cache
+import math
+
+# Per-message framing tokens added by chat formats (role markers, separators)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+@lru_cache(maxsize=16)
+def _encoding(model_name: Optional[str]):
+    """tiktoken encoding for a model, or None when tiktoken is not installed"""
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model_name or "")
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
+
+def count_tokens(text: str, model_name: Optional[str] = None) -> int:
+    """
+    Token count of a string.
+
+    Exact when tiktoken is installed (using the model's encoding, or
+    cl100k_base for models it does not know, e.g. Claude), otherwise the
+    usual ~4 characters per token estimate.
+    """
+    if not text:
+        return 0
+    encoding = _encoding(model_name)
+    if encoding is None:
+        return math.ceil(len(text) / 4)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def count_message_tokens(messages: List[Dict[str, str]], model_name: Optional[str] = None) -> int:
+    """Token count of a chat request's messages, including per-message framing"""
+    return sum(count_tokens(str(m.get("content", "")), model_name) + MESSAGE_OVERHEAD_TOKENS for m in messages)
+
+
+@dataclass
+class TokenUsage:
+    """Input/output token totals; `estimated` is set once any part came from a local estimate"""
+    input_tokens: int = 0
+    output_tokens: int = 0
+    calls: int = 0
+    estimated: bool = False
+
+    @property
+    def total_tokens(self) -> int:
+        return self.input_tokens + self.output_tokens
+
+    def add(self, input_tokens: int, output_tokens: int, estimated: bool = False) -> None:
+        self.input_tokens += input_tokens
+        self.output_tokens += output_tokens
+        self.calls += 1
+        self.estimated = self.estimated or estimated
+
+    def merge(self, other: "TokenUsage") -> None:
+        self.input_tokens += other.input_tokens
+        self.output_tokens += other.output_tokens
+        self.calls += other.calls
+        self.estimated = self.estimated or other.estimated
+
+    def to_dict(self) -> Dict[str, int]:
+        data = asdict(self)
+        data["total_tokens"] = self.total_tokens
+        return data
+
+
+# Active usage scopes for the current task; asyncio tasks inherit the scopes of their creator
+_scopes: ContextVar[Tuple[TokenUsage, ...]] = ContextVar("token_usage_scopes", default=())
+
+
+@contextmanager
+def usage_scope() -> Iterator[TokenUsage]:
+    """
+    Collect the token usage of every model call made inside the block.
+
+    Scopes nest: a call is counted in each enclosing scope.
+    """
+    usage = TokenUsage()
+    token = _scopes.set(_scopes.get() + (usage,))
+    try:
+        yield usage
+    finally:
+        _scopes.reset(token)
+
+
+def record_usage(input_tokens: int, output_tokens: int, estimated: bool = False) -> None:
+    """Add one model call's usage to all active scopes"""
+    for usage in _scopes.get():
+        usage.add(input_tokens, output_tokens, estimated)
@@ -0,0 +1,26 @@
+import weakref
+import pytest
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+from src.clients import rate_limit, resilience
+
+
+@pytest.fixture(autouse=True)
+def isolated_rate_limits(monkeypatch):
+    """Fresh rate-limit configs, limiters and circuit breakers for every test"""
+    monkeypatch.setattr(rate_limit, "_configs", {})
+    monkeypatch.setattr(rate_limit, "_limiters", weakref.WeakKeyDictionary())
+    monkeypatch.setattr(resilience, "_breakers", {})
+
+
+@pytest.fixture
+def openai_sdk():
+    """Factory for a fake async OpenAI SDK whose chat completions return `text`"""
+    def make(text="ok"):
+        sdk = MagicMock()
+        sdk.chat.completions.create = AsyncMock(return_value=SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=text))]
+        ))
+        return sdk
+
+    return make
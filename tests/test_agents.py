@@ -1,5 +1,6 @@
 import pytest  
 import asyncio  
+import json  
 from unittest.mock import AsyncMock, MagicMock  
 from src.agent import Agent  
 from src.models import JobOutput  
@@ -44,4 +45,176 @@ class TestAgent:
         assert output.citation == "Test citation"  
         assert output.answer == "Test answer"  
           
-        mock_model.generate.assert_called_once()  
\ No newline at end of file
+        mock_model.generate.assert_called_once()  
+
+class StreamingModel:
+    """Fake model that streams a response in small deltas and records how much was read"""
+    def __init__(self, response: str, size: int = 8):
+        self.deltas = [response[i:i + size] for i in range(0, len(response), size)]
+        self.sent = 0
+        self.closed = False
+
+    async def generate_stream(self, messages):
+        try:
+            for delta in self.deltas:
+                self.sent += 1
+                yield delta
+        finally:
+            self.closed = True
+
+
+STREAMED_RESPONSE = """```json
+{"explanation": "Quick ratio formula", "citation": "Textbook", "answer": "(CA - Inventory) / CL"}
+```
+Additional commentary the agents never use. """ * 3
+
+
+class TestStreamingAgent:
+    @pytest.mark.asyncio
+    async def test_stream_stops_once_required_fields_are_parsed(self):
+        model = StreamingModel(STREAMED_RESPONSE)
+        agent = FinancialConceptSelectorAgent(model, "financial_concept_selector")
+        fields = []
+
+        output = await agent.execute("Identify financial concept", "ctx", stream=True, on_field=lambda key, value: fields.append(key))
+
+        assert output.answer == "(CA - Inventory) / CL"
+        assert output.citation == "Textbook"
+        assert fields == ["explanation", "citation", "answer"]
+        assert model.closed
+        assert model.sent < len(model.deltas)
+
+    @pytest.mark.asyncio
+    async def test_stream_keeps_a_citation_sent_after_the_answer(self):
+        model = StreamingModel('{"explanation": "x", "answer": "0.69", "citation": "Balance sheet"}\nMore commentary. ' * 3)
+        agent = CalculatorAgent(model, "calculator")
+
+        output = await agent.execute("Calculate", "ctx", stream=True)
+
+        assert output.answer == "0.69"
+        assert output.citation == "Balance sheet"
+        assert model.sent < len(model.deltas)
+
+    @pytest.mark.asyncio
+    async def test_stream_falls_back_to_full_parse(self):
+        model = StreamingModel('{"explanation": "x", "answer": {"a": 1,},}')
+        agent = CalculatorAgent(model, "calculator")
+
+        output = await agent.execute("Calculate", "ctx", stream=True)
+
+        assert output.explanation == "x"
+        assert model.sent == len(model.deltas)
+
+    @pytest.mark.asyncio
+    async def test_orchestrator_reports_answers_as_they_complete(self):
+        from src.financial_orchestrator import FinancialOrchestrator
+        model = StreamingModel(STREAMED_RESPONSE)
+        supervisor = MagicMock()
+        supervisor.generate = AsyncMock(return_value="final")
+        answers = []
+        orchestrator = FinancialOrchestrator(
+            supervisor_model=supervisor,
+            agents={"calculator": CalculatorAgent(model, "calculator")},
+            tool_registry=None,
+            stream=True,
+            on_answer=lambda key, answer: answers.append((key, answer))
+        )
+
+        result = await orchestrator.run_financial_analysis("task", "ctx", [{"agent": "calculator", "task": "t", "output_key": "calculations"}])
+
+        assert answers == [("calculations", "(CA - Inventory) / CL")]
+        assert result["final_answer"] == "final"
+
+
+class TestTokenAccounting:
+    @pytest.mark.asyncio
+    async def test_usage_is_reported_per_step_and_per_workflow(self, monkeypatch):
+        from src import financial_orchestrator
+        from src.financial_orchestrator import FinancialOrchestrator
+        from src.utils.tokens import record_usage
+
+        async def generate(messages):
+            record_usage(100, 10)
+            return '{"explanation": "e", "answer": "a"}'
+
+        model = MagicMock()
+        model.model_name = "gpt-4o"
+        model.generate = AsyncMock(side_effect=generate)
+        trimmed = []
+        monkeypatch.setattr(financial_orchestrator, "fit_to_token_budget", lambda text, query, budget, model_name: trimmed.append(budget) or text[:budget])
+        orchestrator = FinancialOrchestrator(
+            supervisor_model=model,
+            agents={"calculator": CalculatorAgent(model, "calculator")},
+            tool_registry=None,
+            context_budget=50
+        )
+        workflow = [{"agent": "calculator", "task": "one"}, {"agent": "calculator", "task": "two"}]
+
+        result = await orchestrator.run_financial_analysis("task", "x" * 1000, workflow)
+
+        assert [step["usage"]["input_tokens"] for step in result["steps"]] == [100, 100]
+        assert result["usage"]["input_tokens"] == 300  # two steps plus the synthesis
+        assert result["usage"]["total_tokens"] == 330
+        assert trimmed == [50, 50]
+        assert "x" * 51 not in model.generate.call_args_list[0].args[0][1]["content"]
+
+
+class TestWorkflowDependencies:
+    def test_dependencies_are_inferred_from_placeholders(self):
+        from src.examples.workflows import AMCOR_QUICK_RATIO_WORKFLOW
+        from src.financial_orchestrator import workflow_dependencies
+
+        assert workflow_dependencies(AMCOR_QUICK_RATIO_WORKFLOW) == [set(), set(), {0}, {2}, {3}]
+        assert workflow_dependencies([
+            {"agent": "a", "task": "x", "update_context": True},
+            {"agent": "b", "task": "y", "output_key": "y"},
+            {"agent": "c", "task": "z", "depends_on": ["y"]}
+        ]) == [set(), {0}, {0, 1}]
+
+    def test_steps_writing_the_same_key_are_ordered(self):
+        from src.financial_orchestrator import workflow_dependencies
+
+        # The calculator steps all write "calculator"; step 1 reads the first value
+        assert workflow_dependencies([
+            {"agent": "calculator", "task": "first"},
+            {"agent": "explainer", "task": "explain {calculator}"},
+            {"agent": "calculator", "task": "second"},
+            {"agent": "calculator", "task": "third"}
+        ]) == [set(), {0}, {0, 1}, {2}]
+
+    @pytest.mark.asyncio
+    async def test_independent_steps_run_concurrently(self):
+        from src.financial_orchestrator import FinancialOrchestrator
+        running, peak = 0, 0
+
+        async def generate(messages):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.05)
+            running -= 1
+            task = messages[-1]["content"].split("\n")[0]
+            return json.dumps({"explanation": "e", "answer": f"<{task}>"})
+
+        model = MagicMock()
+        model.generate = AsyncMock(side_effect=generate)
+        agents = {name: CalculatorAgent(model, name) for name in ("a", "b", "c")}
+        workflow = [
+            {"agent": "a", "task": "first", "output_key": "first"},
+            {"agent": "b", "task": "second", "output_key": "second"},
+            {"agent": "c", "task": "join {first} {second}", "output_key": "joined"}
+        ]
+
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        result = await FinancialOrchestrator(model, agents, None, max_concurrency=4).run_financial_analysis("t", "ctx", workflow)
+        parallel_time = loop.time() - start
+
+        assert peak == 2
+        assert [step["agent"] for step in result["steps"]] == ["a", "b", "c"]
+        assert result["steps"][2]["task"] == "join <Task: first> <Task: second>"
+        assert parallel_time < 0.2  # three rounds (two stages plus synthesis) instead of four
+
+        peak = 0
+        await FinancialOrchestrator(model, agents, None, max_concurrency=1).run_financial_analysis("t", "ctx", workflow)
+        assert peak == 1
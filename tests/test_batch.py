@@ -0,0 +1,181 @@
+import asyncio
+import json
+import pytest
+import openai
+from unittest.mock import AsyncMock, MagicMock
+from src.agents.calculator import CalculatorAgent
+from src.agents.financial_concept_selector import FinancialConceptSelectorAgent
+from src.clients.batch import BatchRequest, OpenAIBatchBackend
+from src.clients.local_batch_server import LocalBatchServer
+from src.clients.openai import OpenAIClient
+from src.financial_orchestrator import FinancialOrchestrator
+
+
+def responder(body):
+    """Answer every agent prompt with JSON echoing the task line"""
+    user = body["messages"][-1]["content"]
+    if user.startswith("Task:"):
+        task = user.split("\n")[0][len("Task: "):]
+        return json.dumps({"explanation": "ok", "citation": None, "answer": f"done({task})"})
+    return "synthesized"
+
+
+@pytest.fixture
+def batch_server():
+    with LocalBatchServer(responder, polls_until_done=2) as server:
+        yield server
+
+
+def backend_for(server, **kwargs):
+    sdk = openai.AsyncOpenAI(api_key="test", base_url=server.base_url, max_retries=0)
+    return OpenAIBatchBackend(OpenAIClient(client=sdk), poll_interval=0.01, **kwargs)
+
+
+class TestOpenAIBatchBackend:
+    @pytest.mark.asyncio
+    async def test_round_trip_through_batch_api(self, batch_server):
+        backend = backend_for(batch_server)
+        requests = [BatchRequest(f"r{i}", [{"role": "user", "content": f"Task: q{i}"}]) for i in range(3)]
+
+        results = await backend.run(requests)
+
+        assert set(results) == {"r0", "r1", "r2"}
+        assert json.loads(results["r1"])["answer"] == "done(q1)"
+        assert len(batch_server.batches) == 1
+
+    @pytest.mark.asyncio
+    async def test_requests_are_split_across_jobs_and_files_deleted(self, batch_server):
+        requests = [BatchRequest(f"r{i}", [{"role": "user", "content": f"Task: q{i}"}]) for i in range(5)]
+        line_size = len(backend_for(batch_server)._line(requests[0]))
+
+        results = await backend_for(batch_server, max_requests_per_job=2).run(requests)
+        assert set(results) == {f"r{i}" for i in range(5)}
+        assert len(batch_server.batches) == 3
+
+        await backend_for(batch_server, max_bytes_per_job=2 * line_size).run(requests)
+        assert len(batch_server.batches) == 6
+        # Input and output files of every job are gone
+        assert batch_server.files == {}
+
+    @pytest.mark.asyncio
+    async def test_failed_requests_are_left_out(self):
+        def flaky(body):
+            if "bad" in body["messages"][-1]["content"]:
+                raise RuntimeError("model error")
+            return "fine"
+
+        with LocalBatchServer(flaky) as server:
+            results = await backend_for(server).run([
+                BatchRequest("good", [{"role": "user", "content": "good"}]),
+                BatchRequest("bad", [{"role": "user", "content": "bad"}])
+            ])
+        assert results == {"good": "fine"}
+
+
+class TestBatchOrchestration:
+    @pytest.mark.asyncio
+    async def test_workflows_advance_stage_by_stage(self, batch_server):
+        interactive = MagicMock()
+        interactive.generate = AsyncMock(side_effect=AssertionError("should not be called"))
+        orchestrator = FinancialOrchestrator(
+            supervisor_model=interactive,
+            agents={
+                "financial_concept_selector": FinancialConceptSelectorAgent(interactive, "financial_concept_selector"),
+                "calculator": CalculatorAgent(interactive, "calculator")
+            },
+            tool_registry=None
+        )
+        workflow = [
+            {"agent": "financial_concept_selector", "task": "pick formula", "output_key": "concept"},
+            {"agent": "calculator", "task": "apply {concept}", "output_key": "calculations"}
+        ]
+        analyses = [{"task": f"question {i}", "context": f"filing {i}", "workflow": workflow} for i in range(4)]
+
+        results = await orchestrator.run_batch_analysis(analyses, backend_for(batch_server))
+
+        assert [r["task"] for r in results] == [f"question {i}" for i in range(4)]
+        assert results[0]["steps"][1]["task"] == "apply done(pick formula)"
+        assert results[0]["steps"][1]["output"].answer == "done(apply done(pick formula))"
+        assert all(r["final_answer"] == "synthesized" for r in results)
+        # Two workflow stages plus the synthesis, each as a single batch job
+        assert len(batch_server.batches) == 3
+        assert batch_server.submitted == 12
+
+    @pytest.mark.asyncio
+    async def test_unanswered_requests_fall_back_to_interactive_calls(self):
+        model = MagicMock()
+        model.generate = AsyncMock(return_value='{"explanation": "live", "answer": "live answer"}')
+        orchestrator = FinancialOrchestrator(
+            supervisor_model=model,
+            agents={"calculator": CalculatorAgent(model, "calculator")},
+            tool_registry=None
+        )
+        backend = MagicMock()
+        backend.run = AsyncMock(return_value={})
+
+        results = await orchestrator.run_batch_analysis(
+            [{"task": "t", "context": "c", "workflow": [{"agent": "calculator", "task": "calc"}]}], backend
+        )
+
+        assert results[0]["steps"][0]["output"].answer == "live answer"
+        assert model.generate.await_count == 2
+
+    @pytest.mark.asyncio
+    async def test_agent_steps_request_the_output_schema(self):
+        concept = {"concept": "Quick Ratio", "formula": "(CA - Inventory) / CL", "required_data": ["CA", "CL"]}
+        formats = []
+
+        def structured(body):
+            formats.append(body.get("response_format"))
+            if body.get("response_format"):
+                return json.dumps({"explanation": "ok", "citation": None, "answer": concept})
+            return "synthesized"
+
+        interactive = MagicMock()
+        interactive.generate = AsyncMock(side_effect=AssertionError("should not be called"))
+        agent = FinancialConceptSelectorAgent(interactive, "financial_concept_selector")
+        orchestrator = FinancialOrchestrator(
+            supervisor_model=interactive, agents={"financial_concept_selector": agent}, tool_registry=None
+        )
+
+        with LocalBatchServer(structured) as server:
+            results = await orchestrator.run_batch_analysis(
+                [{"task": "t", "context": "c", "workflow": [{"agent": "financial_concept_selector", "task": "pick"}]}],
+                backend_for(server)
+            )
+
+        assert formats[0]["json_schema"]["name"] == "FinancialConceptSelectorAgentOutput"
+        assert formats[1] is None
+        assert json.loads(results[0]["steps"][0]["output"].answer) == concept
+        assert agent.parse_tiers == {"structured": 1}
+
+    @pytest.mark.asyncio
+    async def test_fallback_calls_respect_max_concurrency(self):
+        in_flight, peak = 0, 0
+
+        async def generate(messages, **kwargs):
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+            return '{"explanation": "live", "answer": "live answer"}'
+
+        model = MagicMock()
+        model.generate = generate
+        orchestrator = FinancialOrchestrator(
+            supervisor_model=model,
+            agents={"calculator": CalculatorAgent(model, "calculator")},
+            tool_registry=None,
+            max_concurrency=2
+        )
+        backend = MagicMock()
+        backend.run = AsyncMock(return_value={})
+
+        results = await orchestrator.run_batch_analysis(
+            [{"task": f"t{i}", "context": "c", "workflow": [{"agent": "calculator", "task": "calc"}]} for i in range(6)],
+            backend
+        )
+
+        assert all(r["steps"][0]["output"].answer == "live answer" for r in results)
+        assert peak == 2
@@ -0,0 +1,60 @@
+import asyncio
+import io
+import json
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+from src.batch_runner import BatchRunner, create_orchestrator, load_requests, request_context, request_workflow
+
+
+def write_requests(path, records):
+    path.write_text("\n".join(json.dumps(r) for r in records) + "\n")
+    return str(path)
+
+
+class TestRequests:
+    def test_load_and_resolve_requests(self, tmp_path):
+        (tmp_path / "filing.txt").write_text("Total assets 17,003")
+        path = write_requests(tmp_path / "requests.jsonl", [
+            {"financebench_id": "fb-1", "question": "What is ROA {approx}?", "evidence": [{"evidence_text": "a"}, {"evidence_text": "b"}]},
+            {"question": "Quick ratio?", "context_file": "filing.txt", "workflow": "AMCOR_QUICK_RATIO_WORKFLOW"}
+        ])
+
+        first, second = load_requests(path)
+
+        assert first["id"] == "fb-1" and second["id"] == 2
+        assert request_context(first) == "a\n\nb"
+        assert request_context(second, str(tmp_path)) == "Total assets 17,003"
+        assert "answer: What is ROA {{approx}}?" in request_workflow(first)[0]["task"]
+        assert request_workflow(second)[0]["agent"] == "data_retriever"
+
+
+class TestBatchRunner:
+    @pytest.mark.asyncio
+    async def test_runs_concurrently_and_streams_results(self, tmp_path, capsys):
+        in_flight, peak = 0, 0
+
+        async def generate(messages):
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+            return '{"explanation": "e", "answer": "a"}'
+
+        model = MagicMock()
+        model.generate = AsyncMock(side_effect=generate)
+        records = [{"id": i, "question": f"q{i}", "context": "filing"} for i in range(40)]
+        records.append({"id": "broken", "question": "no context"})
+        output = io.StringIO()
+
+        runner = BatchRunner(create_orchestrator(model, max_concurrency=1), output, concurrency=8, progress_interval=0.01)
+        progress = await runner.run(iter(records), total=len(records))
+
+        lines = [json.loads(line) for line in output.getvalue().splitlines()]
+        assert (progress.done, progress.failed) == (40, 1)
+        assert len(lines) == 41
+        assert sorted(line["id"] for line in lines if "error" not in line) == list(range(40))
+        assert lines[0]["final_answer"] == '{"explanation": "e", "answer": "a"}'
+        assert next(line for line in lines if line["id"] == "broken")["error"].startswith("ValueError")
+        assert 1 < peak <= 8
+        assert "[done] 41/41, 1 failed" in capsys.readouterr().err
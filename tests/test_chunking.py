@@ -0,0 +1,41 @@
+import pytest
+from src.tools.chunking import TextSpan, chunk_spans, chunk_text
+from src.examples.amcor_quick_ratio import AMCOR_DATA
+
+
+class TestChunking:
+    def test_plain_text_overlaps(self):
+        text = "A" * 2000
+        chunks = chunk_text(text, chunk_size=1000, overlap=100)
+
+        assert len(chunks) > 1
+        assert len(chunks[0]) <= 1000
+        assert chunks[0][-100:] == chunks[1][:100]
+
+    def test_spans_cover_text_and_match_chunks(self):
+        text = "Revenue grew. Costs fell. " * 200
+        spans = chunk_spans(text, chunk_size=300, overlap=50)
+
+        assert spans[0].start == 0 and spans[-1].end == len(text)
+        assert all(isinstance(span, TextSpan) and span.end - span.start <= 300 for span in spans)
+        assert [span.slice(text) for span in spans] == chunk_text(text, chunk_size=300, overlap=50)
+        assert all(text[span.end - 1] in ". " for span in spans[:-1])
+
+    def test_statement_rows_are_never_split(self):
+        spans = chunk_spans(AMCOR_DATA, chunk_size=300, overlap=60)
+        line_starts = {0} | {i + 1 for i, c in enumerate(AMCOR_DATA) if c == "\n"}
+
+        for span in spans:
+            assert span.start in line_starts
+            assert span.end in line_starts or span.end == len(AMCOR_DATA)
+
+    @pytest.mark.parametrize(
+        "text",
+        ["x" * 200000, "no periods here " * 12500, "1,234\n" * 30000],
+        ids=["no-breaks", "no-periods", "short-rows"]
+    )
+    def test_forward_progress_is_linear(self, text):
+        spans = chunk_spans(text, chunk_size=1000, overlap=900)
+
+        assert all(b.start > a.start for a, b in zip(spans, spans[1:]))
+        assert len(spans) <= len(text) // ((1000 - 900) // 2) + 1
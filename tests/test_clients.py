@@ -0,0 +1,507 @@
+import asyncio
+import time
+import pytest
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+import openai
+import httpx
+from src.clients import rate_limit
+from src.clients.anthropic import AnthropicClient
+from src.clients.http import HTTPPoolConfig, close_shared_http_clients, get_shared_http_client
+from src.clients.openai import OpenAIClient
+from src.clients import resilience
+from src.clients.cache import CachedClient, ResponseCache, request_key
+from src.clients.singleflight import SingleFlightClient
+from src.clients.errors import (
+    CircuitOpenError, DeadlineExceeded, PermanentError, RateLimitError, ReplayMissError, TransientError
+)
+from src.clients.resilience import CircuitBreaker, ResilientClient, RetryPolicy
+from src.agents.calculator import CalculatorAgent
+from src.financial_orchestrator import FinancialOrchestrator
+from src.clients.rate_limit import RateLimitConfig, TokenBucket, configure_rate_limit
+
+
+def anthropic_sdk(text="ok"):
+    sdk = MagicMock()
+    sdk.messages.create = AsyncMock(return_value=SimpleNamespace(content=[SimpleNamespace(text=text)]))
+    return sdk
+
+
+class TestAsyncClients:
+    @pytest.mark.asyncio
+    async def test_openai_awaits_async_sdk(self, openai_sdk):
+        sdk = openai_sdk("hello")
+        client = OpenAIClient(client=sdk)
+
+        assert await client.generate([{"role": "user", "content": "hi"}]) == "hello"
+        sdk.chat.completions.create.assert_awaited_once()
+
+    @pytest.mark.asyncio
+    async def test_anthropic_passes_system_prompt_separately(self):
+        sdk = anthropic_sdk("hello")
+        client = AnthropicClient(client=sdk)
+
+        await client.generate([
+            {"role": "system", "content": "Be precise."},
+            {"role": "user", "content": "hi"}
+        ])
+        kwargs = sdk.messages.create.call_args.kwargs
+        assert kwargs["system"] == "Be precise."
+        assert kwargs["messages"] == [{"role": "user", "content": "hi"}]
+
+    @pytest.mark.asyncio
+    async def test_http_pool_is_shared_per_provider_and_config(self):
+        config = HTTPPoolConfig(max_connections=8)
+        factory = MagicMock(side_effect=lambda **kwargs: SimpleNamespace(is_closed=False, aclose=AsyncMock(), **kwargs))
+
+        first = get_shared_http_client("test-provider", config, factory)
+        second = get_shared_http_client("test-provider", config, factory)
+
+        assert first is second
+        assert factory.call_count == 1
+        assert first.limits.max_connections == 8
+        await close_shared_http_clients()
+        first.aclose.assert_awaited_once()
+        assert get_shared_http_client("test-provider", config, factory) is not first
+        await close_shared_http_clients()
+
+    def test_http_pools_and_sdk_clients_are_per_event_loop(self, monkeypatch):
+        import gc
+        import weakref
+        from src.clients import http
+
+        monkeypatch.setattr(http, "_shared_clients", weakref.WeakKeyDictionary())
+        client = OpenAIClient(api_key="test-key")
+
+        async def resolve():
+            return client.client
+
+        loop = asyncio.new_event_loop()
+        first = loop.run_until_complete(resolve())
+        assert loop.run_until_complete(resolve()) is first
+        assert asyncio.run(resolve()) is not first
+
+        # The finished loop's pool and SDK client went with it
+        gc.collect()
+        assert len(http._shared_clients) == 1
+        assert list(client._loop_clients.values()) == [first]
+
+        loop.run_until_complete(first.close())
+        loop.close()
+        del loop
+        gc.collect()
+        assert len(http._shared_clients) == 0
+        assert len(client._loop_clients) == 0
+
+    @pytest.mark.asyncio
+    async def test_concurrent_calls_do_not_use_threads(self, openai_sdk):
+        async def slow_create(**kwargs):
+            await asyncio.sleep(0.05)
+            return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="ok"))])
+
+        sdk = openai_sdk()
+        sdk.chat.completions.create = slow_create
+        configure_rate_limit("openai", RateLimitConfig(
+            requests_per_minute=100_000,
+            tokens_per_minute=10**9,
+            initial_concurrency=200,
+            max_concurrency=200
+        ))
+        client = OpenAIClient(client=sdk)
+
+        start = asyncio.get_running_loop().time()
+        results = await asyncio.gather(*[client.generate([{"role": "user", "content": str(i)}]) for i in range(200)])
+        assert results == ["ok"] * 200
+        # 200 overlapping calls finish together instead of being capped by a thread pool
+        assert asyncio.get_running_loop().time() - start < 1.0
+
+
+def rate_limit_error():
+    response = httpx.Response(429, headers={"retry-after": "0.01"}, request=httpx.Request("POST", "https://api.openai.com"))
+    return openai.RateLimitError("slow down", response=response, body=None)
+
+
+class TestRateLimiting:
+    @pytest.mark.asyncio
+    async def test_token_bucket_throttles_to_rate(self):
+        bucket = TokenBucket(rate_per_minute=600, capacity=1)  # 10 per second
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        for _ in range(4):
+            await bucket.acquire(1)
+
+        assert loop.time() - start >= 0.25
+
+    def test_sdk_retries_are_disabled(self):
+        async def sdk_clients():
+            return OpenAIClient(api_key="test-key").client, AnthropicClient(api_key="test-key").client
+
+        for sdk in asyncio.run(sdk_clients()):
+            # ResilientClient owns retries; 429s must reach the rate limiter
+            assert sdk.max_retries == 0
+
+    def test_limiters_are_per_event_loop_and_dropped_with_it(self, openai_sdk):
+        import gc
+
+        client = OpenAIClient(client=openai_sdk())
+
+        async def limiter():
+            return client.get_rate_limiter()
+
+        loop = asyncio.new_event_loop()
+        first = loop.run_until_complete(limiter())
+        assert loop.run_until_complete(limiter()) is first
+        assert asyncio.run(limiter()) is not first
+
+        gc.collect()
+        assert len(rate_limit._limiters) == 1
+        loop.close()
+        del loop
+        gc.collect()
+        assert len(rate_limit._limiters) == 0
+
+    @pytest.mark.asyncio
+    async def test_limiter_is_shared_and_backs_off_on_429(self, openai_sdk):
+        configure_rate_limit("openai", RateLimitConfig(initial_concurrency=8), model_name="gpt-4o")
+        sdk = openai_sdk()
+        sdk.chat.completions.create = AsyncMock(side_effect=rate_limit_error())
+        first, second = OpenAIClient(client=sdk), OpenAIClient(client=openai_sdk())
+
+        assert first.get_rate_limiter() is second.get_rate_limiter()
+        with pytest.raises(RateLimitError) as raised:
+            await first.generate([{"role": "user", "content": "hi"}])
+
+        limiter = first.get_rate_limiter()
+        assert raised.value.retry_after == 0.01
+        assert limiter.rate_limited_count == 1
+        assert limiter.concurrency.limit == 4
+        assert await second.generate([{"role": "user", "content": "hi"}]) == "ok"
+
+    @pytest.mark.asyncio
+    async def test_concurrency_grows_on_success_and_caps_in_flight(self, openai_sdk):
+        configure_rate_limit("openai", RateLimitConfig(initial_concurrency=2, max_concurrency=4))
+        in_flight, peak = 0, 0
+
+        async def create(**kwargs):
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+            return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="ok"))])
+
+        sdk = openai_sdk()
+        sdk.chat.completions.create = create
+        client = OpenAIClient(client=sdk)
+        await asyncio.gather(*[client.generate([{"role": "user", "content": "x"}]) for _ in range(40)])
+
+        assert peak <= 4
+        assert client.get_rate_limiter().concurrency.limit == 4
+
+
+class ScriptedClient:
+    """Fake client that replays a script of results, exceptions or (delay, result) pairs"""
+
+    def __init__(self, script, provider="openai"):
+        self.script = list(script)
+        self.provider = provider
+        self.model_name = "fake"
+        self.calls = 0
+
+    async def generate(self, messages):
+        step = self.script[min(self.calls, len(self.script) - 1)]
+        self.calls += 1
+        if isinstance(step, tuple):
+            delay, step = step
+            await asyncio.sleep(delay)
+        if isinstance(step, Exception):
+            raise step
+        return step
+
+
+NO_BACKOFF = RetryPolicy(max_attempts=4, base_delay=0.0)
+
+
+class TestResilience:
+    def test_errors_are_classified(self, openai_sdk):
+        client = OpenAIClient(client=openai_sdk())
+        assert isinstance(client._classify_error(rate_limit_error()), RateLimitError)
+        assert isinstance(client._classify_error(openai.APITimeoutError(request=httpx.Request("POST", "https://x"))), TransientError)
+        bad_request = openai.BadRequestError(
+            "bad", response=httpx.Response(400, request=httpx.Request("POST", "https://x")), body=None
+        )
+        assert isinstance(client._classify_error(bad_request), PermanentError)
+
+    @pytest.mark.asyncio
+    async def test_transient_errors_are_retried(self):
+        client = ScriptedClient([TransientError("boom"), TransientError("boom"), "ok"])
+        resilient = ResilientClient([client], retry_policy=NO_BACKOFF)
+
+        assert await resilient.generate([]) == "ok"
+        assert client.calls == 3
+        assert resilient.stats["retries"] == 2
+
+    @pytest.mark.asyncio
+    async def test_permanent_error_fails_over_without_retry(self):
+        primary = ScriptedClient([PermanentError("bad request")])
+        fallback = ScriptedClient(["from fallback"], provider="anthropic")
+        resilient = ResilientClient([primary, fallback], retry_policy=NO_BACKOFF)
+
+        assert await resilient.generate([]) == "from fallback"
+        assert primary.calls == 1
+
+    @pytest.mark.asyncio
+    async def test_open_circuit_skips_provider(self):
+        primary = ScriptedClient([TransientError("down")])
+        fallback = ScriptedClient(["ok"], provider="anthropic")
+        resilient = ResilientClient([primary, fallback], retry_policy=NO_BACKOFF)
+        resilience._breakers["openai"] = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+
+        assert await resilient.generate([]) == "ok"
+        assert primary.calls == 2
+        assert await resilient.generate([]) == "ok"
+        assert primary.calls == 2
+
+        with pytest.raises(CircuitOpenError):
+            await ResilientClient([primary]).generate([])
+
+    def test_circuit_half_opens_after_timeout(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.0)
+        breaker.record_failure()
+        assert breaker.state == CircuitBreaker.HALF_OPEN
+        breaker.record_success()
+        assert breaker.state == CircuitBreaker.CLOSED
+
+    def test_half_open_circuit_admits_one_trial_call(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+        breaker.record_failure()
+        assert not breaker.allow()
+        time.sleep(0.06)
+
+        assert breaker.allow()
+        assert not breaker.allow()
+        breaker.record_failure()
+        assert breaker.state == CircuitBreaker.OPEN
+
+    @pytest.mark.asyncio
+    async def test_rate_limits_do_not_trip_the_circuit(self):
+        client = ScriptedClient([RateLimitError("slow down")] * 3 + ["ok"])
+        resilience._breakers["openai"] = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+
+        assert await ResilientClient([client], retry_policy=NO_BACKOFF).generate([]) == "ok"
+        assert resilience._breakers["openai"].state == CircuitBreaker.CLOSED
+
+    @pytest.mark.asyncio
+    async def test_stream_fails_over_before_the_first_delta(self):
+        class StreamingClient(ScriptedClient):
+            async def generate_stream(self, messages):
+                step = self.script[0]
+                if isinstance(step, Exception):
+                    raise step
+                for delta in step:
+                    yield delta
+
+        primary = StreamingClient([TransientError("down")])
+        fallback = StreamingClient([["a", "b"]], provider="anthropic")
+        resilient = ResilientClient([primary, fallback])
+
+        assert [delta async for delta in resilient.generate_stream([])] == ["a", "b"]
+        assert resilient.stats["failovers"] == 1
+
+    def test_orchestrator_gives_bare_clients_retries(self, openai_sdk):
+        client = OpenAIClient(client=openai_sdk())
+        agent = CalculatorAgent(client, "calculator")
+        orchestrator = FinancialOrchestrator(client, {"calculator": agent}, MagicMock())
+
+        assert isinstance(orchestrator.supervisor_model, ResilientClient)
+        assert agent.model is orchestrator.supervisor_model
+        assert agent.model.clients == [client]
+
+    @pytest.mark.asyncio
+    async def test_deadline_bounds_the_whole_call(self):
+        client = ScriptedClient([(1.0, "late")])
+        resilient = ResilientClient([client], retry_policy=NO_BACKOFF, deadline=0.05)
+
+        with pytest.raises(DeadlineExceeded):
+            await resilient.generate([])
+
+    @pytest.mark.asyncio
+    async def test_slow_call_is_hedged(self):
+        client = ScriptedClient(["ok"] * 20 + [(1.0, "slow"), "fast"])
+        resilient = ResilientClient([client], hedge_quantile=0.95)
+        for _ in range(20):
+            await resilient.generate([])
+
+        start = asyncio.get_running_loop().time()
+        assert await resilient.generate([]) == "fast"
+        assert asyncio.get_running_loop().time() - start < 0.5
+        assert resilient.stats["hedges"] == 1
+
+
+class TestResponseCache:
+    @pytest.mark.asyncio
+    async def test_identical_requests_hit_the_cache(self, tmp_path, openai_sdk):
+        sdk = openai_sdk("cached answer")
+        client = CachedClient(OpenAIClient(client=sdk), ResponseCache(str(tmp_path / "llm.sqlite")))
+        messages = [{"role": "system", "content": "s"}, {"role": "user", "content": "q"}]
+
+        assert await client.generate(messages) == "cached answer"
+        assert await client.generate([dict(m) for m in messages]) == "cached answer"
+        assert sdk.chat.completions.create.await_count == 1
+        assert client.cache.hits == 1
+
+    def test_key_depends_on_model_and_parameters(self, openai_sdk):
+        messages = [{"role": "user", "content": "q"}]
+        base = OpenAIClient(client=openai_sdk())
+        assert request_key(base, messages) == request_key(OpenAIClient(client=openai_sdk()), [{"content": "q", "role": "user"}])
+        assert request_key(base, messages) != request_key(OpenAIClient(model_name="gpt-4o-mini", client=openai_sdk()), messages)
+        assert request_key(base, messages) != request_key(OpenAIClient(temperature=0.7, client=openai_sdk()), messages)
+
+    @pytest.mark.asyncio
+    async def test_replay_serves_recorded_responses_offline(self, tmp_path, openai_sdk):
+        path = str(tmp_path / "llm.sqlite")
+        messages = [{"role": "user", "content": "q"}]
+        await CachedClient(OpenAIClient(client=openai_sdk("recorded")), ResponseCache(path)).generate(messages)
+
+        sdk = openai_sdk("live")
+        replay = CachedClient(OpenAIClient(client=sdk), ResponseCache(path), mode="replay")
+        assert await replay.generate(messages) == "recorded"
+        with pytest.raises(ReplayMissError):
+            await replay.generate([{"role": "user", "content": "new"}])
+        sdk.chat.completions.create.assert_not_awaited()
+
+    def test_ttl_and_size_eviction(self):
+        cache = ResponseCache(":memory:", ttl=60, max_entries=2)
+        for i in range(3):
+            cache.put(f"k{i}", f"v{i}")
+        cache._conn.execute("UPDATE responses SET accessed_at = accessed_at - 10 WHERE key = 'k1'")
+        cache.evict()
+        assert len(cache) == 2
+        assert cache.get("k1") is None
+
+        cache.ttl = -1
+        assert cache.get("k0") is None
+
+
+class TestSingleFlight:
+    @pytest.mark.asyncio
+    async def test_concurrent_identical_requests_share_one_call(self):
+        upstream = ScriptedClient([(0.05, "shared")])
+        client = SingleFlightClient(upstream)
+        messages = [{"role": "user", "content": "quick ratio concepts"}]
+
+        results = await asyncio.gather(*[client.generate(messages) for _ in range(10)])
+
+        assert results == ["shared"] * 10
+        assert upstream.calls == 1
+        assert client.coalesced == 9
+        assert await client.generate(messages) == "shared"
+        assert upstream.calls == 2
+
+    @pytest.mark.asyncio
+    async def test_distinct_requests_are_not_coalesced(self):
+        upstream = ScriptedClient([(0.01, "ok")])
+        client = SingleFlightClient(upstream)
+
+        await asyncio.gather(*[client.generate([{"role": "user", "content": str(i)}]) for i in range(5)])
+        assert upstream.calls == 5
+
+    @pytest.mark.asyncio
+    async def test_errors_reach_every_waiter_and_cancellation_is_isolated(self):
+        client = SingleFlightClient(ScriptedClient([(0.05, TransientError("boom"))]))
+        messages = [{"role": "user", "content": "q"}]
+
+        cancelled = asyncio.ensure_future(client.generate(messages))
+        waiters = [asyncio.ensure_future(client.generate(messages)) for _ in range(3)]
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        results = await asyncio.gather(*waiters, return_exceptions=True)
+
+        assert all(isinstance(result, TransientError) for result in results)
+
+
+def openai_stream(deltas, log):
+    """Fake OpenAI AsyncStream yielding content deltas and recording how it was closed"""
+    class Stream:
+        async def __aiter__(self):
+            for delta in deltas:
+                log.append(delta)
+                yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=delta))])
+
+        async def close(self):
+            log.append("closed")
+
+    return Stream()
+
+
+class TestStreaming:
+    @pytest.mark.asyncio
+    async def test_openai_streams_deltas(self, openai_sdk):
+        log = []
+        sdk = openai_sdk()
+        sdk.chat.completions.create = AsyncMock(return_value=openai_stream(["a", "b", "c"], log))
+        client = OpenAIClient(client=sdk)
+
+        assert [delta async for delta in client.generate_stream([{"role": "user", "content": "hi"}])] == ["a", "b", "c"]
+        assert sdk.chat.completions.create.call_args.kwargs["stream"] is True
+        assert log[-1] == "closed"
+
+    @pytest.mark.asyncio
+    async def test_closing_early_closes_the_upstream_response(self, openai_sdk):
+        log = []
+        sdk = openai_sdk()
+        sdk.chat.completions.create = AsyncMock(return_value=openai_stream(["a", "b", "c", "d"], log))
+        client = OpenAIClient(client=sdk)
+
+        stream = client.generate_stream([{"role": "user", "content": "hi"}])
+        async for delta in stream:
+            if delta == "b":
+                break
+        await stream.aclose()
+
+        assert log == ["a", "b", "closed"]
+        assert client.get_rate_limiter().concurrency.in_flight == 0
+
+    @pytest.mark.asyncio
+    async def test_agents_stream_through_the_example_client_stack(self, tmp_path, monkeypatch, openai_sdk):
+        from src.clients.cache import cached_client_from_env
+
+        monkeypatch.setenv("LLM_CACHE_PATH", str(tmp_path / "llm.sqlite"))
+        log = []
+        response = '{"explanation": "e", "answer": "0.69", "citation": "c"} trailing'
+        sdk = openai_sdk()
+        sdk.chat.completions.create = AsyncMock(return_value=openai_stream(list(response), log))
+        client = cached_client_from_env(SingleFlightClient(ResilientClient([OpenAIClient(client=sdk)])))
+        agent = CalculatorAgent(client, "calculator")
+
+        assert isinstance(client, CachedClient)
+        output = await agent.execute("Calculate", "ctx", stream=True)
+
+        assert output.answer == "0.69"
+        assert agent.parse_tiers == {"stream": 1}
+        assert sdk.chat.completions.create.call_args.kwargs["stream"] is True
+        # Stopped by the closing brace at the latest and closed the upstream response
+        assert log[-1] == "closed"
+        assert len(log) - 1 <= response.index("}") + 1
+
+    @pytest.mark.asyncio
+    async def test_anthropic_streams_text(self):
+        class Stream:
+            async def __aenter__(self):
+                return self
+
+            async def __aexit__(self, *exc):
+                return False
+
+            @property
+            async def text_stream(self):
+                for text in ["x", "y"]:
+                    yield text
+
+        sdk = anthropic_sdk()
+        sdk.messages.stream = MagicMock(return_value=Stream())
+        client = AnthropicClient(client=sdk)
+
+        deltas = [d async for d in client.generate_stream([{"role": "system", "content": "s"}, {"role": "user", "content": "hi"}])]
+        assert deltas == ["x", "y"]
+        assert sdk.messages.stream.call_args.kwargs["system"] == "s"
@@ -0,0 +1,56 @@
+from src.examples.aes_inventory_turnover import AES_DATA
+from src.tools.extraction import extract_concepts
+from src.tools.formulas import resolve_line_items
+from src.tools.statements import parse_statements
+from src.utils.concepts import ConceptResolver, get_concept_resolver, normalize_label, normalize_tokens
+from src.utils.financial_data_validator import FinancialDataValidator
+
+
+class TestConceptResolver:
+    def test_resolves_labels_to_canonical_concepts(self):
+        resolver = get_concept_resolver()
+        assert resolver.resolve("Total Current Assets FY2023") == "current_assets"
+        assert resolver.resolve("Purchases of property, plant and equipment") == "capex"
+        assert resolver.resolve("Property, plant and equipment, net") == "fixed_assets"
+        assert resolver.resolve("Inventories, net") == "inventory"
+        assert resolver.resolve("Total stockholders' equity") == "total_equity"
+        assert resolver.resolve("cost_of_sales") == "cost_of_sales"
+        # Components and unrelated rows do not resolve to their parent concept
+        assert resolver.resolve("Cost of Sales: Regulated") is None
+        assert resolver.resolve("Gross profit") is None
+
+    def test_custom_synonyms_and_normalization(self):
+        resolver = ConceptResolver({"ebitda": ["EBITDA", "adjusted EBITDA"]})
+        assert resolver.resolve("Adjusted EBITDA (FY2022)") == "ebitda"
+        assert resolver.resolve("Net income") is None
+        assert normalize_tokens("Total Current Assets FY2023") == ("total", "current", "assets")
+        assert normalize_label("Property, plant and equipment,  net") == "property plant and equipment net"
+
+
+class TestSharedResolver:
+    def test_statement_rows_are_found_by_concept(self):
+        index = parse_statements(AES_DATA)
+        label, table = index.find_concept("cost_of_sales")
+        assert label == "Total cost of sales"
+        assert index.find_concept("revenue")[0] == "Total revenue"
+
+    def test_formula_inputs_and_extraction_share_the_resolver(self):
+        assert resolve_line_items({"net sales": 100.0, "inventories net": 5.0}) == {"revenue": 100.0, "inventory": 5.0}
+        results = extract_concepts(AES_DATA, ["inventory", "cost_of_sales"])
+        assert [r["value"] for r in results["inventory"]] == [1055.0, 604.0]
+        assert results["cost_of_sales"][0]["label"] == "cost of sales"
+        assert results["cost_of_sales"][0]["value"] == -10069.0
+
+    def test_validator_matches_keys_by_concept(self):
+        validator = FinancialDataValidator()
+        data = {
+            "Total Current Assets FY2023": 5308,
+            "Inventories FY2023": 2213,
+            "Quick Assets FY2023": 3095,
+            "Total assets FY2023": 17003,
+            "Total liabilities FY2023": 12913
+        }
+        assert validator._get_value(data, "current_assets") == 5308
+        assert validator.validate_range(data)["Inventories FY2023"].status.value == "valid"
+        assert all(result.status.value == "valid" for result in validator.validate_math(data).values())
+        assert "inventories" in validator.term_synonyms["inventory"]
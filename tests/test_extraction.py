@@ -0,0 +1,41 @@
+import io
+from src.examples.amcor_quick_ratio import AMCOR_DATA
+from src.tools.extraction import FinancialDataExtractor, extract_financial_fields, parse_amounts
+from src.tools.registry import extract_financial_data
+
+
+class TestParseAmounts:
+    def test_parse_amounts_applies_adjacent_scale_and_sign(self):
+        assert parse_amounts("Revenue was $5.2 billion, up from $4.8B") == [5.2e9, 4.8e9]
+        assert parse_amounts("Cost of sales (10,069) and -3m") == [-10069.0, -3e6]
+        # Scale words elsewhere in the line do not apply, and years/labels are not amounts
+        assert parse_amounts("Total assets 17,003 (in millions) for FY2023 Q4 of 2022") == [17003.0]
+
+
+class TestFieldExtraction:
+    def test_one_line_per_amount_without_duplicates(self):
+        results = extract_financial_data("Total current assets    5,308     5,853\nGoodwill  5,366", "total current assets")
+        assert [r["value"] for r in results] == [5308.0, 5853.0]
+        assert set(results[0]) == {"line", "text", "value", "year", "field"}
+        assert (results[0]["line"], results[0]["field"]) == (0, "total current assets")
+
+    def test_many_fields_in_one_pass(self):
+        results = extract_financial_fields(AMCOR_DATA, ["Total assets", "Goodwill", "current assets", "Total current assets", "Missing item"])
+        assert [r["value"] for r in results["Total current assets"]] == [5308.0, 5853.0]
+        # "current assets" also matches inside the longer "Total current assets" and in other rows
+        assert 5308.0 in [r["value"] for r in results["current assets"]]
+        assert [r["value"] for r in results["Goodwill"]] == [5366.0, 5285.0]
+        assert [r["value"] for r in results["Total assets"]] == [17003.0, 17426.0]
+        assert results["Missing item"] == []
+
+    def test_fields_on_the_same_line_split_the_amounts(self):
+        extractor = FinancialDataExtractor(["revenue", "net income"])
+        results = extractor.extract("Revenue of $12.6 billion and net income of $1.2 billion")
+        assert [r["value"] for r in results["revenue"]] == [12.6e9]
+        assert [r["value"] for r in results["net income"]] == [1.2e9]
+
+    def test_streams_lines_from_a_file(self):
+        extractor = FinancialDataExtractor(["Goodwill"])
+        matches = extractor.iter_matches(io.StringIO(AMCOR_DATA))
+        first = next(matches)
+        assert (first["field"], first["value"]) == ("Goodwill", 5366.0)
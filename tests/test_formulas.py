@@ -0,0 +1,130 @@
+import json
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+from src.agent import Agent
+from src.examples.workflows import AMCOR_QUICK_RATIO_WORKFLOW, THREE_M_CAPITAL_INTENSITY_WORKFLOW
+from src.financial_orchestrator import FinancialOrchestrator
+from src.models import JobOutput
+from src.tools.formulas import FormulaEngine, evaluate_formulas, find_formulas, numeric_line_items
+
+AMCOR_VALUES = {
+    "values": {
+        "Total Current Assets FY2023": 5853,
+        "Total Current Assets FY2022": 5908,
+        "Raw Materials and Supplies FY2023": 992,
+        "Raw Materials and Supplies FY2022": 1114,
+        "Work in Process and Finished Goods FY2023": 1221,
+        "Work in Process and Finished Goods FY2022": 1325,
+        "Total Current Liabilities FY2023": 4476,
+        "Total Current Liabilities FY2022": 5308
+    }
+}
+
+
+class TestFormulas:
+    def test_find_formulas_matches_names_and_aliases_in_order(self):
+        task = "Calculate the CAPEX/Revenue ratio, Fixed assets/Total Assets ratio, and Return on Assets (ROA)"
+        assert [f.name for f in find_formulas(task)] == ["capex_to_revenue", "fixed_assets_to_total_assets", "return_on_assets"]
+        assert [f.name for f in find_formulas("What is the acid-test ratio?")] == ["quick_ratio"]
+        assert find_formulas("Summarize management's outlook") == []
+
+    def test_numeric_line_items_reads_flat_nested_and_json_inputs(self):
+        assert numeric_line_items(AMCOR_VALUES)["2023"]["total current assets"] == 5853
+        nested = numeric_line_items('{"FY2022": {"Cost of sales": "$10,069", "Inventory": "1,055"}}')
+        assert nested == {"2022": {"cost of sales": 10069.0, "inventory": 1055.0}}
+        assert numeric_line_items({"Revenue": "2.5 billion"}) == {None: {"revenue": 2.5e9}}
+
+    def test_quick_ratio_assembles_inventory_from_components(self):
+        result = evaluate_formulas(find_formulas("quick ratio"), AMCOR_VALUES)
+        assert result.results["FY2023"]["quick_ratio"] == pytest.approx((5853 - 992 - 1221) / 4476, abs=1e-4)
+        assert result.inputs["FY2022"]["inventory"] == 1114 + 1325
+        assert set(result.changes()) == {"quick_ratio"}
+
+    def test_missing_inputs_return_none(self):
+        assert evaluate_formulas(find_formulas("inventory turnover"), {"Cost of sales FY2022": 10069}) is None
+        # A requested year that is not in the data
+        assert evaluate_formulas(find_formulas("quick ratio"), AMCOR_VALUES, years=["2021"]) is None
+
+
+class TestFormulaEngine:
+    def test_engine_only_takes_structurer_and_calculator_steps(self):
+        engine = FormulaEngine()
+        inputs = {"extracted_data": AMCOR_VALUES}
+        assert engine.run_step("explainer_validator", "Explain the quick ratio: {extracted_data}", inputs) is None
+        assert engine.run_step("calculator", "Explain the trend: {extracted_data}", inputs) is None
+
+        structured = engine.run_step("information_structurer", AMCOR_QUICK_RATIO_WORKFLOW[2]["task"], inputs)
+        calculated = engine.run_step("calculator", AMCOR_QUICK_RATIO_WORKFLOW[3]["task"], {"structured_data": structured.answer})
+        assert set(calculated.answer) == {"FY2022", "FY2023", "percentage_change", "units"}
+        assert calculated.answer["units"] == {"quick_ratio": "ratio"}
+        assert calculated.answer["FY2023"]["quick_ratio"] == pytest.approx((5853 - 992 - 1221) / 4476, abs=1e-4)
+
+    def test_zero_denominator_is_undefined_not_infinite(self):
+        engine = FormulaEngine()
+        output = engine.run_step("calculator", "Calculate the inventory turnover and ROA: {data}", {
+            "data": {"Cost of sales FY2022": 10069, "Inventory FY2022": 0, "Net income FY2022": 10, "Total assets FY2022": 200}
+        })
+
+        assert output.answer["FY2022"] == {"inventory_turnover": None, "return_on_assets": 5.0}
+        assert output.answer["units"] == {"inventory_turnover": "ratio", "return_on_assets": "percent"}
+        assert "inventory_turnover FY2022: inventory is zero" in output.explanation
+        json.dumps(output.answer, allow_nan=False)
+
+    def test_orchestrators_do_not_share_a_default_engine(self):
+        first = FinancialOrchestrator(MagicMock(), {}, MagicMock())
+        second = FinancialOrchestrator(MagicMock(), {}, MagicMock())
+
+        assert isinstance(first.formula_engine, FormulaEngine)
+        assert first.formula_engine is not second.formula_engine
+        assert FinancialOrchestrator(MagicMock(), {}, MagicMock(), use_formula_engine=False).formula_engine is None
+
+    @pytest.mark.asyncio
+    async def test_orchestrator_skips_agents_for_numeric_formula_steps(self):
+        supervisor = MagicMock()
+        supervisor.generate = AsyncMock(return_value="Final answer")
+
+        def agent(answer):
+            mock = MagicMock(spec=Agent)
+            mock.execute = AsyncMock(return_value=JobOutput(explanation="e", citation="c", answer=answer))
+            return mock
+
+        agents = {
+            "data_retriever": agent({
+                "values": {
+                    "CAPEX FY2022": 1749,
+                    "Net sales FY2022": 34229,
+                    "Property plant and equipment net FY2022": 9178,
+                    "Total assets FY2022": 46455,
+                    "Net income FY2022": 5777
+                }
+            }),
+            "financial_concept_selector": agent("concept"),
+            "information_structurer": agent("llm structured"),
+            "calculator": agent("llm calculated"),
+            "explainer_validator": agent("explained")
+        }
+        orchestrator = FinancialOrchestrator(supervisor_model=supervisor, agents=agents, tool_registry=MagicMock())
+        fitted = []
+        fit_context = orchestrator._fit_context
+
+        async def spy_fit_context(context, query, agent):
+            fitted.append(agent)
+            return await fit_context(context, query, agent)
+
+        orchestrator._fit_context = spy_fit_context
+        result = await orchestrator.run_financial_analysis("Is 3M capital intensive?", "filing", THREE_M_CAPITAL_INTENSITY_WORKFLOW)
+
+        agents["information_structurer"].execute.assert_not_called()
+        agents["calculator"].execute.assert_not_called()
+        # Formula steps never fit (chunk, embed, trim) the filing
+        assert agents["information_structurer"] not in fitted and agents["calculator"] not in fitted
+        calculations = result["steps"][3]["output"].answer["FY2022"]
+        assert calculations["capex_to_revenue"] == pytest.approx(1749 / 34229, abs=1e-4)
+        assert calculations["return_on_assets"] == pytest.approx(5777 / 46455 * 100, abs=1e-4)
+        assert result["steps"][3]["usage"]["calls"] == 0
+
+        # Non-numeric inputs fall back to the agents
+        agents["data_retriever"].execute.return_value = JobOutput(explanation="e", answer="not found in the filing")
+        await orchestrator.run_financial_analysis("Is 3M capital intensive?", "filing", THREE_M_CAPITAL_INTENSITY_WORKFLOW)
+        agents["information_structurer"].execute.assert_called_once()
+        agents["calculator"].execute.assert_called_once()
@@ -0,0 +1,37 @@
+import subprocess
+import sys
+import pytest
+
+HEAVY_MODULES = ("torch", "sentence_transformers", "transformers", "sklearn", "rank_bm25")
+# Generous ceiling for `import src.tools` (numpy dominates); catches eager ML imports
+IMPORT_BUDGET_US = 1_500_000
+
+
+def import_profile(module: str):
+    """Run `python -X importtime -c "import <module>"` and return {module: cumulative_us}"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True
+    )
+    profile = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        try:
+            profile[name.strip()] = int(cumulative)
+        except ValueError:
+            continue  # header row
+    return profile
+
+
+class TestImportTime:
+    @pytest.mark.parametrize("module", ["src.tools", "src.tools.registry"])
+    def test_tools_import_does_not_load_ml_stack(self, module):
+        profile = import_profile(module)
+
+        loaded = sorted(name for name in profile if name.split(".")[0] in HEAVY_MODULES)
+        assert loaded == []
+        assert profile[module] < IMPORT_BUDGET_US
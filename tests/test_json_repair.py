@@ -0,0 +1,53 @@
+import json
+import time
+from unittest.mock import MagicMock
+from src.agents.calculator import CalculatorAgent
+from src.utils.json_repair import repair_json
+
+
+class TestRepairJson:
+    def test_valid_json_is_unchanged(self):
+        text = '{"explanation": "a \\"quoted\\" word", "answer": {"FY2023": [0.81, null, true]}}'
+        assert repair_json(text) == text
+
+    def test_repairs_common_model_mistakes(self):
+        text = """{
+            // the working
+            "explanation": "Quick ratio is "cash-like" assets / CL",
+            "citation": 'Balance sheet',
+            "answer": {"FY2023": 0.81, "improved": True,}, /* done */
+        }"""
+        data = json.loads(repair_json(text))
+        assert data["explanation"] == 'Quick ratio is "cash-like" assets / CL'
+        assert data["citation"] == "Balance sheet"
+        assert data["answer"] == {"FY2023": 0.81, "improved": True}
+
+    def test_closes_truncated_output(self):
+        assert json.loads(repair_json('{"explanation": "line one\nline two", "answer": {"a": [1, 2')) == {
+            "explanation": "line one\nline two",
+            "answer": {"a": [1, 2]}
+        }
+        assert json.loads(repair_json('{"explanation": "x", "answer":')) == {"explanation": "x", "answer": None}
+
+    def test_repair_is_linear_in_the_input(self):
+        rows = ", ".join(f'"Ratio {i} is "high"": {i}' for i in range(2000))
+        small, large = '{"explanation": "x", "answer": {%s}}' % rows[:len(rows) // 10], '{"explanation": "x", "answer": {%s}}' % rows
+
+        def elapsed(text):
+            started = time.perf_counter()
+            repair_json(text)
+            return time.perf_counter() - started
+
+        assert elapsed(large) < 30 * max(elapsed(small), 1e-4)
+
+
+class TestParseTiers:
+    def test_agent_records_the_tier_that_parsed_each_response(self):
+        agent = CalculatorAgent(MagicMock(), "calculator")
+        assert agent._parse_output('{"explanation": "x", "answer": "1"}').answer == "1"
+        assert agent._parse_output('Here:\n```json\n{"explanation": "x", "answer": {"a": 1,},}\n```').answer == '{"a": 1}'
+        assert agent._parse_output('```json\n{"explanation": "x", "answer": "2"}\n```\nand\n```json\n{"oops": 1}\n```').answer == "2"
+        assert agent._parse_output('{"explanation": "x", "answer": "3"} and then {"note": 1}').answer == "3"
+        failed = agent._parse_output("no json here")
+        assert failed.explanation == "Failed to extract JSON from response"
+        assert agent.parse_tiers == {"strict": 1, "repair": 1, "heuristic": 2, "failed": 1}
@@ -0,0 +1,47 @@
+import json
+import pytest
+from src.utils.json_stream import IncrementalJSONParser
+
+
+RESPONSE = """Here is the result:
+```json
+{
+    "explanation": "Quick ratio = (current assets - inventories) / current liabilities, \\"rounded\\"",
+    "citation": null,
+    "answer": {"FY2023": 0.69, "FY2022": [0.67, "}"]},
+    "confidence": 0.9
+}
+```
+Let me know if you need anything else."""
+
+
+def feed_in_chunks(parser, text, size):
+    completed = []
+    for i in range(0, len(text), size):
+        completed += parser.feed(text[i:i + size])
+    return completed
+
+
+class TestIncrementalJSONParser:
+    @pytest.mark.parametrize("size", [1, 3, 16, len(RESPONSE)])
+    def test_fields_match_full_parse_for_any_chunking(self, size):
+        parser = IncrementalJSONParser()
+        completed = feed_in_chunks(parser, RESPONSE, size)
+
+        expected = json.loads(RESPONSE[RESPONSE.index("{"):RESPONSE.rindex("}") + 1])
+        assert completed == ["explanation", "citation", "answer", "confidence"]
+        assert parser.fields == expected
+        assert parser.complete
+
+    def test_fields_are_reported_as_soon_as_they_close(self):
+        parser = IncrementalJSONParser()
+        assert parser.feed('{"explanation": "done", "answer": "par') == ["explanation"]
+        assert not parser.has_fields(["explanation", "answer"])
+        assert parser.feed('tial"') == ["answer"]
+        assert parser.has_fields(["explanation", "answer"])
+        assert not parser.complete
+
+    def test_invalid_values_are_skipped(self):
+        parser = IncrementalJSONParser()
+        parser.feed('{"answer": [1, 2,], "explanation": "ok"}')
+        assert parser.fields == {"explanation": "ok"}
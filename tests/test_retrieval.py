@@ -0,0 +1,386 @@
+import threading
+import zlib
+import numpy as np
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+from rank_bm25 import BM25Plus
+from src.agent import Agent
+from src import financial_orchestrator
+from src.financial_orchestrator import FinancialOrchestrator
+from src.models import JobOutput
+from src.tools import backends, embedding_cache, embeddings, retrieval
+from src.tools.embedding_cache import DiskEmbeddingStore, EmbeddingCache
+from src.tools.embeddings import EmbeddingModelManager, get_embedding_manager, set_embedding_manager
+from src.tools.corpus_index import CorpusIndex
+from src.tools.backends import available_backends, register_embedding_backend
+from src.tools.registry import bm25_retrieve, create_default_registry, retrieve_from_context, retrieve_many, semantic_retrieve
+from src.tools.retrieval import BM25Statistics, DocumentIndex, fit_to_token_budget, normalize_rows, reciprocal_rank_fusion, tokenize, top_k, weighted_score_fusion
+from src.utils.tokens import count_tokens
+
+
+class FakeModel:
+    """Hashed bag-of-words encoder so tests never download a real model"""
+    dim = 64
+
+    def __init__(self):
+        self.calls = 0
+
+    def encode(self, texts, batch_size=32):
+        self.calls += 1
+        single = isinstance(texts, str)
+        batch = [texts] if single else list(texts)
+        vectors = np.zeros((len(batch), self.dim), dtype=np.float32)
+        for row, text in enumerate(batch):
+            for token in text.lower().split():
+                vectors[row, zlib.crc32(token.strip(".,").encode()) % self.dim] += 1.0
+        return vectors[0] if single else vectors
+
+
+class FakeManager(EmbeddingModelManager):
+    def __init__(self, model_name="fake-model", device=None):
+        super().__init__(model_name, device)
+        self.loads = 0
+
+    def _load_model(self):
+        self.loads += 1
+        return FakeModel()
+
+
+@pytest.fixture
+def fake_manager(monkeypatch):
+    monkeypatch.setattr(embeddings, "_managers", {})
+    monkeypatch.setattr(embedding_cache, "_default_cache", EmbeddingCache())
+    monkeypatch.setattr(retrieval, "_index_cache", retrieval.OrderedDict())
+    manager = FakeManager()
+    set_embedding_manager(manager)
+    return manager
+
+
+FILING = (
+    "Total current assets were 5,308 million. "
+    "Raw materials and supplies were 992 million. "
+    "Total current liabilities were 4,476 million. "
+    "Revenue for the year grew by four percent. "
+) * 20
+
+
+class TestEmbeddingModelManager:
+    def test_model_is_loaded_lazily_and_once(self, fake_manager):
+        assert not fake_manager.is_loaded
+
+        threads = [threading.Thread(target=fake_manager.encode, args=(["quick ratio"],)) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert fake_manager.loads == 1
+        assert fake_manager.get_model().calls == 8
+
+    def test_shared_manager_per_model_and_device(self, fake_manager):
+        assert get_embedding_manager("fake-model") is fake_manager
+        assert get_embedding_manager("fake-model", "cuda") is not fake_manager
+
+    def test_semantic_retrieve_reuses_model(self, fake_manager):
+        chunks = ["Revenue grew strongly.", "The quick ratio is 0.75.", "Inventory fell."]
+        for _ in range(3):
+            results = semantic_retrieve(chunks, "quick ratio", 1, model_name="fake-model")
+            assert results == ["The quick ratio is 0.75."]
+
+        assert fake_manager.loads == 1
+
+
+class TestEmbeddingCache:
+    def test_only_new_chunks_are_encoded(self, fake_manager):
+        cache = EmbeddingCache()
+        first = fake_manager.encode_documents(["a b", "c d"], cache=cache)
+        second = fake_manager.encode_documents(["c d", "e f", "a b"], cache=cache)
+
+        assert fake_manager.get_model().calls == 2
+        np.testing.assert_array_equal(second[0], first[1])
+        np.testing.assert_array_equal(second[2], first[0])
+        assert cache.hits == 2
+
+    def test_memory_tier_is_lru_bounded(self):
+        cache = EmbeddingCache(max_memory_items=2)
+        cache.put_many("m", ["a", "b"], np.eye(2, dtype=np.float32))
+        cache.get_many("m", ["a"])
+        cache.put_many("m", ["c"], np.ones((1, 2), dtype=np.float32))
+
+        a, b, c = cache.get_many("m", ["a", "b", "c"])
+        assert a is not None and b is None and c is not None
+
+    def test_disk_tier_survives_new_cache_and_is_keyed_by_model(self, tmp_path):
+        vectors = np.arange(6, dtype=np.float32).reshape(3, 2)
+        EmbeddingCache(cache_dir=str(tmp_path)).put_many("model-a", ["x", "y", "z"], vectors)
+
+        reloaded = EmbeddingCache(cache_dir=str(tmp_path))
+        y, z = reloaded.get_many("model-a", ["y", "z"])
+        np.testing.assert_array_equal(y, vectors[1])
+        np.testing.assert_array_equal(z, vectors[2])
+        assert reloaded.get_many("model-b", ["y"]) == [None]
+
+
+    def test_disk_stores_sharing_a_directory_do_not_clobber_each_other(self, tmp_path):
+        first = DiskEmbeddingStore(str(tmp_path), "model-a")
+        second = DiskEmbeddingStore(str(tmp_path), "model-a")
+        first.put_many(["x"], np.array([[1.0, 0.0]], dtype=np.float32))
+        second.put_many(["y", "x"], np.array([[0.0, 1.0], [9.0, 9.0]], dtype=np.float32))
+
+        segments = list((tmp_path / "model-a").glob("segment_*.npy"))
+        assert len(segments) == 2
+        # Each store sees the other's writes, and "x" keeps its first vector
+        for store in (first, second, DiskEmbeddingStore(str(tmp_path), "model-a")):
+            x, y = store.get_many(["x", "y"])
+            np.testing.assert_array_equal(x, [1.0, 0.0])
+            np.testing.assert_array_equal(y, [0.0, 1.0])
+
+
+    def test_disk_store_compacts_its_segments(self, tmp_path):
+        other = DiskEmbeddingStore(str(tmp_path), "model-a")
+        other.put_many(["a"], np.array([[1.0, 0.0]], dtype=np.float32))
+        store = DiskEmbeddingStore(str(tmp_path), "model-a", max_segments=2)
+        store.put_many(["b"], np.array([[0.0, 1.0]], dtype=np.float32))
+        reader = DiskEmbeddingStore(str(tmp_path), "model-a")
+        assert len(list((tmp_path / "model-a").glob("segment_*.npy"))) == 2
+
+        store.put_many(["c", "a"], np.array([[1.0, 1.0], [9.0, 9.0]], dtype=np.float32))
+        assert store.n_segments == 1
+        assert len(list((tmp_path / "model-a").glob("segment_*.npy"))) == 1
+        assert len((tmp_path / "model-a" / "index.jsonl").read_text().splitlines()) == 1
+
+        # A store that read the old log follows the rewritten one
+        a, b, c = other.get_many(["a", "b", "c"])
+        np.testing.assert_array_equal(a, [1.0, 0.0])
+        np.testing.assert_array_equal(b, [0.0, 1.0])
+        np.testing.assert_array_equal(c, [1.0, 1.0])
+        assert other.n_segments == 1
+        # Even when every key it asks for is indexed in a removed segment
+        np.testing.assert_array_equal(reader.get_many(["b"])[0], [0.0, 1.0])
+
+class TestDocumentIndex:
+    def test_bm25_scores_match_rank_bm25(self):
+        chunks = [c.split() for c in ["a b c a", "b c d", "e f a", "c c c"]]
+        stats = BM25Statistics.build(chunks)
+
+        for query in (["a"], ["c", "a", "zz"], ["b", "b"]):
+            np.testing.assert_allclose(stats.get_scores(query), BM25Plus(chunks).get_scores(query))
+
+    def test_bm25_statistics_round_trip_without_pickle(self, tmp_path):
+        chunks = [["revenue", "grew", "€5m"], ["inventory", "fell"], []]
+        stats = BM25Statistics.build(chunks)
+        stats.save(str(tmp_path / "bm25.npz"))
+
+        with np.load(str(tmp_path / "bm25.npz"), allow_pickle=False) as data:
+            assert data["terms"].dtype != object
+        loaded = BM25Statistics.load(str(tmp_path / "bm25.npz"))
+        assert loaded.terms == stats.terms
+        np.testing.assert_allclose(loaded.get_scores(["€5m", "inventory"]), stats.get_scores(["€5m", "inventory"]))
+
+    def test_index_is_built_once_for_repeated_queries(self, fake_manager):
+        retrieve_from_context(FILING, "current liabilities", model_name="fake-model")
+        calls = fake_manager.get_model().calls
+        results = retrieve_from_context(FILING, "raw materials", model_name="fake-model")
+
+        assert fake_manager.get_model().calls == calls + 1  # only the query embedding
+        assert "raw materials" in results[0].lower()
+
+    def test_fit_to_token_budget_keeps_relevant_passages_in_order(self, fake_manager):
+        filing = "".join(f"Section {i}. " + ("Revenue grew in the period. " * 8) for i in range(12))
+        filing += "Total current liabilities were 4,476 million. " * 3
+
+        assert fit_to_token_budget(FILING, "liabilities", 10**6) == FILING
+        trimmed = fit_to_token_budget(filing, "current liabilities", 150, model_name="fake-model")
+
+        assert count_tokens(trimmed) <= 150
+        assert "current liabilities" in trimmed
+        positions = [filing.index(part) for part in trimmed.split("\n...\n")]
+        assert positions == sorted(positions)
+
+    @pytest.mark.asyncio
+    async def test_orchestrator_keeps_step_context_within_budget(self, fake_manager, monkeypatch):
+        monkeypatch.setitem(embeddings._default_config, "model_name", "fake-model")
+        filing = "".join(f"Section {i}. " + ("Revenue grew in the period. " * 8) for i in range(12))
+        supervisor = MagicMock()
+        supervisor.generate = AsyncMock(return_value="final")
+        agent = MagicMock(spec=Agent)
+        agent.execute = AsyncMock(return_value=JobOutput(explanation="e", answer="a"))
+        orchestrator = FinancialOrchestrator(supervisor, {"calculator": agent}, None, context_budget=120)
+        workflow = [{"agent": "calculator", "task": "revenue growth"}]
+
+        await orchestrator.run_financial_analysis("task", filing, workflow)
+        assert count_tokens(agent.execute.call_args.args[1]) <= 120
+
+        # A small unrelated value is kept whole and leaves its unused share to the filing
+        budgets = []
+        def fit(text, query, budget, model_name):
+            budgets.append(budget)
+            return fit_to_token_budget(text, query, budget, model_name)
+        monkeypatch.setattr(financial_orchestrator, "fit_to_token_budget", fit)
+        await orchestrator.run_financial_analysis("task", {"note": "Amcor", "AMCOR_DATA": filing}, workflow)
+        context = agent.execute.call_args.args[1]
+        assert context["note"] == "Amcor"
+        assert budgets == [120 - count_tokens("Amcor")]
+        assert count_tokens(context["note"]) + count_tokens(context["AMCOR_DATA"]) <= 120
+
+    def test_save_load_round_trip(self, fake_manager, tmp_path):
+        index = DocumentIndex.build(FILING, model_name="fake-model", chunk_size=200, overlap=20)
+        index.save(str(tmp_path / "amcor"))
+        loaded = DocumentIndex.load(str(tmp_path / "amcor"))
+
+        assert loaded.chunks == index.chunks
+        assert loaded.doc_id == index.doc_id
+        np.testing.assert_allclose(loaded.keyword_scores("current assets"), index.keyword_scores("current assets"))
+        assert retrieve_from_context(loaded, "current assets") == index.query("current assets")
+
+    def test_retrieve_many_batches_queries(self, fake_manager):
+        index = DocumentIndex.build(FILING, model_name="fake-model", chunk_size=200, overlap=20)
+        queries = ["current assets", "raw materials", "current liabilities", "revenue"]
+        calls = fake_manager.get_model().calls
+
+        batched = retrieve_many(index, queries, k=2)
+
+        assert fake_manager.get_model().calls == calls + 1
+        assert batched == [index.query(q, k=2) for q in queries]
+        np.testing.assert_allclose(
+            index.bm25.get_scores_many([tokenize(q) for q in queries]),
+            np.vstack([index.keyword_scores(q) for q in queries])
+        )
+
+    def test_hybrid_results_are_fused_deterministic_and_scored(self, fake_manager):
+        index = DocumentIndex.build(FILING, model_name="fake-model", chunk_size=200, overlap=20)
+
+        for fusion in ("rrf", "weighted"):
+            results = retrieve_from_context(index, "raw materials", max_results=3, fusion=fusion, return_scores=True)
+            again = retrieve_from_context(index, "raw materials", max_results=3, fusion=fusion, return_scores=True)
+
+            assert results == again
+            assert [r.score for r in results] == sorted((r.score for r in results), reverse=True)
+            assert "raw materials" in results[0].text.lower()
+
+    def test_reciprocal_rank_fusion_prefers_agreement(self):
+        keyword = np.array([[3.0, 2.0, 1.0, 0.0]])
+        semantic = np.array([[0.1, 0.9, 0.8, 0.0]])
+        fused = reciprocal_rank_fusion([keyword, semantic])
+
+        assert list(np.argsort(-fused[0], kind="stable")) == [1, 0, 2, 3]
+
+    def test_fusion_accepts_array_weights(self):
+        keyword = np.array([[3.0, 2.0, 1.0, 0.0]])
+        semantic = np.array([[0.1, 0.9, 0.8, 0.0]])
+
+        for fuse in (reciprocal_rank_fusion, weighted_score_fusion):
+            np.testing.assert_allclose(fuse([keyword, semantic], weights=np.array([1.0, 1.0])), fuse([keyword, semantic]))
+            np.testing.assert_allclose(fuse([keyword, semantic], weights=np.array([1.0, 0.0])), fuse([keyword]))
+
+    def test_top_k_uses_positional_tie_breaking(self):
+        scores = np.array([1.0, 3.0, 3.0, 2.0, 3.0])
+
+        assert list(top_k(scores, 2)) == [1, 2]
+        assert list(top_k(scores, 10)) == [1, 2, 4, 3, 0]
+
+        # More than 4k candidates tied with the k-th best score
+        many = np.zeros(1000)
+        many[[7, 500]] = 2.0
+        assert list(top_k(many, 5)) == [7, 500, 0, 1, 2]
+        many[900] = 1.0
+        assert list(top_k(many, 4)) == [7, 500, 900, 0]
+
+    @pytest.mark.parametrize("dtype", ["float16", "int8"])
+    def test_compact_embeddings_round_trip(self, fake_manager, tmp_path, dtype):
+        full = DocumentIndex.build(FILING, model_name="fake-model", chunk_size=200, overlap=20)
+        compact = DocumentIndex.build(FILING, model_name="fake-model", chunk_size=200, overlap=20, embedding_dtype=dtype)
+        compact.save(str(tmp_path / dtype))
+        loaded = DocumentIndex.load(str(tmp_path / dtype))
+
+        assert loaded.embeddings.dtype == dtype
+        np.testing.assert_allclose(loaded.semantic_scores("revenue"), full.semantic_scores("revenue"), atol=0.02)
+
+
+class TestCorpusIndex:
+    @pytest.fixture
+    def corpus(self, fake_manager):
+        corpus = CorpusIndex(model_name="fake-model")
+        for company, year, line in [
+            ("Amcor", 2023, "Raw materials and supplies were 992 million."),
+            ("Amcor", 2022, "Raw materials and supplies were 1,114 million."),
+            ("AES", 2022, "Total cost of sales was 10,069 million."),
+            ("3M", 2022, "Purchases of property, plant and equipment were 1,749 million."),
+        ]:
+            text = f"{company} annual report. {line} " + "Other disclosures follow here. " * 30
+            corpus.add_document(text, doc_name=f"{company.upper()}_{year}_10K", company=company, fiscal_year=year, chunk_size=120, overlap=10)
+        return corpus
+
+    def test_metadata_filters(self, corpus):
+        results = corpus.search("raw materials and supplies", k=3, filters={"company": "Amcor", "fiscal_year": 2022})
+
+        assert results and all(r.doc_name == "AMCOR_2022_10K" for r in results)
+        assert "1,114" in results[0].text
+
+    def test_ivf_search_matches_exact_search_when_probing_all_lists(self, corpus):
+        exact = corpus.search("cost of sales", k=3)
+        corpus.build_ivf(n_lists=4)
+
+        assert corpus.search("cost of sales", k=3, n_probe=4) == exact
+        probed = corpus.search("cost of sales", k=3, n_probe=1)
+        assert len(probed) <= 3
+
+    def test_filters_apply_before_ivf_probing(self, corpus):
+        corpus.build_ivf(n_lists=4)
+        query = normalize_rows(get_embedding_manager("fake-model").encode("cost of sales"))[0]
+        nearest = top_k(corpus.centroids @ query, 1)[0]
+        probed = set(corpus.list_ids[corpus.list_ptr[nearest]:corpus.list_ptr[nearest + 1]])
+        outside = [
+            doc["company"] for i, doc in enumerate(corpus.documents)
+            if not probed & set(np.flatnonzero(corpus.chunk_docs == i))
+        ]
+        assert outside  # a filing none of whose chunks are in the probed list
+
+        results = corpus.search("cost of sales", k=3, filters={"company": outside[0]}, n_probe=1)
+        assert len(results) == 3 and all(r.metadata["company"] == outside[0] for r in results)
+        assert results == corpus.search("cost of sales", k=3, filters={"company": outside[0]}, n_probe=4)
+
+        # Broad filters widen the probe until k matching chunks are found
+        widened = corpus.search("cost of sales", k=20, filters={"fiscal_year": 2022}, n_probe=1)
+        assert len(widened) == 20 and all(r.metadata["fiscal_year"] == 2022 for r in widened)
+
+    def test_document_chunk_offsets(self, corpus, tmp_path):
+        corpus.add_document("", doc_name="EMPTY", company="None")
+        doc_ptr = corpus.doc_ptr
+
+        assert len(doc_ptr) == len(corpus.documents) + 1 and doc_ptr[-1] == len(corpus)
+        for i in range(len(corpus.documents)):
+            assert (corpus.chunk_docs[doc_ptr[i]:doc_ptr[i + 1]] == i).all()
+        assert corpus.search("cost of sales", filters={"company": "None"}) == []
+
+        corpus.save(str(tmp_path / "corpus"))
+        assert (CorpusIndex.load(str(tmp_path / "corpus")).doc_ptr == doc_ptr).all()
+
+    def test_save_load_and_registry_tool(self, corpus, tmp_path):
+        corpus.build_ivf(n_lists=3)
+        corpus.save(str(tmp_path / "corpus"))
+        loaded = CorpusIndex.load(str(tmp_path / "corpus"))
+
+        assert loaded.search("cost of sales", k=2, n_probe=3) == corpus.search("cost of sales", k=2, n_probe=3)
+        registry = create_default_registry(corpus=loaded)
+        texts = registry.execute_tool("search_corpus", query="cost of sales", filters={"company": "AES"})
+        assert texts and "cost of sales" in texts[0]
+        assert retrieve_from_context(loaded, "cost of sales", filters={"company": "AES"}) == texts[:3]
+
+
+class TestBackends:
+    def test_keyword_backends_agree(self):
+        chunks = ["total current assets 5,308", "total current liabilities 4,476", "revenue grew"]
+
+        assert bm25_retrieve(chunks, "current liabilities", 2) == bm25_retrieve(chunks, "current liabilities", 2, backend="rank_bm25")
+
+    def test_registered_embedding_backend_is_loaded_lazily(self, monkeypatch):
+        monkeypatch.setattr(backends, "_embedding_backends", dict(backends._embedding_backends))
+        loads = []
+        register_embedding_backend("fake", lambda model_name, device: loads.append(model_name) or FakeModel())
+        manager = EmbeddingModelManager("fake-backend-model", backend="fake")
+
+        assert loads == []
+        manager.warmup()
+        assert loads == ["fake-backend-model"]
+        assert "fake" in available_backends()["embedding"]
@@ -0,0 +1,77 @@
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+from src.agents.data_retriever import DataRetrieverAgent
+from src.examples.aes_inventory_turnover import AES_DATA
+from src.examples.amcor_quick_ratio import AMCOR_DATA
+from src.examples.workflows import AMCOR_QUICK_RATIO_WORKFLOW, THREE_M_CAPITAL_INTENSITY_WORKFLOW
+from src.tools.statements import parse_statements
+
+
+class TestParseStatements:
+    def test_parses_periods_units_and_rows(self):
+        index = parse_statements(AMCOR_DATA)
+        table = index.tables[0]
+        assert table.title == "Consolidated Balance Sheets"
+        assert table.periods == ["FY2023", "FY2022"]
+        assert table.units == "millions"
+        assert index.items["Total current assets"] == {"FY2023": 5308.0, "FY2022": 5853.0}
+        assert index.lookup(["property plant and equipment net"]) == {"FY2023": 3762.0, "FY2022": 3646.0}
+        # Numbers inside a label stay in the label
+        assert "Trade receivables, net of allowance for credit losses of $21 and $25, respectively" in table.rows
+
+    def test_blank_columns_follow_the_layout(self):
+        index = parse_statements(AMCOR_DATA)
+        assert index.items["Assets held for sale, net"] == {"FY2023": None, "FY2022": 192.0}
+        text = "2023    2022\nGoodwill    100    90\nNew line    50\nRetired line    —    40\n"
+        items = parse_statements(text).items
+        assert items["New line"] == {"FY2023": 50.0, "FY2022": None}
+        assert items["Retired line"] == {"FY2023": None, "FY2022": 40.0}
+
+    def test_negatives_sections_and_single_spaced_rows(self):
+        index = parse_statements(AES_DATA)
+        assert [table.periods for table in index.tables] == [["FY2022", "FY2021"], ["FY2022", "FY2021", "FY2020"]]
+        assert index.items["Total cost of sales"]["FY2022"] == -10069.0
+        # "Regulated" appears under both Revenue: and Cost of Sales:
+        assert index.items["Regulated"]["FY2022"] == 3538.0
+        assert index.items["Cost of Sales: Regulated"]["FY2022"] == -3162.0
+        single = parse_statements("As of December 31, 2023 and 2022\n2023 2022\nTotal current assets 5,308 5,853\n")
+        assert single.items == {"Total current assets": {"FY2023": 5308.0, "FY2022": 5853.0}}
+
+    def test_rows_before_any_period_header_are_ignored(self):
+        assert parse_statements("Revenue    100    90\n").tables == []
+
+
+class TestDataRetrieverStatements:
+    @pytest.mark.asyncio
+    async def test_data_retriever_reads_statements_without_the_llm(self):
+        client = MagicMock()
+        client.generate = AsyncMock()
+        agent = DataRetrieverAgent(client)
+        output = await agent.execute(AMCOR_QUICK_RATIO_WORKFLOW[0]["task"], {"document_text": AMCOR_DATA})
+        assert output.answer["Total current liabilities FY2023"] == 4476.0
+        assert output.answer["Raw materials and supplies FY2022"] == 1114.0
+        client.generate.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_data_retriever_sends_only_unresolved_metrics_to_the_llm(self):
+        client = MagicMock()
+        client.generate = AsyncMock(return_value='{"values": {"Net income FY2022": 5777}}')
+        agent = DataRetrieverAgent(client)
+        text = "2022    2021\n(in millions)\nNet sales    $    34,229     $    35,355\nTotal assets    46,455    47,072\n"
+        output = await agent.execute(THREE_M_CAPITAL_INTENSITY_WORKFLOW[0]["task"], {"document_text": text})
+        prompt = client.generate.call_args[0][0][1]["content"]
+        assert prompt.startswith("Extract the following metrics from this financial document: CAPEX")
+        assert "Net sales" not in prompt.split("\n")[0]
+        assert output.answer["Net sales FY2022"] == 34229.0
+        assert output.answer["Net income FY2022"] == 5777
+
+    @pytest.mark.asyncio
+    async def test_data_retriever_takes_metrics_from_the_formulas_a_task_names(self):
+        client = MagicMock()
+        client.generate = AsyncMock()
+        agent = DataRetrieverAgent(client)
+        assert agent._formula_metrics("What is the quick ratio?") == ["current assets", "inventory", "current liabilities"]
+
+        output = await agent.execute("Extract the data for the Inventory Turnover ratio for FY2022", {"document_text": AES_DATA})
+        assert output.answer == {"Total cost of sales FY2022": 10069.0, "Inventory FY2022": 1055.0}
+        client.generate.assert_not_called()
@@ -0,0 +1,134 @@
+import json
+import pytest
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+from src.agent import Agent
+from src.agents.calculator import CalculatorAgent
+from src.agents.data_retriever import DataRetrieverAgent, ExtractedValues
+from src.agents.financial_concept_selector import FinancialConceptSelectorAgent
+from src.clients.anthropic import AnthropicClient
+from src.clients.base import Completion, ModelClient, response_schema
+from src.clients.cache import CachedClient, ResponseCache, request_key
+from src.clients.openai import OpenAIClient
+from src.clients.resilience import ResilientClient
+
+
+class StructuredModel:
+    """Fake structured-output client that records the response model of each call"""
+    supports_structured_output = True
+    provider = "openai"
+    model_name = "fake"
+
+    def __init__(self, response: str):
+        self.response = response
+        self.response_models = []
+
+    async def generate(self, messages, response_model=None):
+        self.response_models.append(response_model)
+        return self.response
+
+
+CONCEPT = {
+    "explanation": "Liquidity question",
+    "citation": "Textbook",
+    "answer": {"concept": "Quick Ratio", "formula": "(CA - Inventory) / CL", "required_data": ["CA", "Inventory", "CL"]}
+}
+
+
+class TestClients:
+    @pytest.mark.asyncio
+    async def test_openai_requests_the_json_schema(self, openai_sdk):
+        sdk = openai_sdk(json.dumps(CONCEPT))
+        client = OpenAIClient(client=sdk)
+        model = FinancialConceptSelectorAgent.output_model()
+
+        await client.generate([{"role": "user", "content": "q"}], response_model=model)
+        response_format = sdk.chat.completions.create.call_args.kwargs["response_format"]
+        assert response_format["type"] == "json_schema"
+        assert response_format["json_schema"]["name"] == "FinancialConceptSelectorAgentOutput"
+        assert response_format["json_schema"]["schema"] == response_schema(model)
+
+        await client.generate([{"role": "user", "content": "q"}])
+        assert "response_format" not in sdk.chat.completions.create.call_args.kwargs
+
+    @pytest.mark.asyncio
+    async def test_anthropic_forces_a_tool_call_and_returns_its_input(self):
+        sdk = MagicMock()
+        sdk.messages.create = AsyncMock(return_value=SimpleNamespace(
+            content=[SimpleNamespace(type="tool_use", input=CONCEPT)]
+        ))
+        client = AnthropicClient(client=sdk)
+        model = FinancialConceptSelectorAgent.output_model()
+
+        text = await client.generate([{"role": "user", "content": "q"}], response_model=model)
+        assert json.loads(text) == CONCEPT
+        kwargs = sdk.messages.create.call_args.kwargs
+        assert kwargs["tools"][0]["input_schema"] == response_schema(model)
+        assert kwargs["tool_choice"] == {"type": "tool", "name": model.__name__}
+
+    @pytest.mark.asyncio
+    async def test_clients_without_support_reject_a_response_model(self):
+        class PlainClient(ModelClient):
+            async def _generate(self, messages):
+                return Completion("ok")
+
+        with pytest.raises(ValueError):
+            await PlainClient().generate([], response_model=ExtractedValues)
+
+    @pytest.mark.asyncio
+    async def test_wrappers_forward_the_response_model(self, tmp_path):
+        messages = [{"role": "user", "content": "q"}]
+        upstream = StructuredModel('{"values": {}}')
+        client = ResilientClient([CachedClient(upstream, ResponseCache(str(tmp_path / "llm.sqlite")))])
+
+        assert client.supports_structured_output
+        await client.generate(messages, response_model=ExtractedValues)
+        await client.generate(messages)
+        assert upstream.response_models == [ExtractedValues, None]
+        assert request_key(upstream, messages) != request_key(upstream, messages, ExtractedValues)
+        assert not ResilientClient([upstream, MagicMock()]).supports_structured_output
+
+
+class TestAgents:
+    @pytest.mark.asyncio
+    async def test_structured_response_is_loaded_directly(self):
+        model = StructuredModel(json.dumps(CONCEPT))
+        agent = FinancialConceptSelectorAgent(model, "financial_concept_selector")
+
+        output = await agent.execute("Identify financial concept", "context")
+        assert model.response_models == [FinancialConceptSelectorAgent.output_model()]
+        assert json.loads(output.answer) == CONCEPT["answer"]
+        assert agent.parse_tiers == {"structured": 1}
+
+    @pytest.mark.asyncio
+    async def test_nonconforming_response_falls_back_to_parsing(self):
+        # The calculator's answer must be an object
+        agent = CalculatorAgent(StructuredModel('{"explanation": "x", "answer": "0.69"}'), "calculator")
+
+        output = await agent.execute("Calculate", "context")
+        assert output.answer == "0.69"
+        assert agent.parse_tiers == {"strict": 1}
+
+    @pytest.mark.asyncio
+    async def test_models_without_support_get_prose_prompts(self):
+        model = MagicMock()
+        model.generate = AsyncMock(return_value=json.dumps(CONCEPT))
+        agent = FinancialConceptSelectorAgent(model, "financial_concept_selector")
+
+        await agent.execute("Identify financial concept", "context")
+        assert model.generate.call_args.kwargs == {}
+        assert agent.parse_tiers == {"strict": 1}
+
+    def test_output_models_narrow_the_answer(self):
+        assert Agent.output_model().model_fields["answer"].is_required()
+        assert CalculatorAgent.output_model() is CalculatorAgent.output_model()
+        assert CalculatorAgent.output_model().model_json_schema()["properties"]["answer"]["type"] == "object"
+
+    @pytest.mark.asyncio
+    async def test_data_retriever_loads_structured_values(self):
+        model = StructuredModel('{"values": {"Total Assets FY2022": 46455}}')
+        agent = DataRetrieverAgent(model)
+
+        output = await agent.execute("Extract for FY2022: Total Assets", {"document_text": "Total assets were reported."})
+        assert model.response_models == [ExtractedValues]
+        assert output.answer == {"Total Assets FY2022": 46455.0}
@@ -0,0 +1,61 @@
+import asyncio
+import pytest
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+from src.clients.openai import OpenAIClient
+from src.utils import tokens
+from src.utils.tokens import TokenUsage, count_message_tokens, count_tokens, record_usage, usage_scope
+
+
+class TestTokenCounting:
+    def test_heuristic_without_tiktoken(self, monkeypatch):
+        monkeypatch.setattr(tokens, "_encoding", lambda model_name: None)
+        assert count_tokens("") == 0
+        assert count_tokens("abcdefgh") == 2
+        assert count_message_tokens([{"role": "user", "content": "abcd"}]) == 1 + tokens.MESSAGE_OVERHEAD_TOKENS
+
+    def test_counts_grow_with_text(self):
+        assert count_tokens("word " * 100) > count_tokens("word " * 10) > 0
+
+
+class TestUsageScopes:
+    @pytest.mark.asyncio
+    async def test_scopes_nest_and_follow_tasks(self):
+        async def call(n):
+            record_usage(n, 1)
+
+        with usage_scope() as total:
+            with usage_scope() as step:
+                await asyncio.gather(call(10), call(20))
+            record_usage(5, 5, estimated=True)
+
+        assert (step.input_tokens, step.output_tokens, step.calls, step.estimated) == (30, 2, 2, False)
+        assert total.to_dict() == {"input_tokens": 35, "output_tokens": 7, "calls": 3, "estimated": True, "total_tokens": 42}
+        record_usage(1, 1)  # outside any scope: ignored
+        assert total.calls == 3
+
+    @pytest.mark.asyncio
+    async def test_client_reports_provider_usage(self):
+        sdk = MagicMock()
+        sdk.chat.completions.create = AsyncMock(return_value=SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content="ok"))],
+            usage=SimpleNamespace(prompt_tokens=120, completion_tokens=7)
+        ))
+        client = OpenAIClient(client=sdk)
+
+        with usage_scope() as usage:
+            await client.generate([{"role": "user", "content": "hi"}])
+        assert (usage.input_tokens, usage.output_tokens, usage.estimated) == (120, 7, False)
+
+    @pytest.mark.asyncio
+    async def test_client_estimates_missing_usage(self):
+        sdk = MagicMock()
+        sdk.chat.completions.create = AsyncMock(return_value=SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content="a longer answer"))]
+        ))
+        client = OpenAIClient(client=sdk)
+
+        with usage_scope() as usage:
+            await client.generate([{"role": "user", "content": "hi"}])
+        assert usage.estimated
+        assert usage.output_tokens == count_tokens("a longer answer", "gpt-4o")